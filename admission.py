@@ -0,0 +1,140 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+
+logger = logging.getLogger(__name__)
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request cannot be admitted; carries a structured busy event."""
+
+    def __init__(self, limiter, reason, retry_after):
+        super().__init__(f"{limiter} is busy ({reason})")
+        self.limiter = limiter
+        self.reason = reason
+        self.retry_after = retry_after
+
+    def to_event(self):
+        return {
+            "type": "busy",
+            "limiter": self.limiter,
+            "reason": self.reason,
+            "retry_after_ms": int(self.retry_after * 1000),
+        }
+
+
+class AdmissionController:
+    """Bounded concurrency with a bounded FIFO wait queue.
+
+    At most ``max_in_flight`` holders run at once and at most ``max_queue``
+    wait for a slot. A request is rejected immediately when the queue is full
+    or when the estimated wait (queue position times the recent average
+    service time) already exceeds its deadline, and otherwise waits until a
+    slot frees up or its timeout/deadline passes.
+    """
+
+    def __init__(self, name, max_in_flight, max_queue=0, timeout=30.0, window=256):
+        self.name = name
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._in_flight = 0
+        self._waiters = deque()
+        self._waits = deque(maxlen=window)
+        self._services = deque(maxlen=window)
+        self._stats = {"admitted": 0, "rejected_queue_full": 0, "rejected_deadline": 0, "rejected_timeout": 0}
+        self._max_queue_depth = 0
+
+    async def acquire(self, timeout=None, deadline=None):
+        """Wait for a slot; ``deadline`` is an absolute ``time.monotonic()`` value."""
+        started = time.monotonic()
+        if self._in_flight < self.max_in_flight and not self._waiters:
+            self._in_flight += 1
+            self._admitted(started)
+            return started
+
+        if len(self._waiters) >= self.max_queue:
+            self._stats["rejected_queue_full"] += 1
+            raise AdmissionRejected(self.name, "queue_full", self._estimated_wait(len(self._waiters)))
+
+        limit = self.timeout if timeout is None else timeout
+        if deadline is not None:
+            remaining = deadline - started
+            estimate = self._estimated_wait(len(self._waiters) + 1)
+            if remaining <= 0 or estimate > remaining:
+                # 締め切りまでに順番が回ってこない見込みなら、待たせずに即座に断る
+                self._stats["rejected_deadline"] += 1
+                raise AdmissionRejected(self.name, "deadline", estimate)
+            limit = min(limit, remaining)
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self._max_queue_depth = max(self._max_queue_depth, len(self._waiters))
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), limit)
+        except asyncio.TimeoutError:
+            if waiter.done() and not waiter.cancelled():
+                # タイムアウトと同時にスロットを譲られた場合はそのまま使う
+                self._admitted(started)
+                return started
+            self._remove(waiter)
+            self._stats["rejected_timeout"] += 1
+            raise AdmissionRejected(self.name, "timeout", self._estimated_wait(len(self._waiters)))
+        except BaseException:
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            else:
+                self._remove(waiter)
+            raise
+        self._admitted(started)
+        return started
+
+    def release(self, started=None):
+        if started is not None:
+            self._services.append(time.monotonic() - started)
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                # スロットを待機者にそのまま引き渡す（in_flightは変えない）
+                waiter.set_result(None)
+                return
+        self._in_flight -= 1
+
+    @asynccontextmanager
+    async def slot(self, timeout=None, deadline=None):
+        started = await self.acquire(timeout, deadline)
+        try:
+            yield
+        finally:
+            self.release(started)
+
+    def stats(self):
+        waits = sorted(self._waits)
+        return {
+            **self._stats,
+            "in_flight": self._in_flight,
+            "queue_depth": len(self._waiters),
+            "max_queue_depth": self._max_queue_depth,
+            "max_in_flight": self.max_in_flight,
+            "max_queue": self.max_queue,
+            "wait_ms_p50": waits[len(waits) // 2] * 1000 if waits else 0.0,
+            "wait_ms_p99": waits[min(len(waits) - 1, int(len(waits) * 0.99))] * 1000 if waits else 0.0,
+        }
+
+    def _admitted(self, started):
+        self._stats["admitted"] += 1
+        self._waits.append(time.monotonic() - started)
+
+    def _estimated_wait(self, position):
+        if not self._services:
+            return 0.0
+        average = sum(self._services) / len(self._services)
+        return average * position / self.max_in_flight
+
+    def _remove(self, waiter):
+        try:
+            self._waiters.remove(waiter)
+        except ValueError:
+            pass
@@ -0,0 +1,131 @@
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+
+logger = logging.getLogger(__name__)
+
+
+def estimate_agent_size(agent):
+    # 会話履歴のシリアライズ後のサイズを概算メモリ使用量として扱う
+    try:
+        return len(json.dumps(agent.messages, default=str))
+    except Exception:
+        return 0
+
+
+class _Entry:
+    __slots__ = ("agent", "binding", "lock", "size", "last_used", "leases")
+
+    def __init__(self):
+        self.agent = None
+        self.binding = None
+        self.lock = asyncio.Lock()
+        self.size = 0
+        self.last_used = time.monotonic()
+        self.leases = 0
+
+
+class AgentCache:
+    """In-process LRU of live Agent instances keyed by runtime session ID.
+
+    Follow-up turns of a session reuse the warm agent and its message history.
+    Only one request per session runs at a time; concurrent requests for the
+    same session wait for the lease, and a turn that fails or is abandoned is
+    rolled back out of the history. Entries are evicted when idle longer than
+    ``idle_ttl`` seconds, or least-recently-used first when the cache exceeds
+    ``max_sessions`` or the estimated ``memory_budget`` (bytes).
+    """
+
+    def __init__(self, max_sessions=64, memory_budget=64 * 1024 * 1024, idle_ttl=900.0, size_estimator=None):
+        self.max_sessions = max_sessions
+        self.memory_budget = memory_budget
+        self.idle_ttl = idle_ttl
+        self._size_estimator = size_estimator or estimate_agent_size
+        self._entries = OrderedDict()
+        self._total_size = 0
+        self._stats = {"hits": 0, "misses": 0, "rebinds": 0, "evicted": 0}
+
+    @asynccontextmanager
+    async def lease(self, session_id, binding, factory, prepare=None):
+        """Yield the session's agent, building it with ``factory(messages)`` if needed.
+
+        ``binding`` identifies what the agent's tools are bound to (for example
+        the MCP client and tool catalog version). When it differs from the
+        cached agent's binding the agent is rebuilt from its message history.
+        ``prepare(agent)`` runs before the turn starts, so changes it makes to
+        the history (such as compaction) are kept even if the turn fails.
+        """
+        if not session_id:
+            agent = factory(None)
+            if prepare is not None:
+                prepare(agent)
+            yield agent
+            return
+
+        entry = self._entries.get(session_id)
+        if entry is None:
+            entry = self._entries[session_id] = _Entry()
+        entry.leases += 1
+        try:
+            async with entry.lock:
+                self._entries.move_to_end(session_id)
+                if entry.agent is None:
+                    self._stats["misses"] += 1
+                    entry.agent = factory(None)
+                elif entry.binding != binding:
+                    self._stats["rebinds"] += 1
+                    entry.agent = factory(entry.agent.messages)
+                else:
+                    self._stats["hits"] += 1
+                entry.binding = binding
+                if prepare is not None:
+                    prepare(entry.agent)
+                turn_start = len(entry.agent.messages)
+                try:
+                    yield entry.agent
+                except BaseException:
+                    # 中断されたターンは履歴から取り除き、次のターンで不整合が起きないようにする
+                    del entry.agent.messages[turn_start:]
+                    raise
+                finally:
+                    self._total_size -= entry.size
+                    entry.size = self._size_estimator(entry.agent)
+                    self._total_size += entry.size
+                    entry.last_used = time.monotonic()
+        finally:
+            entry.leases -= 1
+            self.evict()
+
+    def has_history(self, session_id):
+        """Whether the session has a conversation history (or a turn in progress) in the cache."""
+        entry = self._entries.get(session_id)
+        return entry is not None and (entry.leases > 0 or bool(entry.agent is not None and entry.agent.messages))
+
+    def discard(self, session_id):
+        entry = self._entries.get(session_id)
+        if entry is not None and entry.leases == 0:
+            self._remove(session_id, entry)
+
+    def evict(self):
+        """Drop idle-expired entries, then LRU entries until within limits."""
+        now = time.monotonic()
+        for session_id, entry in list(self._entries.items()):
+            if entry.leases == 0 and now - entry.last_used >= self.idle_ttl:
+                self._remove(session_id, entry)
+        for session_id, entry in list(self._entries.items()):
+            if len(self._entries) <= self.max_sessions and self._total_size <= self.memory_budget:
+                break
+            if entry.leases == 0:
+                self._remove(session_id, entry)
+
+    def stats(self):
+        return {**self._stats, "sessions": len(self._entries), "memory_bytes": self._total_size}
+
+    def _remove(self, session_id, entry):
+        del self._entries[session_id]
+        self._total_size -= entry.size
+        self._stats["evicted"] += 1
+        logger.debug("Evicted cached agent for session %s", session_id)
@@ -0,0 +1,287 @@
+import asyncio
+import concurrent.futures
+import contextlib
+import json
+import logging
+import random
+import threading
+from typing import Any, NamedTuple
+
+import boto3
+from botocore.config import Config
+from botocore.exceptions import ClientError, ConnectionError, HTTPClientError
+
+from sse_decoder import SSEDecoder, iter_chunks, parse_payload
+
+logger = logging.getLogger(__name__)
+
+# 再試行するAgentCoreのエラー（応答のストリーミングが始まる前のみ再試行する）
+RETRYABLE_ERROR_CODES = frozenset({
+    "ThrottlingException",
+    "ServiceQuotaExceededException",
+    "RetryableConflictException",
+    "InternalServerException",
+})
+
+
+class AgentEvent(NamedTuple):
+    """One event of an agent stream, as produced by ``sse_decoder.parse_payload``.
+
+    Unpacks as ``(type, data)``. Besides the stream's own events the client
+    yields ``raw`` lines (with ``raw=True``), ``retry`` before a retried
+    attempt and ``error`` when the invocation fails.
+    """
+
+    type: str
+    data: Any = None
+
+
+def payload_events(payload, raw=False):
+    """``AgentEvent``s of one SSE data payload; ``raw`` adds the line itself for analysis."""
+    events = []
+    if raw:
+        line = payload.decode("utf-8", "replace")
+        events.append(AgentEvent("raw", f"RAW LINE: {line}"))
+        try:
+            events.append(AgentEvent("raw", f"PARSED DATA: {json.dumps(json.loads(line), indent=2)}"))
+        except json.JSONDecodeError:
+            events.append(AgentEvent("raw", f"NON-JSON LINE: {line}"))
+    event = parse_payload(payload)
+    if isinstance(event, list):
+        events.extend(AgentEvent(*item) for item in event)
+    elif event:
+        events.append(AgentEvent(*event))
+    return events
+
+
+def is_retryable(error):
+    if isinstance(error, ClientError):
+        if error.response.get("Error", {}).get("Code") in RETRYABLE_ERROR_CODES:
+            return True
+        return error.response.get("ResponseMetadata", {}).get("HTTPStatusCode", 0) >= 500
+    # 接続できない・接続が切れた・タイムアウト
+    return isinstance(error, (ConnectionError, HTTPClientError))
+
+
+_END = object()
+
+
+class _Attempt:
+    """One ``invoke_agent_runtime`` call streamed from a worker thread into an asyncio queue."""
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.queue = asyncio.Queue()
+        self.response = None
+        self.stopped = threading.Event()
+
+    def put(self, item):
+        # ネットワークから読んだチャンク単位でまとめて渡し、スレッド間の受け渡しを減らす
+        try:
+            self.loop.call_soon_threadsafe(self.queue.put_nowait, item)
+        except RuntimeError:
+            # 呼び出し側のイベントループが既に終了している
+            self.stopped.set()
+
+    def stop(self):
+        self.stopped.set()
+        body = self.response.get("response") if self.response else None
+        if body is not None and hasattr(body, "close"):
+            # 読み込み中のワーカースレッドを止め、接続はプールに戻さず破棄する
+            body.close()
+
+
+class AgentCoreClient:
+    """Asyncio client for ``invoke_agent_runtime`` that drives many sessions at once.
+
+    Streams run on a dedicated thread pool of ``max_connections`` workers over
+    one boto3 client whose HTTP pool holds as many keep-alive connections, so
+    concurrent turns reuse connections instead of opening new ones. Failures
+    before the first event (throttling, 5xx, connection errors, and ``busy``
+    rejections with ``retry_busy``) are retried up to ``max_attempts`` times
+    with full-jitter exponential backoff; once events have been yielded a
+    failure ends the stream with an ``error`` event, as a retry would repeat
+    the answer.
+
+    ``invoke()`` is the asyncio API; ``stream()`` and ``run()`` drive it from
+    synchronous code (e.g. Streamlit) on a background event loop.
+    """
+
+    def __init__(
+        self,
+        agent_arn,
+        region_name=None,
+        endpoint_url=None,
+        max_connections=32,
+        connect_timeout=5.0,
+        read_timeout=300.0,
+        max_attempts=3,
+        backoff_base=0.25,
+        backoff_cap=5.0,
+        retry_busy=True,
+        session=None,
+    ):
+        self.agent_arn = agent_arn
+        self.max_attempts = max(1, max_attempts)
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.retry_busy = retry_busy
+        config = Config(
+            max_pool_connections=max_connections,
+            connect_timeout=connect_timeout,
+            read_timeout=read_timeout,
+            tcp_keepalive=True,
+            # botocore自身の再試行はストリームの途中でも繰り返してしまうため無効にし、ここで行う
+            retries={"total_max_attempts": 1},
+        )
+        self._client = (session or boto3.session.Session()).client(
+            "bedrock-agentcore", region_name=region_name, endpoint_url=endpoint_url, config=config
+        )
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max_connections, thread_name_prefix="agentcore-client"
+        )
+        self._lock = threading.Lock()
+        self._loop = None
+        self._stats = {"invocations": 0, "active": 0, "attempts": 0, "retries": 0, "busy_retries": 0, "errors": 0}
+
+    async def invoke(self, session_id, payload, raw=False):
+        """Yield the ``AgentEvent``s of one turn; ``payload`` is a dict or encoded bytes."""
+        body = payload if isinstance(payload, bytes) else json.dumps(payload).encode()
+        loop = asyncio.get_running_loop()
+        self._count("invocations", "active")
+        try:
+            for attempt in range(1, self.max_attempts + 1):
+                self._count("attempts")
+                current = _Attempt(loop)
+                loop.run_in_executor(self._executor, self._run, current, session_id, body, raw)
+                yielded = False
+                retry = None
+                try:
+                    while True:
+                        item = await current.queue.get()
+                        if item is _END:
+                            break
+                        if isinstance(item, Exception):
+                            if not yielded and attempt < self.max_attempts and is_retryable(item):
+                                retry = {"reason": type(item).__name__, "delay": self._backoff(attempt)}
+                                break
+                            self._count("errors")
+                            yield AgentEvent("error", f"Error: {item}")
+                            continue
+                        busy = next((event for event in item if event.type == "busy"), None)
+                        if busy and self.retry_busy and not yielded and attempt < self.max_attempts:
+                            # エージェントの受付制御で断られた場合は、示された時間以上待ってから再試行する
+                            retry_after = (busy.data or {}).get("retry_after_ms", 0) / 1000
+                            retry = {"reason": "busy", "delay": retry_after + self._backoff(attempt)}
+                            break
+                        yielded = True
+                        for event in item:
+                            yield event
+                finally:
+                    current.stop()
+                if retry is None:
+                    return
+                self._count("retries", *(("busy_retries",) if retry["reason"] == "busy" else ()))
+                logger.info(
+                    "Retrying session %s after %s (attempt %d/%d, %.2fs)",
+                    session_id, retry["reason"], attempt + 1, self.max_attempts, retry["delay"],
+                )
+                yield AgentEvent("retry", {
+                    "attempt": attempt + 1, "reason": retry["reason"], "delay_ms": retry["delay"] * 1000,
+                })
+                await asyncio.sleep(retry["delay"])
+        finally:
+            with self._lock:
+                self._stats["active"] -= 1
+
+    async def cancel(self, session_id):
+        """Ask the agent to stop the turn running for ``session_id``; returns how many were cancelled."""
+        async with contextlib.aclosing(self.invoke(session_id, {"action": "cancel"})) as events:
+            async for event in events:
+                if event.type == "cancel_ack":
+                    return event.data.get("cancelled", 0)
+        return 0
+
+    def stream(self, session_id, payload, raw=False):
+        """Synchronous iterator over ``invoke()``, for callers without an event loop."""
+        loop = self._background_loop()
+        events = self.invoke(session_id, payload, raw)
+        try:
+            while True:
+                try:
+                    yield asyncio.run_coroutine_threadsafe(events.__anext__(), loop).result()
+                except StopAsyncIteration:
+                    return
+        finally:
+            # 途中で打ち切られた場合もストリームを閉じて接続を解放する
+            asyncio.run_coroutine_threadsafe(events.aclose(), loop).result(timeout=5)
+
+    def run(self, coroutine, timeout=None):
+        """Run a coroutine of this client (e.g. ``cancel()``) from synchronous code."""
+        return asyncio.run_coroutine_threadsafe(coroutine, self._background_loop()).result(timeout)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats)
+
+    def close(self):
+        with self._lock:
+            loop, self._loop = self._loop, None
+        if loop is not None:
+            loop.call_soon_threadsafe(loop.stop)
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._client.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.close()
+
+    def _run(self, attempt, session_id, body, raw):
+        try:
+            attempt.response = response = self._client.invoke_agent_runtime(
+                agentRuntimeArn=self.agent_arn, runtimeSessionId=session_id, payload=body
+            )
+            if attempt.stopped.is_set():
+                return
+            content_type = response.get("contentType", "")
+            if "text/event-stream" in content_type:
+                decoder = SSEDecoder()
+                for chunk in iter_chunks(response["response"]):
+                    events = [event for data in decoder.feed(chunk) for event in payload_events(data, raw)]
+                    if events:
+                        attempt.put(events)
+                    if attempt.stopped.is_set():
+                        return
+                events = [event for data in decoder.flush() for event in payload_events(data, raw)]
+                if events:
+                    attempt.put(events)
+            elif content_type == "application/json":
+                result = json.loads(response["response"].read())
+                message = result["message"] if isinstance(result, dict) and "message" in result else str(result)
+                attempt.put([AgentEvent("text", message)])
+            else:
+                attempt.put([AgentEvent("text", str(response))])
+        except Exception as error:
+            if not attempt.stopped.is_set():
+                attempt.put(error)
+        finally:
+            if attempt.stopped.is_set():
+                attempt.stop()
+            attempt.put(_END)
+
+    def _backoff(self, attempt):
+        return random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** (attempt - 1)))
+
+    def _count(self, *names):
+        with self._lock:
+            for name in names:
+                self._stats[name] += 1
+
+    def _background_loop(self):
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, name="agentcore-client-loop", daemon=True).start()
+            return self._loop
@@ -0,0 +1,153 @@
+"""Local stand-in for the AgentCore Runtime ``invoke_agent_runtime`` endpoint.
+
+Answers ``POST /runtimes/<arn>/invocations`` with a compact event stream
+(``text/event-stream``, see ``response_format.md``) that echoes the prompt,
+over HTTP/1.1 keep-alive connections, so ``agentcore_client.AgentCoreClient``
+can be exercised offline with ``endpoint_url``. Throttling errors and
+``busy`` rejections can be injected to exercise the client's retries, and
+``GET /stats`` reports how many TCP connections and requests were served:
+
+    python benchmarks/agentcore_stub_server.py --port 8780 --throttle-rate 0.1 --busy-rate 0.1
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SESSION_HEADER = "X-Amzn-Bedrock-AgentCore-Runtime-Session-Id"
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, first_token_delay=0.05, token_delay=0.005, tokens=40,
+                 throttle_rate=0.0, busy_rate=0.0, seed=None):
+        super().__init__(address, StubHandler)
+        self.first_token_delay = first_token_delay
+        self.token_delay = token_delay
+        self.tokens = tokens
+        self.throttle_rate = throttle_rate
+        self.busy_rate = busy_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.stats = {"connections": 0, "requests": 0, "throttled": 0, "busy": 0, "streams": 0, "disconnects": 0}
+
+    def count(self, name):
+        with self.lock:
+            self.stats[name] += 1
+
+    def roll(self, rate):
+        with self.lock:
+            return self.random.random() < rate
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        # keep-aliveで再利用される接続は1回だけ数える
+        self.server.count("connections")
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path != "/stats":
+            self.send_json(404, {"message": "not found"})
+            return
+        with self.server.lock:
+            self.send_json(200, dict(self.server.stats))
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if not self.path.endswith("/invocations"):
+            self.send_json(404, {"message": "not found"})
+            return
+        self.server.count("requests")
+        if self.server.roll(self.server.throttle_rate):
+            self.server.count("throttled")
+            self.send_json(429, {"message": "Rate exceeded"}, error_type="ThrottlingException")
+            return
+
+        session_id = self.headers.get(SESSION_HEADER, "")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.send_header(SESSION_HEADER, session_id)
+        self.end_headers()
+        if payload.get("action") == "cancel":
+            self.send_events([{"type": "cancel_ack", "cancelled": 0}])
+            self.end_stream()
+        elif self.server.roll(self.server.busy_rate):
+            self.server.count("busy")
+            self.send_events([{"type": "busy", "limiter": "invocations", "reason": "queue_full", "retry_after_ms": 50}])
+            self.end_stream()
+        else:
+            self.server.count("streams")
+            try:
+                self.stream_answer(payload.get("prompt", ""), session_id)
+            except ConnectionError:
+                # クライアントがストリームを途中で打ち切った
+                self.server.count("disconnects")
+                self.close_connection = True
+
+    def stream_answer(self, prompt, session_id):
+        started = time.monotonic()
+        self.send_events([{"type": "start", "session_id": session_id}, {"type": "message_start"}])
+        time.sleep(self.server.first_token_delay)
+        words = f"Answer to: {prompt}".split()
+        words += ["lorem"] * max(0, self.server.tokens - len(words))
+        for index, word in enumerate(words):
+            self.send_events([{"type": "text", "text": word if index == 0 else " " + word}])
+            if self.server.token_delay:
+                time.sleep(self.server.token_delay)
+        self.send_events([
+            {"type": "message_stop", "stop_reason": "end_turn"},
+            {"type": "metadata", "usage": {"inputTokens": len(prompt), "outputTokens": len(words)},
+             "metrics": {"latencyMs": int((time.monotonic() - started) * 1000)}},
+        ])
+        self.end_stream()
+
+    def send_events(self, events):
+        data = b"".join(b"data: " + json.dumps(event, ensure_ascii=False).encode() + b"\n\n" for event in events)
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+    def end_stream(self):
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+    def send_json(self, status, body, error_type=None):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        if error_type:
+            self.send_header("x-amzn-ErrorType", error_type)
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8780)
+    parser.add_argument("--first-token-delay", type=float, default=0.05)
+    parser.add_argument("--token-delay", type=float, default=0.005)
+    parser.add_argument("--tokens", type=int, default=40, help="words per answer")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="share of requests answered with 429")
+    parser.add_argument("--busy-rate", type=float, default=0.0, help="share of requests answered with a busy event")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+    server = StubServer(
+        (args.host, args.port), args.first_token_delay, args.token_delay, args.tokens,
+        args.throttle_rate, args.busy_rate, args.seed,
+    )
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
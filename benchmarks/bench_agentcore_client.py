@@ -0,0 +1,143 @@
+"""Benchmark of the asyncio AgentCore client against the local SSE stub.
+
+Starts ``agentcore_stub_server.py`` and runs ``--sessions`` turns, each in its
+own session, ``--concurrency`` at a time through
+``agentcore_client.AgentCoreClient`` for every pool size in ``--pool-sizes``
+(10 is botocore's default ``max_pool_connections``). Reports throughput,
+time-to-first-token and total time per turn, the TCP connections the stub
+accepted, and the retries spent on injected throttling and busy rejections:
+
+    python benchmarks/bench_agentcore_client.py --sessions 200 --concurrency 50 --pool-sizes 10,50
+    python benchmarks/bench_agentcore_client.py --throttle-rate 0.1 --busy-rate 0.1
+"""
+import argparse
+import asyncio
+import json
+import os
+import pathlib
+import subprocess
+import sys
+import time
+import urllib.request
+import uuid
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+BENCH_DIR = ROOT / "benchmarks"
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(BENCH_DIR))
+
+from bench_invocation import free_port, summarize, wait_for_port  # noqa: E402
+from scenarios import CONVERSATIONS  # noqa: E402
+
+AGENT_ARN = "arn:aws:bedrock-agentcore:us-east-1:000000000000:runtime/stub"
+PROMPTS = [prompt for turns in CONVERSATIONS.values() for prompt in turns]
+
+
+def start_stub(port, args):
+    process = subprocess.Popen(
+        [
+            sys.executable, str(BENCH_DIR / "agentcore_stub_server.py"), "--port", str(port),
+            "--first-token-delay", str(args.first_token_delay), "--token-delay", str(args.token_delay),
+            "--throttle-rate", str(args.throttle_rate), "--busy-rate", str(args.busy_rate), "--seed", "0",
+        ],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    wait_for_port(port)
+    return process
+
+
+def stub_stats(port):
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}/stats", timeout=5) as response:
+        return json.load(response)
+
+
+async def one_turn(client, index, semaphore):
+    async with semaphore:
+        prompt = PROMPTS[index % len(PROMPTS)]
+        started = time.perf_counter()
+        ttft = None
+        text, errors = [], []
+        async for event in client.invoke(str(uuid.uuid4()), {"prompt": prompt}):
+            if event.type == "text":
+                if ttft is None:
+                    ttft = time.perf_counter() - started
+                text.append(event.data)
+            elif event.type in ("error", "busy"):
+                errors.append(event.data)
+        return {
+            "ttft": ttft,
+            "total": time.perf_counter() - started,
+            "ok": not errors and "".join(text).startswith(f"Answer to: {prompt.split()[0]}"),
+        }
+
+
+async def run_pool(port, pool_size, args):
+    from agentcore_client import AgentCoreClient
+
+    client = AgentCoreClient(
+        AGENT_ARN, "us-east-1", endpoint_url=f"http://127.0.0.1:{port}",
+        max_connections=pool_size, max_attempts=args.max_attempts, backoff_base=0.05,
+    )
+    before = stub_stats(port)
+    semaphore = asyncio.Semaphore(args.concurrency)
+    started = time.perf_counter()
+    try:
+        samples = await asyncio.gather(*(one_turn(client, index, semaphore) for index in range(args.sessions)))
+    finally:
+        elapsed = time.perf_counter() - started
+        client_stats = client.stats()
+        client.close()
+    after = stub_stats(port)
+    return {
+        "pool_size": pool_size,
+        "throughput_rps": len(samples) / elapsed,
+        "completed": sum(sample["ok"] for sample in samples),
+        "ttft": summarize([sample["ttft"] for sample in samples if sample["ttft"] is not None]),
+        "total": summarize([sample["total"] for sample in samples]),
+        "connections": after["connections"] - before["connections"],
+        "requests": after["requests"] - before["requests"],
+        "client": client_stats,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--pool-sizes", default="10,50")
+    parser.add_argument("--max-attempts", type=int, default=4)
+    parser.add_argument("--first-token-delay", type=float, default=0.05, help="stub delay before the first token (seconds)")
+    parser.add_argument("--token-delay", type=float, default=0.005, help="stub delay per streamed word (seconds)")
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--busy-rate", type=float, default=0.0)
+    parser.add_argument("--output", type=pathlib.Path)
+    args = parser.parse_args()
+
+    # スタブは署名を検証しないが、botocoreは署名用の認証情報を必要とする
+    os.environ.setdefault("AWS_ACCESS_KEY_ID", "stub")
+    os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "stub")
+
+    port = free_port()
+    stub = start_stub(port, args)
+    try:
+        rows = [asyncio.run(run_pool(port, int(size), args)) for size in args.pool_sizes.split(",")]
+    finally:
+        stub.terminate()
+        stub.wait(timeout=10)
+
+    print(f"{'pool':>5} {'rps':>7} {'ok':>9} {'ttft p50':>9} {'total p50':>10} {'total p95':>10} {'conns':>6} {'retries':>8}")
+    for row in rows:
+        print(
+            f"{row['pool_size']:>5} {row['throughput_rps']:>7.1f} {row['completed']:>4}/{args.sessions:<4} "
+            f"{row['ttft'].get('p50', 0) * 1000:>7.1f}ms {row['total'].get('p50', 0) * 1000:>8.1f}ms "
+            f"{row['total'].get('p95', 0) * 1000:>8.1f}ms {row['connections']:>6} {row['client']['retries']:>8}"
+        )
+
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(json.dumps({"config": vars(args) | {"output": str(args.output)}, "rows": rows}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""Benchmark of token-budgeted conversation compaction.
+
+Builds a synthetic conversation from the scenario prompts, where every turn
+searches and reads stand-in documentation pages, and reports per turn the
+estimated input tokens of the history with and without
+``context_budget.ContextBudget`` and the time one compaction takes:
+
+    python benchmarks/bench_context_budget.py --turns 30 --max-tokens 12000
+"""
+import argparse
+import json
+import pathlib
+import statistics
+import sys
+import time
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+BENCH_DIR = ROOT / "benchmarks"
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(BENCH_DIR))
+
+from context_budget import ContextBudget, message_tokens  # noqa: E402
+from scenarios import CONVERSATIONS  # noqa: E402
+
+
+def turn_messages(index, prompt, page_chars):
+    from mcp_standin_server import DOC_BASE, document
+
+    url = f"{DOC_BASE}/page-{index}.html"
+    tool_id = f"tooluse_{index}"
+    return [
+        {"role": "user", "content": [{"text": prompt}]},
+        {"role": "assistant", "content": [
+            {"text": "Let me look that up in the documentation."},
+            {"toolUse": {"toolUseId": tool_id, "name": "aws___read_documentation", "input": {"url": url}}},
+        ]},
+        {"role": "user", "content": [
+            {"toolResult": {"toolUseId": tool_id, "status": "success", "content": [{"text": document(url)[:page_chars]}]}},
+        ]},
+        {"role": "assistant", "content": [{"text": f"Based on {url}: " + " ".join(document(url).split("\n\n")[2:6])}]},
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=30)
+    parser.add_argument("--max-tokens", type=int, default=12000)
+    parser.add_argument("--keep-turns", type=int, default=4)
+    parser.add_argument("--page-chars", type=int, default=10000, help="length of each tool result (characters)")
+    parser.add_argument("--output", type=pathlib.Path)
+    args = parser.parse_args()
+
+    prompts = [prompt for turns in CONVERSATIONS.values() for prompt in turns]
+    budget = ContextBudget(max_tokens=args.max_tokens, keep_turns=args.keep_turns)
+    full, compacted = [], []
+    rows = []
+    for index in range(args.turns):
+        started = time.perf_counter()
+        _, tokens_after = budget.compact(compacted)
+        elapsed = time.perf_counter() - started
+        rows.append({
+            "turn": index,
+            "full_tokens": sum(message_tokens(message) for message in full),
+            "compacted_tokens": tokens_after,
+            "compaction_ms": elapsed * 1000,
+        })
+        messages = turn_messages(index, prompts[index % len(prompts)], args.page_chars)
+        full.extend(messages)
+        compacted.extend(json.loads(json.dumps(messages)))
+
+    print(f"{'turn':>4} {'full':>8} {'compacted':>10} {'ms':>6}")
+    for row in rows[::max(1, len(rows) // 10)]:
+        print(f"{row['turn']:>4} {row['full_tokens']:>8} {row['compacted_tokens']:>10} {row['compaction_ms']:>6.2f}")
+    timings = [row["compaction_ms"] for row in rows]
+    print(
+        f"last turn: {rows[-1]['full_tokens']} -> {rows[-1]['compacted_tokens']} tokens; "
+        f"compaction p50 {statistics.median(timings):.2f}ms, max {max(timings):.2f}ms; {budget.stats()}"
+    )
+
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(json.dumps({"config": vars(args) | {"output": str(args.output)}, "rows": rows}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""Benchmark of relevance filtering on documentation tool results.
+
+For every (document, query) pair it reports the estimated input tokens the
+model would receive with and without ``doc_filter.RelevanceFilter``, how many
+of the query terms that occur in the page survive filtering, and the filter's
+own cost with a cold and a warm (cached) passage index. The saved model time
+is an estimate from ``--prefill-ms-per-1k`` (time the model spends per 1k
+input tokens).
+
+By default the documents are the stand-in server's pages for the scenario
+URLs; recorded pages can be supplied as JSON lines of {"url", "query", "text"}:
+
+    python benchmarks/bench_doc_filter.py
+    python benchmarks/bench_doc_filter.py --documents recorded_pages.jsonl --max-tokens 1000
+"""
+import argparse
+import json
+import pathlib
+import statistics
+import sys
+import time
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+BENCH_DIR = ROOT / "benchmarks"
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(BENCH_DIR))
+
+from doc_filter import QueryContext, RelevanceFilter, estimate_tokens, tokenize  # noqa: E402
+from scenarios import SCRIPTS  # noqa: E402
+
+
+def scenario_documents():
+    from mcp_standin_server import document
+
+    pairs = []
+    for prompt, steps in SCRIPTS.items():
+        calls = [call for step in steps if isinstance(step, list) for call in step]
+        phrases = [arguments["search_phrase"] for name, arguments in calls if "search_phrase" in arguments]
+        for name, arguments in calls:
+            if name == "aws___read_documentation":
+                pairs.append({"url": arguments["url"], "query": [prompt, *phrases], "text": document(arguments["url"])})
+    return pairs
+
+
+def load_documents(path):
+    pairs = []
+    with open(path, encoding="utf-8") as lines:
+        for line in lines:
+            if line.strip():
+                record = json.loads(line)
+                query = record["query"]
+                pairs.append({**record, "query": query if isinstance(query, list) else [query]})
+    return pairs
+
+
+def coverage(text, terms):
+    present = set(tokenize(text))
+    return sum(1 for term in set(terms) if term in present)
+
+
+def run(pairs, max_tokens, top_k, repeats, prefill_ms_per_1k):
+    rows = []
+    for pair in pairs:
+        query = QueryContext(pair["query"][0])
+        for phrase in pair["query"][1:]:
+            query.add(phrase)
+        key = (pair["url"], 0, None)
+
+        cold, warm = [], []
+        for _ in range(repeats):
+            # コールド：索引のキャッシュが空の状態から
+            doc_filter = RelevanceFilter(max_tokens=max_tokens, top_k=top_k)
+            started = time.perf_counter()
+            filtered = doc_filter.filter_text(key, pair["text"], query)
+            cold.append(time.perf_counter() - started)
+            started = time.perf_counter()
+            doc_filter.filter_text(key, pair["text"], query)
+            warm.append(time.perf_counter() - started)
+
+        tokens_in = estimate_tokens(pair["text"])
+        tokens_out = estimate_tokens(filtered)
+        terms_in_page = coverage(pair["text"], query.terms)
+        rows.append({
+            "url": pair["url"],
+            "tokens_in": tokens_in,
+            "tokens_out": tokens_out,
+            "reduction": 1 - tokens_out / tokens_in if tokens_in else 0.0,
+            # 先頭の注記にはクエリ自体が含まれるので除いて数える
+            "query_terms_kept": coverage(filtered.split("\n\n", 1)[-1], query.terms) / terms_in_page if terms_in_page else 1.0,
+            "filter_cold_ms": statistics.median(cold) * 1000,
+            "filter_warm_ms": statistics.median(warm) * 1000,
+            "estimated_prefill_saved_ms": (tokens_in - tokens_out) / 1000 * prefill_ms_per_1k,
+        })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", type=pathlib.Path, help="JSON lines of {url, query, text}")
+    parser.add_argument("--max-tokens", type=int, default=1500)
+    parser.add_argument("--top-k", type=int, default=8)
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--prefill-ms-per-1k", type=float, default=40.0, help="model time per 1k input tokens (estimate)")
+    parser.add_argument("--output", type=pathlib.Path)
+    args = parser.parse_args()
+
+    pairs = load_documents(args.documents) if args.documents else scenario_documents()
+    rows = run(pairs, args.max_tokens, args.top_k, args.repeats, args.prefill_ms_per_1k)
+
+    print(f"{'tokens in':>9} {'out':>6} {'saved':>6} {'terms kept':>10} {'cold ms':>8} {'warm ms':>8} {'~model ms saved':>15}  url")
+    for row in rows:
+        print(
+            f"{row['tokens_in']:>9} {row['tokens_out']:>6} {row['reduction']:>6.0%} {row['query_terms_kept']:>10.0%} "
+            f"{row['filter_cold_ms']:>8.2f} {row['filter_warm_ms']:>8.2f} {row['estimated_prefill_saved_ms']:>15.0f}  {row['url']}"
+        )
+    total_in = sum(row["tokens_in"] for row in rows)
+    total_out = sum(row["tokens_out"] for row in rows)
+    if total_in:
+        print(f"total: {total_in} -> {total_out} tokens ({1 - total_out / total_in:.0%} fewer input tokens per tool round)")
+
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(json.dumps({"config": vars(args) | {"output": str(args.output), "documents": str(args.documents)}, "rows": rows}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""Per-event overhead of tool detection on recorded agent streams.
+
+Compares the structured classifier in ``event_classifier`` with the former
+``str(event).lower()`` substring heuristics from ``agent_invocation``.
+
+    python benchmarks/bench_event_classifier.py [--repeat N] [recording.jsonl ...]
+"""
+import argparse
+import json
+import pathlib
+import sys
+import time
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from event_classifier import classify  # noqa: E402
+
+DEFAULT_RECORDINGS = sorted((ROOT / "benchmarks" / "recordings").glob("*.jsonl"))
+
+
+def legacy_detect(event):
+    # 置き換え前のagent_invocationのツール検出ロジック（比較用）
+    if not isinstance(event, dict):
+        return None
+    event_type = event.get('type', '')
+    event_str = str(event).lower()
+    tool_name = None
+    if event_type == 'tool_use' or 'tool_use' in event_str:
+        tool_name = event.get('name', event.get('tool_name', event.get('function_name', None)))
+    elif 'tool' in event and isinstance(event['tool'], dict):
+        tool_obj = event['tool']
+        tool_name = tool_obj.get('name', tool_obj.get('tool_name', tool_obj.get('function', None)))
+    elif 'aws' in event_str and 'documentation' in event_str:
+        if 'search' in event_str:
+            tool_name = "AWS Documentation Search"
+        elif 'read' in event_str:
+            tool_name = "AWS Documentation Reader"
+        else:
+            tool_name = "AWS Documentation Tool"
+    elif 'mcp' in event_str and any(keyword in event_str for keyword in ['call', 'invoke', 'execute']):
+        if 'search_documentation' in event_str:
+            tool_name = "Documentation Search"
+        elif 'read_documentation' in event_str:
+            tool_name = "Documentation Reader"
+        elif 'recommend' in event_str:
+            tool_name = "Content Recommender"
+        else:
+            tool_name = "MCP Tool"
+    elif any(keyword in event_str for keyword in ['function_call', 'api_call', 'service_call']):
+        tool_name = "External Service"
+    return tool_name
+
+
+def load_recording(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def measure(func, events, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter_ns()
+        for event in events:
+            func(event)
+        best = min(best, time.perf_counter_ns() - start)
+    return best / len(events)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("recordings", nargs="*", type=pathlib.Path, default=DEFAULT_RECORDINGS)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    print(f"{'recording':<32} {'events':>7} {'legacy ns/ev':>13} {'classify ns/ev':>15} {'speedup':>8}")
+    for path in args.recordings:
+        events = load_recording(path)
+        legacy = measure(legacy_detect, events, args.repeat)
+        current = measure(classify, events, args.repeat)
+        print(f"{path.name:<32} {len(events):>7} {legacy:>13.0f} {current:>15.0f} {legacy / current:>7.1f}x")
+
+        kinds = {}
+        for event in events:
+            kind = classify(event)[0]
+            kinds[kind] = kinds.get(kind, 0) + 1
+        print(f"  kinds: {kinds}")
+
+
+if __name__ == "__main__":
+    main()
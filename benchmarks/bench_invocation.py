@@ -0,0 +1,287 @@
+"""Offline benchmark of the agent invocation pipeline.
+
+Starts the local MCP stand-in server, boots ``my_strands_agent.app`` in-process
+with the scripted fake model, replays the conversations in ``scenarios.py``
+over HTTP, and measures:
+
+* time-to-first-byte, time-to-first-token, total time and events/sec per request
+* per-stage cost of MCP connect, tool listing, agent build and the event loop
+* peak RSS of the benchmark process and the stand-in server
+
+Results are written as JSON so runs can be compared between versions:
+
+    python benchmarks/bench_invocation.py --iterations 5 --output benchmarks/results/latest.json
+"""
+import argparse
+import asyncio
+import datetime
+import http.client
+import json
+import logging
+import os
+import pathlib
+import resource
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import uuid
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+BENCH_DIR = ROOT / "benchmarks"
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(BENCH_DIR))
+
+from scenarios import CONVERSATIONS, SCRIPTS  # noqa: E402
+from sse_decoder import SSEDecoder, parse_payload  # noqa: E402
+
+SESSION_HEADER = "X-Amzn-Bedrock-AgentCore-Runtime-Session-Id"
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"port {port} did not open within {timeout}s")
+
+
+def start_standin(port, latency, toolset="aws"):
+    process = subprocess.Popen(
+        [
+            sys.executable, str(BENCH_DIR / "mcp_standin_server.py"),
+            "--port", str(port), "--latency", str(latency), "--toolset", toolset,
+        ],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    wait_for_port(port)
+    return process
+
+
+def stop_standin(process, mcp_servers=None, timeout=5.0):
+    """Stop a stand-in server, closing the pooled MCP sessions held against it first."""
+    # 開いたままのセッションがあるとスタンドインのgraceful shutdownが終わらない
+    if mcp_servers is not None:
+        mcp_servers.close()
+    process.terminate()
+    try:
+        process.wait(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+def start_app(app, port):
+    import uvicorn
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    # シグナルハンドラはメインスレッドでしか登録できない
+    server.install_signal_handlers = lambda: None
+    thread = threading.Thread(target=server.run, name="agent-app", daemon=True)
+    thread.start()
+    wait_for_port(port)
+    return server, thread
+
+
+def summarize(values):
+    if not values:
+        return {}
+    ordered = sorted(values)
+    return {
+        "mean": statistics.fmean(ordered),
+        "p50": ordered[len(ordered) // 2],
+        "p95": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+        "max": ordered[-1],
+        "n": len(ordered),
+    }
+
+
+# ---- end-to-end requests -------------------------------------------------
+
+def invoke(port, payload, session_id):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=120)
+    body = json.dumps(payload).encode()
+    started = time.perf_counter()
+    conn.request("POST", "/invocations", body, {"Content-Type": "application/json", SESSION_HEADER: session_id})
+    response = conn.getresponse()
+    decoder = SSEDecoder()
+    ttfb = ttft = None
+    events = received = 0
+    busy = False
+    while True:
+        chunk = response.read1(65536)
+        if not chunk:
+            break
+        now = time.perf_counter()
+        if ttfb is None:
+            ttfb = now - started
+        received += len(chunk)
+        for frame in decoder.feed(chunk):
+            events += 1
+            event = parse_payload(frame)
+            if isinstance(event, tuple):
+                if ttft is None and event[0] == 'text':
+                    ttft = now - started
+                busy = busy or event[0] == 'busy'
+    events += len(decoder.flush())
+    total = time.perf_counter() - started
+    conn.close()
+    return {
+        "status": response.status,
+        "busy": busy,
+        "ttfb": ttfb,
+        "ttft": ttft,
+        "total": total,
+        "events": events,
+        "bytes": received,
+        "events_per_sec": events / total if total else 0.0,
+    }
+
+
+def replay(port, stream_format, iterations):
+    samples = []
+    for _ in range(iterations):
+        for name, turns in CONVERSATIONS.items():
+            session_id = str(uuid.uuid4())
+            for turn, prompt in enumerate(turns):
+                result = invoke(port, {"prompt": prompt, "stream_format": stream_format}, session_id)
+                result.update(conversation=name, turn=turn)
+                samples.append(result)
+    metrics = {}
+    for key in ("ttfb", "ttft", "total", "events", "bytes", "events_per_sec"):
+        metrics[key] = summarize([sample[key] for sample in samples if sample[key] is not None])
+    metrics["errors"] = sum(1 for sample in samples if sample["status"] != 200)
+    metrics["busy"] = sum(1 for sample in samples if sample["busy"])
+    return metrics, samples
+
+
+# ---- per-stage costs -----------------------------------------------------
+
+async def _consume(stream):
+    count = 0
+    async for _ in stream:
+        count += 1
+    return count
+
+
+def measure_stages(agent_module, model, repeats):
+    from strands import Agent
+
+    timings = {"connect": [], "list_tools": [], "agent_build": [], "event_loop": [], "pool_acquire_warm": []}
+    prompt = next(iter(CONVERSATIONS.values()))[0]
+    server = next(iter(agent_module.mcp_servers.servers.values()))
+    for _ in range(repeats):
+        client = agent_module.create_mcp_client(server)
+        started = time.perf_counter()
+        client.start()
+        timings["connect"].append(time.perf_counter() - started)
+        try:
+            started = time.perf_counter()
+            tools = client.list_tools_sync()
+            timings["list_tools"].append(time.perf_counter() - started)
+
+            started = time.perf_counter()
+            agent = Agent(model=model, tools=tools, callback_handler=None)
+            timings["agent_build"].append(time.perf_counter() - started)
+
+            started = time.perf_counter()
+            asyncio.run(_consume(agent.stream_async(prompt)))
+            timings["event_loop"].append(time.perf_counter() - started)
+        finally:
+            client.stop(None, None, None)
+
+        with server.pool.session():
+            pass
+        started = time.perf_counter()
+        with server.pool.session():
+            timings["pool_acquire_warm"].append(time.perf_counter() - started)
+    return {stage: summarize(values) for stage, values in timings.items()}
+
+
+def git_version():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=3)
+    parser.add_argument("--stage-repeats", type=int, default=5)
+    parser.add_argument("--formats", default="raw,compact")
+    parser.add_argument("--first-token-delay", type=float, default=0.0, help="simulated model latency (seconds)")
+    parser.add_argument("--token-delay", type=float, default=0.0, help="simulated delay per streamed chunk (seconds)")
+    parser.add_argument("--tool-latency", type=float, default=0.0, help="simulated MCP tool latency (seconds)")
+    parser.add_argument("--log-level", default="WARNING")
+    parser.add_argument("--output", type=pathlib.Path)
+    args = parser.parse_args()
+
+    standin_port = free_port()
+    app_port = free_port()
+    standin = start_standin(standin_port, args.tool_latency)
+    try:
+        # 接続先はモジュール読み込み時に決まるので、import前に設定する
+        os.environ["MCP_SERVER_URL"] = f"http://127.0.0.1:{standin_port}/mcp"
+        import my_strands_agent
+        from fake_model import ScriptedModel
+
+        logging.getLogger().setLevel(args.log_level)
+        model = ScriptedModel(SCRIPTS, first_token_delay=args.first_token_delay, token_delay=args.token_delay)
+        my_strands_agent.agent_model = model
+
+        stages = measure_stages(my_strands_agent, model, args.stage_repeats)
+        server, thread = start_app(my_strands_agent.app, app_port)
+        try:
+            requests = {}
+            for stream_format in args.formats.split(","):
+                # ウォームアップ（初回接続とツール一覧取得を計測から除く）
+                invoke(app_port, {"prompt": "こんにちは", "stream_format": stream_format}, str(uuid.uuid4()))
+                requests[stream_format], _ = replay(app_port, stream_format, args.iterations)
+        finally:
+            server.should_exit = True
+            thread.join(timeout=10)
+    finally:
+        stop_standin(standin, getattr(sys.modules.get("my_strands_agent"), "mcp_servers", None))
+
+    result = {
+        "version": git_version(),
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "config": vars(args) | {"output": str(args.output) if args.output else None},
+        "stages": stages,
+        "requests": requests,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "standin_peak_rss_mb": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024,
+    }
+    output = args.output or BENCH_DIR / "results" / f"invocation-{result['version'] or 'unknown'}-{int(time.time())}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(result, indent=2, ensure_ascii=False))
+
+    print("stages (ms, p50): " + ", ".join(f"{name}={values['p50'] * 1000:.1f}" for name, values in stages.items() if values))
+    for stream_format, metrics in requests.items():
+        print(
+            f"{stream_format:<8} ttfb p50={metrics['ttfb']['p50'] * 1000:.1f}ms "
+            f"ttft p50={metrics['ttft'].get('p50', 0) * 1000:.1f}ms "
+            f"total p50={metrics['total']['p50'] * 1000:.1f}ms "
+            f"events/s p50={metrics['events_per_sec']['p50']:.0f} "
+            f"bytes p50={metrics['bytes']['p50']:.0f} errors={metrics['errors']}"
+        )
+    print(f"peak RSS {result['peak_rss_mb']:.1f} MB (stand-in {result['standin_peak_rss_mb']:.1f} MB) -> {output}")
+
+
+if __name__ == "__main__":
+    main()
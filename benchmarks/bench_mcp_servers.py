@@ -0,0 +1,135 @@
+"""Benchmark of tool aggregation from several MCP servers.
+
+Starts local stand-ins (the AWS tool set, the ``kb`` runbook tool set and a
+slow copy whose tool calls exceed the call timeout) plus one endpoint where
+nothing listens, configures them through ``MCP_SERVERS`` and measures:
+
+* cold connect + tool listing of all servers in parallel
+* warm connect + listing of all servers in parallel versus one after another
+* how fast the unreachable server is skipped before and after its circuit opens
+* a tool call on the slow server: time to the timeout, then to the fast failure
+  once the circuit is open
+
+    python benchmarks/bench_mcp_servers.py --repeats 20
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import pathlib
+import statistics
+import sys
+import time
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+BENCH_DIR = ROOT / "benchmarks"
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(BENCH_DIR))
+
+from bench_invocation import free_port, start_standin, stop_standin  # noqa: E402
+
+
+async def timed_connect(servers, selected):
+    started = time.perf_counter()
+    async with servers.connect(selected) as connection:
+        elapsed = time.perf_counter() - started
+        return elapsed, [tool.tool_name for tool in connection.tools], dict(connection.unavailable)
+
+
+async def run(servers, repeats, failure_threshold):
+    healthy = [servers.servers[name] for name in ("aws", "kb", "slow")]
+    down = servers.servers["down"]
+    result = {}
+
+    elapsed, tools, unavailable = await timed_connect(servers, healthy)
+    result["cold_parallel_ms"] = elapsed * 1000
+    result["tools"] = tools
+
+    parallel, sequential = [], []
+    for _ in range(repeats):
+        parallel.append((await timed_connect(servers, healthy))[0])
+        started = time.perf_counter()
+        for server in healthy:
+            await timed_connect(servers, [server])
+        sequential.append(time.perf_counter() - started)
+    result["warm_parallel_ms"] = statistics.median(parallel) * 1000
+    result["warm_sequential_ms"] = statistics.median(sequential) * 1000
+
+    # 到達できないサーバー：ブレーカーが開くまでは接続失敗を待ち、開いた後は即座に除外される
+    skips = []
+    for _ in range(failure_threshold + 2):
+        elapsed, _, unavailable = await timed_connect(servers, [*healthy, down])
+        skips.append({"ms": elapsed * 1000, "down": unavailable.get("down")})
+    result["down_server"] = skips
+
+    # 応答しないツール：呼び出しのタイムアウト、ブレーカーが開いた後は即座にエラーを返す
+    slow = servers.servers["slow"]
+    calls = []
+    async with servers.connect([slow]) as connection:
+        client = connection.clients[0][1]
+        for index in range(failure_threshold + 2):
+            started = time.perf_counter()
+            outcome = await client.call_tool_async(
+                f"bench-{index}", "slow___aws___search_documentation", {"search_phrase": "AgentCore"}
+            )
+            calls.append({
+                "ms": (time.perf_counter() - started) * 1000,
+                "status": outcome["status"],
+                "breaker": slow.breaker.state,
+            })
+    result["slow_tool_calls"] = calls
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--call-timeout", type=float, default=1.0, help="tool call timeout of the slow server (seconds)")
+    parser.add_argument("--connect-timeout", type=float, default=2.0)
+    parser.add_argument("--failure-threshold", type=int, default=3)
+    parser.add_argument("--output", type=pathlib.Path)
+    args = parser.parse_args()
+
+    ports = {name: free_port() for name in ("aws", "kb", "slow", "down")}
+    standins = [
+        start_standin(ports["aws"], 0.0),
+        start_standin(ports["kb"], 0.0, toolset="kb"),
+        start_standin(ports["slow"], args.call_timeout * 3),
+    ]
+    try:
+        config = [
+            {"name": name, "url": f"http://127.0.0.1:{port}/mcp", "connect_timeout": args.connect_timeout,
+             "call_timeout": args.call_timeout, "failure_threshold": args.failure_threshold, "reset_timeout": 600}
+            for name, port in ports.items()
+        ]
+        # 接続先はモジュール読み込み時に決まるので、import前に設定する
+        os.environ["MCP_SERVERS"] = json.dumps(config)
+        os.environ["WARMUP"] = "0"
+        import my_strands_agent
+
+        logging.getLogger().setLevel(logging.ERROR)
+        result = asyncio.run(run(my_strands_agent.mcp_servers, args.repeats, args.failure_threshold))
+        result["servers"] = my_strands_agent.mcp_servers.stats()
+    finally:
+        mcp_servers = getattr(sys.modules.get("my_strands_agent"), "mcp_servers", None)
+        if mcp_servers is not None:
+            mcp_servers.close()
+        for standin in standins:
+            stop_standin(standin)
+
+    print(f"tools: {', '.join(result['tools'])}")
+    print(
+        f"connect+list: cold {result['cold_parallel_ms']:.1f}ms, warm parallel {result['warm_parallel_ms']:.1f}ms "
+        f"vs sequential {result['warm_sequential_ms']:.1f}ms"
+    )
+    print("unreachable server: " + ", ".join(f"{skip['ms']:.0f}ms ({skip['down']})" for skip in result["down_server"]))
+    print("slow tool calls: " + ", ".join(f"{call['ms']:.0f}ms ({call['status']}, {call['breaker']})" for call in result["slow_tool_calls"]))
+
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(json.dumps({"config": vars(args) | {"output": str(args.output)}, **result}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""Benchmark of the response cache.
+
+Boots ``my_strands_agent.app`` in-process with ``RESPONSE_CACHE=1`` against
+the local MCP stand-in and the scripted fake model, asks the first question
+of every scenario conversation in a new session (a miss, which runs the model
+and tools), then asks it again in another new session (a hit, replayed from
+the cache) and reports time-to-first-token and total time of both, plus the
+cache statistics from ``/metrics``:
+
+    python benchmarks/bench_response_cache.py --first-token-delay 0.5 --tool-latency 0.2
+    python benchmarks/bench_response_cache.py --pacing 1.0
+"""
+import argparse
+import http.client
+import json
+import logging
+import os
+import pathlib
+import sys
+import uuid
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+BENCH_DIR = ROOT / "benchmarks"
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(BENCH_DIR))
+
+from bench_invocation import free_port, invoke, start_app, start_standin, stop_standin, summarize  # noqa: E402
+from scenarios import CONVERSATIONS, SCRIPTS  # noqa: E402
+
+
+def fetch_metrics(port):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+    conn.request("GET", "/metrics")
+    metrics = json.load(conn.getresponse())
+    conn.close()
+    return metrics
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeats", type=int, default=3, help="hits per question")
+    parser.add_argument("--pacing", type=float, default=0.0, help="replay_pacing of the cached replays")
+    parser.add_argument("--first-token-delay", type=float, default=0.5, help="simulated model latency (seconds)")
+    parser.add_argument("--token-delay", type=float, default=0.01, help="simulated delay per streamed chunk (seconds)")
+    parser.add_argument("--tool-latency", type=float, default=0.2, help="simulated MCP tool latency (seconds)")
+    parser.add_argument("--output", type=pathlib.Path)
+    args = parser.parse_args()
+
+    standin_port = free_port()
+    app_port = free_port()
+    standin = start_standin(standin_port, args.tool_latency)
+    try:
+        # 接続先とキャッシュの設定はモジュール読み込み時に決まるので、import前に設定する
+        os.environ["MCP_SERVER_URL"] = f"http://127.0.0.1:{standin_port}/mcp"
+        os.environ["RESPONSE_CACHE"] = "1"
+        import my_strands_agent
+        from fake_model import ScriptedModel
+
+        logging.getLogger().setLevel(logging.WARNING)
+        my_strands_agent.agent_model = ScriptedModel(
+            SCRIPTS, first_token_delay=args.first_token_delay, token_delay=args.token_delay
+        )
+        server, thread = start_app(my_strands_agent.app, app_port)
+        try:
+            # ツールカタログの取得を済ませる（カタログが未取得の間はキャッシュを使わない）
+            invoke(app_port, {"prompt": "こんにちは", "stream_format": "compact"}, str(uuid.uuid4()))
+            misses, hits = [], []
+            for turns in CONVERSATIONS.values():
+                payload = {"prompt": turns[0], "stream_format": "compact", "replay_pacing": args.pacing}
+                misses.append(invoke(app_port, payload, str(uuid.uuid4())))
+                for _ in range(args.repeats):
+                    hits.append(invoke(app_port, payload, str(uuid.uuid4())))
+            cache_stats = fetch_metrics(app_port)["response_cache"]
+        finally:
+            server.should_exit = True
+            thread.join(timeout=10)
+    finally:
+        stop_standin(standin, getattr(sys.modules.get("my_strands_agent"), "mcp_servers", None))
+
+    result = {
+        "miss": {key: summarize([sample[key] for sample in misses if sample[key] is not None]) for key in ("ttft", "total")},
+        "hit": {key: summarize([sample[key] for sample in hits if sample[key] is not None]) for key in ("ttft", "total")},
+        "response_cache": cache_stats,
+    }
+    for name in ("miss", "hit"):
+        print(
+            f"{name:<5} ttft p50={result[name]['ttft'].get('p50', 0) * 1000:8.1f}ms "
+            f"total p50={result[name]['total'].get('p50', 0) * 1000:8.1f}ms"
+        )
+    print(
+        f"hit rate {cache_stats['hit_rate']:.0%} ({cache_stats['hits']} hits, {cache_stats['misses']} misses), "
+        f"{cache_stats['entries']} entries, {cache_stats['bytes']} bytes, ~{cache_stats['saved_ms']:.0f}ms of streaming saved"
+    )
+
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(json.dumps({"config": vars(args) | {"output": str(args.output)}, **result}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
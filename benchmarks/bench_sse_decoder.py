@@ -0,0 +1,177 @@
+"""Client-side SSE parsing cost on recorded agent streams.
+
+Replays the recorded Strands events as the SSE bytes AgentCore sends (raw
+format, with the Python-repr fallback for callback events, and the compact
+format), then compares the former ``iter_lines(chunk_size=10)`` + if/elif
+parsing from ``invoke_agent`` with ``sse_decoder``.
+
+    python benchmarks/bench_sse_decoder.py [--repeat N] [recording.jsonl ...]
+"""
+import argparse
+import io
+import json
+import pathlib
+import sys
+import time
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from event_classifier import classify  # noqa: E402
+from sse_decoder import iter_sse_data, parse_payload  # noqa: E402
+from stream_format import CompactStream  # noqa: E402
+
+DEFAULT_RECORDINGS = sorted((ROOT / "benchmarks" / "recordings").glob("*.jsonl"))
+
+
+def to_sse(obj):
+    return b"data: " + json.dumps(obj).encode() + b"\n\n"
+
+
+def raw_stream_bytes(events):
+    out = bytearray()
+    for event in events:
+        # Strandsのコールバックイベントはシリアライズできないためrepr文字列として送られる
+        out += to_sse(str(event) if "event_loop_cycle_id" in event else event)
+    return bytes(out)
+
+
+def compact_stream_bytes(events):
+    compact = CompactStream()
+    out = bytearray()
+    for event in events:
+        kind, info = classify(event)
+        for item in compact.translate(kind, info, event):
+            out += to_sse(item)
+    return bytes(out)
+
+
+def legacy_iter_lines(body, chunk_size=10):
+    # botocore StreamingBody.iter_lines と同じ処理
+    pending = b''
+    while True:
+        chunk = body.read(chunk_size)
+        if not chunk:
+            break
+        lines = (pending + chunk).splitlines(True)
+        for line in lines[:-1]:
+            yield line.splitlines(False)[0]
+        pending = lines[-1]
+    if pending:
+        yield pending.splitlines(False)[0]
+
+
+def legacy_parse(body):
+    # 置き換え前のinvoke_agentのパース処理（比較用、raw表示オフ）
+    for line in legacy_iter_lines(body):
+        if line:
+            line = line.decode("utf-8")
+            if line.startswith("data: "):
+                line = line[6:]
+                try:
+                    data = json.loads(line)
+                    if isinstance(data, dict):
+                        if data.get('init_event_loop') or data.get('start') or data.get('start_event_loop'):
+                            yield ('init', data)
+                        elif 'event' in data:
+                            event = data['event']
+                            if 'messageStart' in event:
+                                yield ('message_start', event['messageStart'])
+                            elif 'contentBlockDelta' in event:
+                                text = event['contentBlockDelta'].get('delta', {}).get('text', '')
+                                if text:
+                                    yield ('text', text)
+                            elif 'contentBlockStart' in event:
+                                start = event['contentBlockStart'].get('start', {})
+                                if 'toolUse' in start:
+                                    tool_info = start['toolUse']
+                                    yield ('tool_use', {
+                                        'name': tool_info.get('name', 'Unknown Tool'),
+                                        'id': tool_info.get('toolUseId', ''),
+                                        'input': tool_info.get('input', {})
+                                    })
+                            elif 'contentBlockStop' in event:
+                                yield ('content_block_stop', event['contentBlockStop'])
+                            elif 'messageStop' in event:
+                                yield ('message_stop', event['messageStop'])
+                            elif 'metadata' in event:
+                                yield ('metadata', event['metadata'])
+                        elif 'tool_name' in data and data.get('type') == 'tool_use':
+                            yield ('strands_tool', {
+                                'name': data['tool_name'],
+                                'debug_data': data.get('debug_data', {})
+                            })
+                        elif 'event_loop_cycle_id' in str(data):
+                            yield ('strands_internal', data)
+                        elif 'message' in data and 'content' in data['message']:
+                            for content in data['message']['content']:
+                                if 'toolUse' in content:
+                                    tool_use = content['toolUse']
+                                    yield ('tool_use', {
+                                        'name': tool_use.get('name', 'Unknown Tool'),
+                                        'id': tool_use.get('toolUseId', ''),
+                                        'input': tool_use.get('input', {})
+                                    })
+                        elif 'data' in data and isinstance(data['data'], str):
+                            yield ('text', data['data'])
+                except json.JSONDecodeError:
+                    if "'event_loop_cycle_id'" in line:
+                        yield ('strands_internal', line)
+                    elif not line.startswith("{'") and not line.startswith('{"'):
+                        yield ('text', line)
+
+
+def decoder_parse(body):
+    for payload in iter_sse_data(body):
+        event = parse_payload(payload)
+        if event is None:
+            continue
+        if isinstance(event, list):
+            yield from event
+        else:
+            yield event
+
+
+class CountingBody(io.BytesIO):
+    reads = 0
+
+    def read(self, size=-1):
+        self.reads += 1
+        return super().read(size)
+
+    def read1(self, size=-1):
+        self.reads += 1
+        return super().read1(size)
+
+
+def measure(parse, data, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        body = CountingBody(data)
+        start = time.perf_counter()
+        events = list(parse(body))
+        best = min(best, time.perf_counter() - start)
+    return best, body.reads, events
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("recordings", nargs="*", type=pathlib.Path, default=DEFAULT_RECORDINGS)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'stream':<40} {'bytes':>8} {'parser':<8} {'ms':>8} {'reads':>7} {'text chars':>10}")
+    for path in args.recordings:
+        with open(path, encoding="utf-8") as f:
+            events = [json.loads(line) for line in f if line.strip()]
+        streams = [("raw", raw_stream_bytes(events)), ("compact", compact_stream_bytes(events))]
+        for name, data in streams:
+            label = f"{path.stem} ({name})"
+            for parser_name, parse in (("legacy", legacy_parse), ("decoder", decoder_parse)):
+                elapsed, reads, parsed = measure(parse, data, args.repeat)
+                text = sum(len(chunk) for kind, chunk in parsed if kind == 'text')
+                print(f"{label:<40} {len(data):>8} {parser_name:<8} {elapsed * 1000:>8.2f} {reads:>7} {text:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""Cold-start benchmark of the agent container.
+
+Measures, against the local MCP stand-in and the scripted fake model:
+
+* import time of ``my_strands_agent`` (wall clock and the heaviest top-level
+  packages from ``python -X importtime``)
+* time from process start until the port accepts connections and until
+  ``/ping`` reports ``Healthy`` (warmup finished)
+* time-to-first-token and total time of the first and second invocation
+
+with the startup warmup enabled and disabled (``WARMUP=0``):
+
+    python benchmarks/bench_startup.py --runs 3 --output benchmarks/results/startup.json
+"""
+import argparse
+import datetime
+import json
+import os
+import pathlib
+import re
+import subprocess
+import sys
+import time
+import urllib.request
+import uuid
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+BENCH_DIR = ROOT / "benchmarks"
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(BENCH_DIR))
+
+from bench_invocation import free_port, git_version, invoke, start_standin, stop_standin, summarize, wait_for_port  # noqa: E402
+from scenarios import CONVERSATIONS  # noqa: E402
+
+IMPORT_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def measure_imports(env, top=10):
+    code = "import time; started = time.perf_counter(); import my_strands_agent; print(time.perf_counter() - started)"
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code], cwd=ROOT, env=env, capture_output=True, text=True, check=True
+    )
+    packages = {}
+    for line in result.stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        # インデントのないものがトップレベルのimport（累積時間はその配下すべてを含む）
+        if match and len(match.group(3)) == 1:
+            name = match.group(4).split(".")[0]
+            packages[name] = packages.get(name, 0) + int(match.group(2)) / 1e6
+    heaviest = sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top]
+    return {"total": float(result.stdout.strip().splitlines()[-1]), "packages": dict(heaviest)}
+
+
+def serve(port):
+    # 子プロセス側：my_strands_agentの__main__と同じ手順で起動する（モデルのみスクリプト化したものに差し替える）
+    import my_strands_agent
+    from fake_model import ScriptedModel
+    from scenarios import SCRIPTS
+
+    my_strands_agent.agent_model = ScriptedModel(SCRIPTS)
+    if my_strands_agent.WARMUP_ENABLED:
+        my_strands_agent.warmup.start()
+    my_strands_agent.app.run(port=port)
+
+
+def ping(port):
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/ping", timeout=2) as response:
+            return json.load(response).get("status")
+    except OSError:
+        return None
+
+
+def cold_start(env, warmup_enabled, timeout=60.0):
+    port = free_port()
+    args = [sys.executable, str(pathlib.Path(__file__).resolve()), "--serve", str(port)]
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        args, cwd=ROOT, env=env | {"WARMUP": "1" if warmup_enabled else "0"},
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        wait_for_port(port, timeout)
+        listening = time.perf_counter() - started
+        while ping(port) != "Healthy":
+            if time.perf_counter() - started > timeout:
+                raise RuntimeError(f"agent on port {port} did not become ready within {timeout}s")
+            time.sleep(0.01)
+        ready = time.perf_counter() - started
+
+        prompt = next(iter(CONVERSATIONS.values()))[0]
+        first = invoke(port, {"prompt": prompt, "stream_format": "compact"}, str(uuid.uuid4()))
+        second = invoke(port, {"prompt": prompt, "stream_format": "compact"}, str(uuid.uuid4()))
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=5) as response:
+            warmup = json.load(response).get("warmup")
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+    return {
+        "time_to_listen": listening,
+        "time_to_ready": ready,
+        "first_ttft": first["ttft"],
+        "first_total": first["total"],
+        "second_ttft": second["ttft"],
+        "second_total": second["total"],
+        "warmup": warmup,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3, help="cold starts per configuration")
+    parser.add_argument("--tool-latency", type=float, default=0.0, help="simulated MCP tool latency (seconds)")
+    parser.add_argument("--output", type=pathlib.Path)
+    parser.add_argument("--serve", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve)
+        return
+
+    standin_port = free_port()
+    standin = start_standin(standin_port, args.tool_latency)
+    env = os.environ | {"MCP_SERVER_URL": f"http://127.0.0.1:{standin_port}/mcp"}
+    try:
+        imports = measure_imports(env)
+        configurations = {}
+        for name, warmup_enabled in (("warmup", True), ("no_warmup", False)):
+            runs = [cold_start(env, warmup_enabled) for _ in range(args.runs)]
+            configurations[name] = {
+                key: summarize([run[key] for run in runs if run[key] is not None])
+                for key in ("time_to_listen", "time_to_ready", "first_ttft", "first_total", "second_ttft", "second_total")
+            }
+            configurations[name]["warmup_steps"] = runs[-1]["warmup"]
+    finally:
+        stop_standin(standin)
+
+    result = {
+        "version": git_version(),
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "config": vars(args) | {"output": str(args.output) if args.output else None},
+        "imports": imports,
+        "cold_start": configurations,
+    }
+    output = args.output or BENCH_DIR / "results" / f"startup-{result['version'] or 'unknown'}-{int(time.time())}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(result, indent=2, ensure_ascii=False))
+
+    print(f"import my_strands_agent: {imports['total'] * 1000:.0f}ms")
+    for package, seconds in imports["packages"].items():
+        print(f"  {package:<24} {seconds * 1000:>7.0f}ms")
+    for name, metrics in configurations.items():
+        print(
+            f"{name:<10} listen p50={metrics['time_to_listen']['p50'] * 1000:.0f}ms "
+            f"ready p50={metrics['time_to_ready']['p50'] * 1000:.0f}ms "
+            f"first ttft p50={metrics['first_ttft'].get('p50', 0) * 1000:.0f}ms "
+            f"second ttft p50={metrics['second_ttft'].get('p50', 0) * 1000:.0f}ms"
+        )
+    print(f"-> {output}")
+
+
+if __name__ == "__main__":
+    main()
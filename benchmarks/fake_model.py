@@ -0,0 +1,100 @@
+"""Scripted stand-in for the Bedrock model used by the offline benchmarks.
+
+Each prompt maps to a list of steps. A step is either a final text answer
+(``str``), a structured answer (``dict`` of ``output_model`` fields, streamed
+as JSON text) or a list of tool calls ``[(tool_name, input_dict), ...]``; the
+model picks the step from the number of assistant turns since the prompt,
+so it is stateless and safe to share between concurrent agents.
+"""
+import asyncio
+import itertools
+import json
+
+try:
+    from strands.models.model import Model
+except ImportError:  # strands-agents < 1.0
+    from strands.types.models import Model
+
+_tool_ids = itertools.count(1)
+
+
+class ScriptedModel(Model):
+    def __init__(self, scripts, default_answer="Scripted answer.", chunk_size=4,
+                 first_token_delay=0.0, token_delay=0.0):
+        self.scripts = scripts
+        self.default_answer = default_answer
+        self.config = {
+            "model_id": "scripted",
+            "chunk_size": chunk_size,
+            "first_token_delay": first_token_delay,
+            "token_delay": token_delay,
+        }
+
+    def update_config(self, **model_config):
+        self.config.update(model_config)
+
+    def get_config(self):
+        return self.config
+
+    async def structured_output(self, output_model, prompt, system_prompt=None, **kwargs):
+        response = self._response(prompt)
+        if self.config["first_token_delay"]:
+            await asyncio.sleep(self.config["first_token_delay"])
+        if isinstance(response, dict):
+            yield {"output": output_model(**response)}
+        elif isinstance(response, str):
+            # テキストの台本はJSONとして解釈する（Bedrockと同様に合わなければValidationError）
+            yield {"output": output_model.model_validate_json(response)}
+        else:
+            raise ValueError(f"scripted step for structured output is a tool call: {response!r}")
+
+    async def stream(self, messages, tool_specs=None, system_prompt=None, **kwargs):
+        response = self._response(messages)
+        if isinstance(response, dict):
+            response = json.dumps(response, ensure_ascii=False)
+
+        if self.config["first_token_delay"]:
+            await asyncio.sleep(self.config["first_token_delay"])
+        yield {"messageStart": {"role": "assistant"}}
+        output_tokens = 0
+        if isinstance(response, str):
+            size = self.config["chunk_size"]
+            for index in range(0, len(response), size):
+                if self.config["token_delay"]:
+                    await asyncio.sleep(self.config["token_delay"])
+                yield {"contentBlockDelta": {"delta": {"text": response[index:index + size]}, "contentBlockIndex": 0}}
+                output_tokens += 1
+            yield {"contentBlockStop": {"contentBlockIndex": 0}}
+            stop_reason = "end_turn"
+        else:
+            for block, (name, tool_input) in enumerate(response):
+                tool_use_id = f"tooluse_scripted{next(_tool_ids):06d}"
+                yield {"contentBlockStart": {"start": {"toolUse": {"toolUseId": tool_use_id, "name": name}}, "contentBlockIndex": block}}
+                yield {"contentBlockDelta": {"delta": {"toolUse": {"input": json.dumps(tool_input)}}, "contentBlockIndex": block}}
+                yield {"contentBlockStop": {"contentBlockIndex": block}}
+                output_tokens += 10
+            stop_reason = "tool_use"
+        yield {"messageStop": {"stopReason": stop_reason}}
+        input_tokens = sum(len(json.dumps(message, default=str)) for message in messages) // 4
+        yield {"metadata": {
+            "usage": {"inputTokens": input_tokens, "outputTokens": output_tokens, "totalTokens": input_tokens + output_tokens},
+            "metrics": {"latencyMs": 0},
+        }}
+
+    def _response(self, messages):
+        prompt, step = _locate(messages)
+        steps = self.scripts.get(prompt, [self.default_answer])
+        return steps[min(step, len(steps) - 1)]
+
+
+def _locate(messages):
+    # 最後のユーザーテキスト（プロンプト）と、それ以降のアシスタント応答数を求める
+    step = 0
+    for message in reversed(messages):
+        if message["role"] == "assistant":
+            step += 1
+            continue
+        for content in message["content"]:
+            if "text" in content:
+                return content["text"], step
+    return "", step
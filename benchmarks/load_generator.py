@@ -0,0 +1,122 @@
+"""Local load generator for the agent entrypoint.
+
+Drives ``/invocations`` at rising concurrency levels and reports throughput,
+p50/p99 latency, busy rejections and the server's queue metrics. By default it
+boots the agent in-process against the MCP stand-in with the scripted model
+(simulated model latency keeps requests in flight long enough to queue):
+
+    python benchmarks/load_generator.py --levels 1,4,16,64 --requests 64
+    python benchmarks/load_generator.py --port 8080   # an already running agent
+"""
+import argparse
+import concurrent.futures
+import json
+import logging
+import os
+import pathlib
+import sys
+import time
+import urllib.request
+import uuid
+
+BENCH_DIR = pathlib.Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR))
+
+from bench_invocation import free_port, invoke, start_app, start_standin, stop_standin, summarize  # noqa: E402
+from scenarios import CONVERSATIONS, SCRIPTS  # noqa: E402
+
+PROMPTS = [turns[0] for turns in CONVERSATIONS.values()]
+
+
+def fetch_metrics(port):
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=5) as response:
+            return json.load(response)
+    except OSError:
+        return None
+
+
+def run_level(port, concurrency, requests, deadline_ms):
+    def one(index):
+        payload = {"prompt": PROMPTS[index % len(PROMPTS)], "stream_format": "compact"}
+        if deadline_ms:
+            payload["deadline_ms"] = deadline_ms
+        # セッションごとの直列化の影響を除くため、毎回新しいセッションIDを使う
+        return invoke(port, payload, str(uuid.uuid4()))
+
+    started = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as executor:
+        samples = list(executor.map(one, range(requests)))
+    elapsed = time.perf_counter() - started
+
+    completed = [sample for sample in samples if sample["status"] == 200 and not sample["busy"]]
+    latency = summarize([sample["total"] for sample in completed])
+    ordered = sorted(sample["total"] for sample in completed)
+    return {
+        "concurrency": concurrency,
+        "requests": requests,
+        "completed": len(completed),
+        "busy": sum(1 for sample in samples if sample["busy"]),
+        "errors": sum(1 for sample in samples if sample["status"] != 200),
+        "throughput_rps": len(completed) / elapsed if elapsed else 0.0,
+        "latency": latency,
+        "p99": ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))] if ordered else None,
+        "server": fetch_metrics(port),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--levels", default="1,2,4,8,16,32,64")
+    parser.add_argument("--requests", type=int, default=64, help="requests per concurrency level")
+    parser.add_argument("--deadline-ms", type=int, default=0, help="deadline_ms sent with each request")
+    parser.add_argument("--port", type=int, help="target an already running agent instead of booting one")
+    parser.add_argument("--first-token-delay", type=float, default=0.2)
+    parser.add_argument("--token-delay", type=float, default=0.002)
+    parser.add_argument("--tool-latency", type=float, default=0.05)
+    parser.add_argument("--output", type=pathlib.Path)
+    args = parser.parse_args()
+
+    standin = server = None
+    port = args.port
+    if port is None:
+        standin_port = free_port()
+        port = free_port()
+        standin = start_standin(standin_port, args.tool_latency)
+        os.environ["MCP_SERVER_URL"] = f"http://127.0.0.1:{standin_port}/mcp"
+        import my_strands_agent
+        from fake_model import ScriptedModel
+
+        logging.getLogger().setLevel(logging.WARNING)
+        my_strands_agent.agent_model = ScriptedModel(
+            SCRIPTS, first_token_delay=args.first_token_delay, token_delay=args.token_delay
+        )
+        server, thread = start_app(my_strands_agent.app, port)
+
+    results = []
+    try:
+        print(f"{'conc':>5} {'done':>5} {'busy':>5} {'err':>4} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'queue max':>9} {'wait p99 ms':>11}")
+        for level in (int(value) for value in args.levels.split(",")):
+            result = run_level(port, level, args.requests, args.deadline_ms)
+            results.append(result)
+            invocations = (result["server"] or {}).get("invocations", {})
+            print(
+                f"{level:>5} {result['completed']:>5} {result['busy']:>5} {result['errors']:>4} "
+                f"{result['throughput_rps']:>8.1f} {result['latency'].get('p50', 0) * 1000:>8.0f} "
+                f"{(result['p99'] or 0) * 1000:>8.0f} {invocations.get('max_queue_depth', '-'):>9} "
+                f"{invocations.get('wait_ms_p99', 0):>11.0f}"
+            )
+    finally:
+        if server is not None:
+            server.should_exit = True
+            thread.join(timeout=10)
+        if standin is not None:
+            stop_standin(standin, my_strands_agent.mcp_servers)
+
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""Local streamable-HTTP stand-in for the AWS Knowledge MCP server.
+
+Serves the same tool names as knowledge-mcp.global.api.aws with canned,
+deterministic results so the agent can be exercised offline. ``--toolset kb``
+serves a second, unprefixed tool set (internal runbooks) for testing the
+aggregation of several MCP servers:
+
+    python benchmarks/mcp_standin_server.py --port 8765 [--latency 0.05]
+    MCP_SERVER_URL=http://127.0.0.1:8765/mcp python -m my_strands_agent
+
+    python benchmarks/mcp_standin_server.py --port 8766 --toolset kb
+    MCP_SERVERS=aws=http://127.0.0.1:8765/mcp,kb=http://127.0.0.1:8766/mcp python -m my_strands_agent
+"""
+import argparse
+import asyncio
+import json
+
+from mcp.server.fastmcp import FastMCP
+
+DOC_BASE = "https://docs.aws.amazon.com/bedrock-agentcore/latest/devguide"
+
+PARAGRAPHS = [
+    "Amazon Bedrock AgentCore enables you to deploy and operate highly effective agents securely, at scale using any framework and model.",
+    "AgentCore Runtime provides a secure, serverless runtime purpose-built for deploying and scaling dynamic AI agents and tools.",
+    "AgentCore Memory makes it easy for developers to build context aware agents by eliminating complex memory infrastructure management.",
+    "AgentCore Gateway provides a secure way for agents to discover and use tools along with the ability to convert APIs and Lambda functions into MCP-compatible tools.",
+    "AgentCore Identity provides a secure, scalable agent identity and access management capability.",
+    "AgentCore Observability helps developers trace, debug, and monitor agent performance in production through unified operational dashboards.",
+    "Sessions are isolated in dedicated microVMs with isolated CPU, memory, and filesystem resources and are terminated after inactivity.",
+    "Invocations stream responses using server-sent events when the entrypoint returns a generator.",
+]
+
+
+def document(url, paragraphs=120):
+    # URLから決定的な長いドキュメントを生成する
+    seed = sum(url.encode())
+    sections = []
+    for index in range(paragraphs):
+        if index % 8 == 0:
+            sections.append(f"## Section {index // 8 + 1}")
+        sections.append(PARAGRAPHS[(seed + index) % len(PARAGRAPHS)])
+    return f"# {url.rsplit('/', 1)[-1]}\n\n" + "\n\n".join(sections)
+
+
+def create_server(host="127.0.0.1", port=8765, latency=0.0, toolset="aws"):
+    server = FastMCP(f"{toolset}-standin", host=host, port=port)
+
+    async def delay():
+        if latency:
+            await asyncio.sleep(latency)
+
+    if toolset == "kb":
+        @server.tool(name="search_runbooks")
+        async def search_runbooks(query: str, limit: int = 5) -> str:
+            """Search internal operations runbooks (stand-in)."""
+            await delay()
+            slug = query.lower().replace(" ", "-")
+            return json.dumps([{"id": f"{slug}-{rank}", "title": f"Runbook: {query} ({rank})"} for rank in range(limit)])
+
+        @server.tool(name="get_runbook")
+        async def get_runbook(runbook_id: str) -> str:
+            """Read an internal operations runbook (stand-in)."""
+            await delay()
+            return document(f"runbooks/{runbook_id}", paragraphs=24)
+
+        return server
+
+    @server.tool(name="aws___search_documentation")
+    async def search_documentation(search_phrase: str, limit: int = 10) -> str:
+        """Search AWS documentation (stand-in)."""
+        await delay()
+        results = [
+            {
+                "rank_order": rank + 1,
+                "url": f"{DOC_BASE}/{search_phrase.lower().replace(' ', '-')}-{rank}.html",
+                "title": f"{search_phrase} - page {rank}",
+                "context": PARAGRAPHS[rank % len(PARAGRAPHS)],
+            }
+            for rank in range(limit)
+        ]
+        return json.dumps(results)
+
+    @server.tool(name="aws___read_documentation")
+    async def read_documentation(url: str, max_length: int = 10000, start_index: int = 0) -> str:
+        """Read an AWS documentation page as markdown (stand-in)."""
+        await delay()
+        return document(url)[start_index:start_index + max_length]
+
+    @server.tool(name="aws___recommend")
+    async def recommend(url: str) -> str:
+        """Recommend related AWS documentation pages (stand-in)."""
+        await delay()
+        return json.dumps([{"url": f"{url}#related-{index}", "title": f"Related {index}"} for index in range(5)])
+
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="artificial delay per tool call (seconds)")
+    parser.add_argument("--toolset", choices=("aws", "kb"), default="aws")
+    args = parser.parse_args()
+    create_server(args.host, args.port, args.latency, args.toolset).run(transport="streamable-http")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+"""Scripted multi-tool conversations replayed by the offline benchmarks."""
+
+ANSWER = (
+    "Amazon Bedrock AgentCoreは、任意のフレームワークとモデルを使用して、高性能なAIエージェントを安全かつ大規模に"
+    "デプロイ・運用するためのサービスです。主なコンポーネントとしてRuntime、Memory、Gateway、Identity、"
+    "Observabilityがあり、Runtimeはセッションごとに分離されたmicroVMでエージェントを実行します。"
+) * 4
+
+# 会話ごとのターン（プロンプト）と、各プロンプトに対するモデルの応答手順
+CONVERSATIONS = {
+    "search_read_answer": [
+        "Bedrock AgentCoreについて教えて",
+        "AgentCore Runtimeのセッション分離はどうなっていますか？",
+    ],
+    "parallel_tools": [
+        "AgentCore MemoryとGatewayの違いは？",
+    ],
+    "no_tools": [
+        "こんにちは",
+    ],
+}
+
+SCRIPTS = {
+    "Bedrock AgentCoreについて教えて": [
+        [("aws___search_documentation", {"search_phrase": "Bedrock AgentCore", "limit": 10})],
+        [("aws___read_documentation", {"url": "https://docs.aws.amazon.com/bedrock-agentcore/latest/devguide/what-is-bedrock-agentcore.html"})],
+        ANSWER,
+    ],
+    "AgentCore Runtimeのセッション分離はどうなっていますか？": [
+        [("aws___search_documentation", {"search_phrase": "AgentCore Runtime session isolation", "limit": 5})],
+        [("aws___read_documentation", {"url": "https://docs.aws.amazon.com/bedrock-agentcore/latest/devguide/runtime-sessions.html"}),
+         ("aws___recommend", {"url": "https://docs.aws.amazon.com/bedrock-agentcore/latest/devguide/runtime-sessions.html"})],
+        ANSWER[:300],
+    ],
+    "AgentCore MemoryとGatewayの違いは？": [
+        [("aws___search_documentation", {"search_phrase": "AgentCore Memory", "limit": 5}),
+         ("aws___search_documentation", {"search_phrase": "AgentCore Gateway", "limit": 5})],
+        ANSWER[:400],
+    ],
+    "こんにちは": [
+        "こんにちは！AWSについて何でも聞いてください。",
+    ],
+}
@@ -0,0 +1,178 @@
+import asyncio
+import contextvars
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# 現在のリクエストでクライアント切断時に呼ぶコールバックのリスト（DisconnectMiddlewareが設定する）
+_disconnect_callbacks = contextvars.ContextVar("disconnect_callbacks", default=None)
+
+
+class DisconnectMiddleware:
+    """ASGI middleware that notices when the client of a streaming request goes away.
+
+    Once the request body has been read, a watcher task keeps reading the
+    ASGI receive channel; on ``http.disconnect`` it runs the callbacks that
+    handlers registered through ``on_disconnect()``. Without it a disconnect
+    is only noticed the next time a chunk is sent, which never happens while
+    the agent waits for a slow tool call.
+    """
+
+    def __init__(self, app, paths=("/invocations",)):
+        self.app = app
+        self.paths = paths
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        callbacks = []
+        body_read = asyncio.Event()
+        finished = False
+
+        def disconnected():
+            if finished:
+                return
+            for callback in callbacks:
+                try:
+                    callback()
+                except Exception:
+                    logger.warning("Disconnect callback failed", exc_info=True)
+
+        async def receive_body():
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                disconnected()
+            elif not message.get("more_body", False):
+                body_read.set()
+            return message
+
+        async def watch():
+            await body_read.wait()
+            while True:
+                message = await receive()
+                if message["type"] == "http.disconnect":
+                    disconnected()
+                    return
+
+        token = _disconnect_callbacks.set(callbacks)
+        watcher = asyncio.create_task(watch())
+        try:
+            await self.app(scope, receive_body, send)
+        finally:
+            # 応答の送信完了後に届くdisconnectは切断として扱わない
+            finished = True
+            watcher.cancel()
+            _disconnect_callbacks.reset(token)
+
+
+def on_disconnect(callback):
+    """Run ``callback`` if the client of the current request disconnects."""
+    callbacks = _disconnect_callbacks.get()
+    if callbacks is not None:
+        callbacks.append(callback)
+    return callbacks is not None
+
+
+class CancelScope:
+    """Cancellation handle for one running invocation.
+
+    ``run()`` drives the invocation's async generator on the caller's task.
+    ``cancel()`` interrupts it right away when the generator is awaiting
+    (model stream, tool call), so the ``CancelledError`` unwinds through the
+    agent stream and the MCP call; when the generator is suspended at a
+    ``yield`` it is closed before the next event instead.
+    """
+
+    def __init__(self, registry, session_id):
+        self.registry = registry
+        self.session_id = session_id
+        self.reason = None
+        self.started = time.monotonic()
+        self.events = 0
+        self._task = None
+        self._inside = False
+
+    def cancel(self, reason):
+        if self.reason is not None:
+            return False
+        self.reason = reason
+        if self._inside and self._task is not None:
+            self._task.cancel()
+        return True
+
+    async def run(self, agen):
+        self._task = asyncio.current_task()
+        try:
+            while self.reason is None:
+                self._inside = True
+                try:
+                    item = await agen.__anext__()
+                except StopAsyncIteration:
+                    return
+                except asyncio.CancelledError:
+                    if self.reason is None:
+                        raise
+                    # 自分で要求したキャンセルは呼び出し元には伝えない
+                    self._task.uncancel()
+                    return
+                finally:
+                    self._inside = False
+                self.events += 1
+                yield item
+        finally:
+            await agen.aclose()
+
+
+class CancellationRegistry:
+    """Running invocations by session, for disconnect and explicit cancellation.
+
+    ``stats()`` counts cancelled invocations by reason together with the work
+    that was cut short: model turns and tool calls still running at the time
+    of the cancel, and the wall time the invocation had been running.
+    """
+
+    def __init__(self):
+        self._scopes = {}
+        self._stats = {
+            "cancelled_disconnect": 0,
+            "cancelled_client": 0,
+            "model_turns_aborted": 0,
+            "tool_calls_aborted": 0,
+            "events_before_cancel": 0,
+            "running_ms_before_cancel": 0.0,
+        }
+
+    def open(self, session_id):
+        scope = CancelScope(self, session_id)
+        self._scopes.setdefault(session_id, set()).add(scope)
+        on_disconnect(lambda: scope.cancel("disconnect"))
+        return scope
+
+    def close(self, scope, trace=None):
+        scopes = self._scopes.get(scope.session_id)
+        if scopes is not None:
+            scopes.discard(scope)
+            if not scopes:
+                del self._scopes[scope.session_id]
+        if scope.reason is None:
+            return
+        self._stats["cancelled_disconnect" if scope.reason == "disconnect" else "cancelled_client"] += 1
+        self._stats["events_before_cancel"] += scope.events
+        self._stats["running_ms_before_cancel"] += (time.monotonic() - scope.started) * 1000
+        if trace is not None:
+            for span in trace.spans:
+                if span.end is None and span.name == "model":
+                    self._stats["model_turns_aborted"] += 1
+                elif span.end is None and span.name == "tool":
+                    self._stats["tool_calls_aborted"] += 1
+        logger.info("Invocation for session %s cancelled (%s) after %d events", scope.session_id, scope.reason, scope.events)
+
+    def cancel(self, session_id, reason="client"):
+        """Cancel every running invocation of ``session_id``; returns how many were cancelled."""
+        return sum(scope.cancel(reason) for scope in list(self._scopes.get(session_id, ())))
+
+    def stats(self):
+        return {**self._stats, "running": sum(len(scopes) for scopes in self._scopes.values())}
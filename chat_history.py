@@ -0,0 +1,147 @@
+import itertools
+import json
+import os
+from collections import deque
+
+
+class EventBuffer:
+    """Ring buffer of the most recent ``maxlen`` debug/raw events of a turn.
+
+    Older events are dropped once the buffer is full; with ``spill_path``
+    they are appended to that file as JSON lines instead of being lost. Use
+    it as a context manager to close the spill file however the turn ends;
+    the buffered events stay readable after closing.
+    """
+
+    def __init__(self, maxlen=200, spill_path=None):
+        self._items = deque(maxlen=maxlen)
+        self.spill_path = spill_path
+        self.dropped = 0
+        self.spilled = 0
+        self._spill = None
+
+    def append(self, item):
+        if len(self._items) == self._items.maxlen:
+            self._evict(self._items[0])
+        self._items.append(item)
+
+    def close(self):
+        if self._spill is not None:
+            self._spill.close()
+            self._spill = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def __len__(self):
+        return len(self._items)
+
+    def __bool__(self):
+        return bool(self._items)
+
+    def _evict(self, item):
+        self.dropped += 1
+        if self.spill_path is None:
+            return
+        if self._spill is None:
+            os.makedirs(os.path.dirname(self.spill_path) or ".", exist_ok=True)
+            self._spill = open(self.spill_path, "a", encoding="utf-8")
+        self._spill.write(json.dumps(item, ensure_ascii=False, default=str) + "\n")
+        self.spilled += 1
+
+
+class ChatHistory:
+    """Chat messages of a Streamlit session with a memory cap and paged rendering.
+
+    When the messages exceed ``max_messages`` or ``max_bytes`` (of content)
+    the oldest turns are evicted. Only the latest ``page_size`` messages are
+    drawn message by message; earlier ones are grouped into fixed pages of
+    ``page_size`` messages, each joined into one markdown string that is
+    built once and reused on every rerun.
+    """
+
+    def __init__(self, max_messages=200, max_bytes=2 * 1024 * 1024, page_size=20):
+        self.max_messages = max_messages
+        self.max_bytes = max_bytes
+        self.page_size = page_size
+        self.evicted = 0
+        self._messages = []
+        self._bytes = 0
+        self._ids = itertools.count()
+        self._pages = {}
+
+    def append(self, role, content):
+        message = {"id": next(self._ids), "role": role, "content": content, "size": len(content.encode("utf-8"))}
+        self._messages.append(message)
+        self._bytes += message["size"]
+        self._evict()
+        return message
+
+    def clear(self):
+        self._messages = []
+        self._bytes = 0
+        self._pages = {}
+        self.evicted = 0
+
+    @property
+    def messages(self):
+        return list(self._messages)
+
+    @property
+    def size(self):
+        return self._bytes
+
+    def history(self, limit, exclude_last=True):
+        """Earlier messages as ``{"role", "content"}`` items for the agent payload."""
+        messages = self._messages[:-1] if exclude_last else self._messages
+        return [{"role": message["role"], "content": message["content"]} for message in messages[-limit:]]
+
+    def recent(self):
+        """The latest messages, drawn one by one."""
+        return self._messages[-self.page_size:]
+
+    def older_pages(self):
+        """Numbers of the pages before ``recent()``, oldest first."""
+        older = self._messages[:-self.page_size]
+        return sorted({message["id"] // self.page_size for message in older})
+
+    def page_markdown(self, number):
+        """One markdown string for an older page, cached by the ids of its messages."""
+        messages = [
+            message for message in self._messages[:-self.page_size]
+            if message["id"] // self.page_size == number
+        ]
+        if not messages:
+            return ""
+        key = (messages[0]["id"], messages[-1]["id"])
+        markdown = self._pages.get(key)
+        if markdown is None:
+            markdown = self._pages[key] = "\n\n---\n\n".join(
+                f"**{'🧑 You' if message['role'] == 'user' else '🤖 Agent'}**\n\n{message['content']}"
+                for message in messages
+            )
+        return markdown
+
+    def _evict(self):
+        # ユーザーの質問と回答の組を保つため、ターン単位（次のユーザーメッセージの手前まで）で古いものから削除する
+        while len(self._messages) > 2 and (len(self._messages) > self.max_messages or self._bytes > self.max_bytes):
+            end = 1
+            while end < len(self._messages) - 1 and self._messages[end]["role"] != "user":
+                end += 1
+            for message in self._messages[:end]:
+                self._bytes -= message["size"]
+            self.evicted += end
+            del self._messages[:end]
+        # 削除済みのメッセージを含むページの組み立て結果を捨てる
+        first = self._messages[0]["id"] if self._messages else 0
+        for key in [key for key in self._pages if key[0] < first]:
+            del self._pages[key]
+        # 最新のメッセージとの境界のページは境界が動くたびに別のキーになるので、増えすぎたら作り直す
+        if len(self._pages) > 2 * (self.max_messages // self.page_size + 1):
+            self._pages.clear()
@@ -0,0 +1,213 @@
+import json
+import logging
+import threading
+import time
+
+from doc_filter import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+# 古い会話の要約を入れるテキストブロックの先頭（次回の圧縮時にこの印で既存の要約を見つける）
+SUMMARY_MARKER = "[Summary of the earlier conversation]"
+
+# 画像などテキスト以外のブロックの概算トークン数
+_BINARY_BLOCK_TOKENS = 1600
+
+
+def block_tokens(block):
+    if "text" in block:
+        return estimate_tokens(block["text"])
+    if "toolUse" in block:
+        tool_use = block["toolUse"]
+        return estimate_tokens(tool_use.get("name", "")) + _json_tokens(tool_use.get("input"))
+    if "toolResult" in block:
+        return sum(block_tokens(item) for item in block["toolResult"].get("content", ()))
+    if "json" in block:
+        return _json_tokens(block["json"])
+    if "image" in block or "document" in block:
+        return _BINARY_BLOCK_TOKENS
+    return _json_tokens(block)
+
+
+def message_tokens(message):
+    return sum(block_tokens(block) for block in message.get("content", ()))
+
+
+def messages_from_history(history):
+    """Convert a payload ``history`` of ``{"role", "content"}`` items into model messages.
+
+    Consecutive messages of the same role are merged and the result starts
+    with a user message and ends with an assistant message, as the next
+    prompt is appended as a user message.
+    """
+    messages = []
+    for item in history or ():
+        role = item.get("role") if isinstance(item, dict) else None
+        text = item.get("content") if role else None
+        if role not in ("user", "assistant") or not isinstance(text, str) or not text.strip():
+            continue
+        if messages and messages[-1]["role"] == role:
+            messages[-1]["content"].append({"text": text})
+        else:
+            messages.append({"role": role, "content": [{"text": text}]})
+    while messages and messages[0]["role"] != "user":
+        messages.pop(0)
+    while messages and messages[-1]["role"] != "assistant":
+        messages.pop()
+    return messages
+
+
+class ContextBudget:
+    """Keep a conversation's input tokens under ``max_tokens`` before each turn.
+
+    Compaction works on whole turns (a user prompt and everything up to the
+    next one), in place on the message list:
+
+    * tool results older than the last ``keep_tool_turns`` turns are
+      replaced by a one-line stub (the toolUse/toolResult pairs stay valid)
+    * while over budget, the oldest turns beyond the last ``keep_turns`` are
+      dropped and replaced by an extractive one-line summary each, kept in
+      a block at the start of the first remaining prompt
+    * the summary block itself is bounded by ``summary_tokens``, oldest
+      lines first
+
+    Token counts come from the same character-based estimate as
+    ``doc_filter``, so a compaction costs a pass over the message text and
+    no model call.
+    """
+
+    def __init__(self, max_tokens=12000, keep_turns=4, keep_tool_turns=1, summary_tokens=800, summary_chars=240):
+        self.max_tokens = max_tokens
+        # 最新のターン（今回の質問）は必ず残す
+        self.keep_turns = max(1, keep_turns)
+        self.keep_tool_turns = keep_tool_turns
+        self.summary_tokens = summary_tokens
+        self.summary_chars = summary_chars
+        self._lock = threading.Lock()
+        self._stats = {
+            "compactions": 0, "turns_summarized": 0, "tool_results_stripped": 0,
+            "tokens_before": 0, "tokens_after": 0, "over_budget": 0, "compaction_ms": 0.0,
+        }
+
+    def compact(self, messages):
+        """Compact ``messages`` in place; returns ``(tokens_before, tokens_after)``."""
+        started = time.perf_counter()
+        turns = _split_turns(messages)
+        if not turns:
+            return 0, 0
+        summary = _pop_summary(turns[0][0])
+        costs = [sum(message_tokens(message) for message in turn) for turn in turns]
+        tokens_before = sum(costs) + self._summary_cost(summary)
+
+        stripped = 0
+        for index in range(max(0, len(turns) - self.keep_tool_turns)):
+            count = _strip_tool_results(turns[index])
+            if count:
+                stripped += count
+                costs[index] = sum(message_tokens(message) for message in turns[index])
+
+        summarized = 0
+        while len(turns) > self.keep_turns and sum(costs) + self._summary_cost(summary) > self.max_tokens:
+            summary.append(self._summarize(turns.pop(0)))
+            costs.pop(0)
+            summarized += 1
+        while summary and self._summary_cost(summary) > self.summary_tokens:
+            summary.pop(0)
+
+        if summary:
+            turns[0][0]["content"].insert(0, {"text": SUMMARY_MARKER + "\n" + "\n".join(summary)})
+        messages[:] = [message for turn in turns for message in turn]
+        tokens_after = sum(costs) + self._summary_cost(summary)
+
+        elapsed = (time.perf_counter() - started) * 1000
+        with self._lock:
+            self._stats["compactions"] += 1
+            self._stats["turns_summarized"] += summarized
+            self._stats["tool_results_stripped"] += stripped
+            self._stats["tokens_before"] += tokens_before
+            self._stats["tokens_after"] += tokens_after
+            self._stats["over_budget"] += tokens_after > self.max_tokens
+            self._stats["compaction_ms"] += elapsed
+        if summarized or stripped:
+            logger.debug(
+                "Compacted context: %d -> %d tokens (%d turns summarized, %d tool results stripped) in %.2fms",
+                tokens_before, tokens_after, summarized, stripped, elapsed,
+            )
+        return tokens_before, tokens_after
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats)
+
+    def _summary_cost(self, summary):
+        return estimate_tokens(SUMMARY_MARKER + "\n" + "\n".join(summary)) if summary else 0
+
+    def _summarize(self, turn):
+        question = " ".join(_texts(turn[0]))
+        # 回答はツール呼び出し前の前置きではなく最後の応答から取る
+        replies = [_texts(message) for message in turn[1:] if message["role"] == "assistant"]
+        answer = " ".join(next((texts for texts in reversed(replies) if texts), []))
+        tools = sorted({
+            block["toolUse"].get("name", "?")
+            for message in turn for block in message.get("content", ()) if "toolUse" in block
+        })
+        line = f"- User: {_clip(question, self.summary_chars // 2)} / Assistant: {_clip(answer, self.summary_chars)}"
+        return line + (f" (tools: {', '.join(tools)})" if tools else "")
+
+
+def _split_turns(messages):
+    # ユーザーの質問（toolResultを含まないuserメッセージ）ごとに区切る
+    turns = []
+    for message in messages:
+        starts_turn = message.get("role") == "user" and not any(
+            "toolResult" in block for block in message.get("content", ())
+        )
+        if starts_turn or not turns:
+            turns.append([])
+        turns[-1].append(message)
+    return turns
+
+
+def _pop_summary(message):
+    content = message.get("content", [])
+    if content and content[0].get("text", "").startswith(SUMMARY_MARKER):
+        text = content.pop(0)["text"]
+        return [line for line in text[len(SUMMARY_MARKER):].splitlines() if line.strip()]
+    return []
+
+
+def _strip_tool_results(turn):
+    count = 0
+    for message in turn:
+        for block in message.get("content", ()):
+            result = block.get("toolResult")
+            if result is None or _is_stub(result):
+                continue
+            tokens = sum(block_tokens(item) for item in result.get("content", ()))
+            result["content"] = [{"text": f"[Earlier tool output removed (~{tokens} tokens); call the tool again if needed]"}]
+            count += 1
+    return count
+
+
+def _is_stub(result):
+    content = result.get("content", ())
+    return len(content) == 1 and content[0].get("text", "").startswith("[Earlier tool output removed")
+
+
+def _texts(message):
+    return [
+        block["text"] for block in message.get("content", ())
+        if "text" in block and not block["text"].startswith(SUMMARY_MARKER)
+    ]
+
+
+def _clip(text, limit):
+    text = " ".join(text.split())
+    return text if len(text) <= limit else text[:limit - 1] + "…"
+
+
+def _json_tokens(value):
+    try:
+        return estimate_tokens(json.dumps(value, ensure_ascii=False, default=str))
+    except (TypeError, ValueError):
+        return 0
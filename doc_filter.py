@@ -0,0 +1,290 @@
+import contextvars
+import logging
+import math
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# 全文を要求するためにツールのスキーマへ追加する引数（MCPサーバーには送らない）
+FULL_CONTENT_ARG = "full_content"
+
+_WORD = re.compile(r"[a-z0-9]+(?:[._-][a-z0-9]+)*")
+_CJK = re.compile("[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af]+")
+_STOPWORDS = frozenset(
+    "a an and are as at be by can do for from how i in is it of on or that the this to use using what when "
+    "which with you your".split()
+)
+
+# 現在のリクエストの検索語（ユーザーの質問とモデルが実行した検索フレーズ）
+_query = contextvars.ContextVar("doc_filter_query", default=None)
+
+
+def estimate_tokens(text):
+    """Cheap token estimate: ~4 characters per token for ASCII, one per other character."""
+    ascii_chars = len(text.encode("ascii", "ignore"))
+    return (ascii_chars + 3) // 4 + (len(text) - ascii_chars)
+
+
+def tokenize(text):
+    text = text.lower()
+    terms = [word for word in _WORD.findall(text) if word not in _STOPWORDS]
+    # 日本語などは分かち書きせず文字bigramで索引する
+    for run in _CJK.findall(text):
+        terms.extend(run[i:i + 2] for i in range(max(1, len(run) - 1)))
+    return terms
+
+
+def split_passages(text, passage_chars=1000):
+    """Split a markdown document into passages of roughly ``passage_chars``.
+
+    Paragraphs are kept whole and grouped under their nearest heading, which
+    is repeated on every passage of its section so it counts when scoring.
+    """
+    passages = []
+    heading = ""
+    current = []
+    size = 0
+    for block in re.split(r"\n\s*\n", text):
+        block = block.strip()
+        if not block:
+            continue
+        if block.startswith("#"):
+            if current:
+                passages.append((heading, "\n\n".join(current)))
+                current, size = [], 0
+            heading = block.splitlines()[0]
+            rest = block[len(heading):].strip()
+            if not rest:
+                continue
+            block = rest
+        if current and size + len(block) > passage_chars:
+            passages.append((heading, "\n\n".join(current)))
+            current, size = [], 0
+        current.append(block)
+        size += len(block)
+    if current:
+        passages.append((heading, "\n\n".join(current)))
+    return passages
+
+
+class BM25Index:
+    """Okapi BM25 over a fixed list of passages."""
+
+    def __init__(self, passages, k1=1.5, b=0.75):
+        self.passages = passages
+        self.k1 = k1
+        self.b = b
+        self._frequencies = [Counter(tokenize(heading + "\n" + body)) for heading, body in passages]
+        self._lengths = [sum(frequencies.values()) for frequencies in self._frequencies]
+        self._average = sum(self._lengths) / len(self._lengths) if self._lengths else 0.0
+        document_frequency = Counter()
+        for frequencies in self._frequencies:
+            document_frequency.update(frequencies.keys())
+        total = len(passages)
+        self._idf = {
+            term: math.log(1 + (total - count + 0.5) / (count + 0.5)) for term, count in document_frequency.items()
+        }
+
+    def scores(self, terms):
+        terms = [term for term in set(terms) if term in self._idf]
+        result = []
+        for frequencies, length in zip(self._frequencies, self._lengths):
+            norm = self.k1 * (1 - self.b + self.b * length / self._average) if self._average else self.k1
+            score = 0.0
+            for term in terms:
+                frequency = frequencies.get(term)
+                if frequency:
+                    score += self._idf[term] * frequency * (self.k1 + 1) / (frequency + norm)
+            result.append(score)
+        return result
+
+
+class QueryContext:
+    """Search terms of the current request, extended with the model's own search phrases."""
+
+    def __init__(self, text=""):
+        self.texts = [text] if text else []
+        self._terms = None
+
+    def add(self, text):
+        if text and text not in self.texts:
+            self.texts.append(text)
+            self._terms = None
+
+    @property
+    def terms(self):
+        if self._terms is None:
+            self._terms = [term for text in self.texts for term in tokenize(text)]
+        return self._terms
+
+    def describe(self, limit=120):
+        text = " / ".join(self.texts)
+        return text if len(text) <= limit else text[:limit - 1] + "…"
+
+
+def begin_query(text):
+    """Start the query context of the current request (one per prompt)."""
+    query = QueryContext(text)
+    _query.set(query)
+    return query
+
+
+class RelevanceFilter:
+    """Shrink long documentation tool results to the passages relevant to the request.
+
+    Results of ``tools`` longer than ``min_tokens`` are split into passages,
+    indexed with BM25 (the index is cached per URL and page) and replaced by
+    the best-scoring passages, in document order, within ``max_tokens``. The
+    query is the prompt plus every ``search_tools`` phrase the model used in
+    the same request. The filtered tools get an extra ``full_content``
+    argument so the model can ask for the whole page in a follow-up call.
+    """
+
+    def __init__(
+        self,
+        tools=("aws___read_documentation",),
+        search_tools=("aws___search_documentation",),
+        max_tokens=1500,
+        top_k=8,
+        min_tokens=2000,
+        passage_chars=1000,
+        cache_size=64,
+    ):
+        self.tools = frozenset(tools)
+        self.search_tools = frozenset(search_tools)
+        self.max_tokens = max_tokens
+        self.top_k = top_k
+        self.min_tokens = min_tokens
+        self.passage_chars = passage_chars
+        self.cache_size = cache_size
+        self._lock = threading.Lock()
+        self._indexes = OrderedDict()
+        self._stats = {
+            "filtered": 0, "passed_through": 0, "full_content": 0, "index_hits": 0, "index_builds": 0,
+            "tokens_in": 0, "tokens_out": 0,
+        }
+
+    def extend_schema(self, definition):
+        """Return the MCP tool definition with the ``full_content`` argument added."""
+        if definition.name not in self.tools:
+            return definition
+        schema = dict(definition.inputSchema or {})
+        properties = dict(schema.get("properties", {}))
+        properties[FULL_CONTENT_ARG] = {
+            "type": "boolean",
+            "default": False,
+            "description": "Return the whole page instead of the passages relevant to the question. "
+                           "Only use this when the filtered result says relevant content is missing.",
+        }
+        schema["properties"] = properties
+        return definition.model_copy(update={"inputSchema": schema})
+
+    def split_arguments(self, name, arguments):
+        """Strip ``full_content`` from the arguments; returns ``(arguments, full_content)``."""
+        if name not in self.tools or not arguments or FULL_CONTENT_ARG not in arguments:
+            return arguments, False
+        arguments = dict(arguments)
+        return arguments, bool(arguments.pop(FULL_CONTENT_ARG))
+
+    def apply(self, name, arguments, result, full_content=False):
+        """Post-process one tool result for the current request."""
+        query = _query.get()
+        if query is None:
+            return result
+        if name in self.search_tools:
+            query.add((arguments or {}).get("search_phrase", ""))
+            return result
+        if name not in self.tools or result.get("status") != "success":
+            return result
+        if full_content:
+            with self._lock:
+                self._stats["full_content"] += 1
+            return result
+
+        content = []
+        changed = False
+        for block in result.get("content", ()):
+            text = block.get("text") if isinstance(block, dict) else None
+            if text is not None:
+                filtered = self.filter_text(self._index_key(arguments), text, query, name)
+                if filtered is not text:
+                    block = {**block, "text": filtered}
+                    changed = True
+            content.append(block)
+        return {**result, "content": content} if changed else result
+
+    def filter_text(self, key, text, query, name="the tool"):
+        tokens_in = estimate_tokens(text)
+        if tokens_in <= self.min_tokens:
+            with self._lock:
+                self._stats["passed_through"] += 1
+            return text
+
+        index = self._index(key, text)
+        scores = index.scores(query.terms)
+        ranked = sorted(range(len(scores)), key=lambda i: (-scores[i], i))
+        selected = []
+        budget = self.max_tokens
+        for i in ranked[:self.top_k]:
+            if scores[i] <= 0 and selected:
+                break
+            heading, body = index.passages[i]
+            cost = estimate_tokens(body) + estimate_tokens(heading)
+            if cost > budget and selected:
+                continue
+            selected.append(i)
+            budget -= cost
+        selected.sort()
+
+        parts = []
+        previous = None
+        last_heading = None
+        for i in selected:
+            heading, body = index.passages[i]
+            if previous is not None and i != previous + 1:
+                parts.append("[…]")
+            if heading and heading != last_heading:
+                parts.append(heading)
+                last_heading = heading
+            parts.append(body)
+            previous = i
+        note = (
+            f"[Filtered for relevance: {len(selected)} of {len(index.passages)} passages "
+            f"(~{self.max_tokens - budget} of ~{tokens_in} tokens) matching "
+            f"\"{query.describe()}\". Call {name} again with \"{FULL_CONTENT_ARG}\": true if the answer needs "
+            f"the rest of the page.]"
+        )
+        filtered = note + "\n\n" + "\n\n".join(parts)
+        with self._lock:
+            self._stats["filtered"] += 1
+            self._stats["tokens_in"] += tokens_in
+            self._stats["tokens_out"] += estimate_tokens(filtered)
+        return filtered
+
+    def stats(self):
+        with self._lock:
+            return {**self._stats, "indexes": len(self._indexes)}
+
+    def _index_key(self, arguments):
+        arguments = arguments or {}
+        return (arguments.get("url"), arguments.get("start_index", 0), arguments.get("max_length"))
+
+    def _index(self, key, text):
+        with self._lock:
+            cached = self._indexes.get(key)
+            if cached is not None and cached[0] == len(text):
+                self._indexes.move_to_end(key)
+                self._stats["index_hits"] += 1
+                return cached[1]
+        started = time.perf_counter()
+        index = BM25Index(split_passages(text, self.passage_chars))
+        logger.debug("Built passage index for %s in %.1fms", key[0], (time.perf_counter() - started) * 1000)
+        with self._lock:
+            self._stats["index_builds"] += 1
+            self._indexes[key] = (len(text), index)
+            while len(self._indexes) > self.cache_size:
+                self._indexes.popitem(last=False)
+        return index
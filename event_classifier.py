@@ -0,0 +1,133 @@
+# MCPツール名から表示名への対応表（見つからない場合はツール名をそのまま使う）
+TOOL_LABELS = {
+    "aws___search_documentation": "AWS Documentation Search",
+    "aws___read_documentation": "AWS Documentation Reader",
+    "aws___recommend": "AWS Documentation Recommendations",
+}
+
+def tool_label(name):
+    return TOOL_LABELS.get(name) or name or "Unknown Tool"
+
+
+def _tool_info(tool_use):
+    name = tool_use.get("name", "")
+    return {
+        "name": name,
+        "label": tool_label(name),
+        "id": tool_use.get("toolUseId", ""),
+        "input": tool_use.get("input", {}),
+    }
+
+
+# ---- model stream events ({"event": {...}}) --------------------------------
+
+def _content_block_delta(body, event):
+    delta = body.get("delta", {})
+    text = delta.get("text")
+    if text is not None:
+        # 同じテキストはコールバック形式のイベント（data）でも届く
+        return ("stream_text", text)
+    if "toolUse" in delta:
+        return ("tool_input", delta["toolUse"])
+    return ("other", event)
+
+
+def _content_block_start(body, event):
+    tool_use = body.get("start", {}).get("toolUse")
+    if tool_use:
+        return ("tool_start", [_tool_info(tool_use)])
+    return ("other", event)
+
+
+STREAM_EVENT_RULES = {
+    "contentBlockDelta": _content_block_delta,
+    "contentBlockStart": _content_block_start,
+    "messageStart": lambda body, event: ("message_start", body),
+    "contentBlockStop": lambda body, event: ("content_block_stop", body),
+    "messageStop": lambda body, event: ("message_stop", body),
+    "metadata": lambda body, event: ("metadata", body),
+}
+
+
+# ---- Strands callback events -----------------------------------------------
+
+def _stream_event(stream_event, event):
+    if not isinstance(stream_event, dict):
+        return ("other", event)
+    for key, body in stream_event.items():
+        rule = STREAM_EVENT_RULES.get(key)
+        if rule is not None:
+            return rule(body, event)
+    return ("other", event)
+
+
+def _message(message, event):
+    if not isinstance(message, dict):
+        return ("other", event)
+    tool_uses = [
+        _tool_info(content["toolUse"])
+        for content in message.get("content", ())
+        if isinstance(content, dict) and "toolUse" in content
+    ]
+    if tool_uses:
+        return ("tool_start", tool_uses)
+    tool_results = [
+        {"id": content["toolResult"].get("toolUseId", ""), "status": content["toolResult"].get("status", "")}
+        for content in message.get("content", ())
+        if isinstance(content, dict) and "toolResult" in content
+    ]
+    if tool_results:
+        return ("tool_result", tool_results)
+    return ("message", message)
+
+
+# 優先度順に並べたトップレベルキーのルール表
+EVENT_RULES = [
+    ("event", _stream_event),
+    ("current_tool_use", lambda value, event: ("tool_input", value)),
+    ("message", _message),
+    ("result", lambda value, event: ("result", value)),
+    ("init_event_loop", lambda value, event: ("lifecycle", event)),
+    ("start_event_loop", lambda value, event: ("lifecycle", event)),
+    ("start", lambda value, event: ("lifecycle", event)),
+    ("complete", lambda value, event: ("lifecycle", event)),
+    ("force_stop", lambda value, event: ("lifecycle", event)),
+]
+
+
+def register_rule(key, handler, stream_event=False, first=False):
+    """Add a classification rule.
+
+    ``handler(value, event)`` receives the value under ``key`` and the whole
+    event and returns a ``(kind, info)`` tuple. With ``stream_event=True`` the
+    key is matched inside the ``event`` payload of model stream events.
+    """
+    if stream_event:
+        STREAM_EVENT_RULES[key] = handler
+    elif first:
+        EVENT_RULES.insert(0, (key, handler))
+    else:
+        EVENT_RULES.append((key, handler))
+
+
+def classify(event):
+    """Classify one streamed Strands event into a ``(kind, info)`` tuple.
+
+    Dispatches on the keys the event carries instead of scanning its string
+    form. Kinds: text, stream_text (the model-level copy of a text delta),
+    tool_start (list of tool infos), tool_input, tool_result (list of
+    {'id', 'status'}), message_start, content_block_stop, message_stop,
+    metadata, message, lifecycle, result and other.
+    """
+    if not isinstance(event, dict):
+        return ("other", event)
+
+    # テキストデルタの高速パス（コールバック形式のテキストイベント）
+    data = event.get("data")
+    if data.__class__ is str:
+        return ("text", data)
+
+    for key, handler in EVENT_RULES:
+        if key in event:
+            return handler(event[key], event)
+    return ("other", event)
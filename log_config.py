@@ -0,0 +1,115 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+
+# LogRecordの標準属性（これ以外はextraとしてJSONに含める）
+_RECORD_FIELDS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+_listener = None
+# このモジュールがルートロガーに追加したハンドラー（再設定時はこれだけを置き換える）
+_queue_handler = None
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line, including any ``extra`` fields of the record."""
+
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_FIELDS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def configure_logging(level=None, fmt=None, stream=None):
+    """Route all logging through a queue to a background writer thread.
+
+    ``level`` defaults to ``LOG_LEVEL`` (INFO) and ``fmt`` to ``LOG_FORMAT``
+    (``text`` or ``json``). Callers only pay for merging the message
+    arguments and enqueuing the record; formatting the output line and the
+    write to ``stream`` happen on the listener thread, which is flushed at
+    interpreter exit. Handlers installed by others (e.g. by
+    ``opentelemetry-instrument``) are kept.
+    """
+    global _listener, _queue_handler
+    level = (level or os.environ.get("LOG_LEVEL", "INFO")).upper()
+    fmt = (fmt or os.environ.get("LOG_FORMAT", "text")).lower()
+
+    handler = logging.StreamHandler(stream or sys.stderr)
+    handler.setFormatter(JSONFormatter() if fmt == "json" else logging.Formatter(TEXT_FORMAT))
+
+    if _listener is not None:
+        _listener.stop()
+    log_queue = queue.SimpleQueue()
+    _listener = logging.handlers.QueueListener(log_queue, handler, respect_handler_level=True)
+    _listener.start()
+
+    root = logging.getLogger()
+    if _queue_handler is not None:
+        root.removeHandler(_queue_handler)
+    _queue_handler = logging.handlers.QueueHandler(log_queue)
+    root.addHandler(_queue_handler)
+    root.setLevel(level)
+    return _listener
+
+
+@atexit.register
+def _stop_listener():
+    if _listener is not None:
+        _listener.stop()
+
+
+class SampledLog:
+    """Sampling, rate-limited logger for per-event debug output.
+
+    Logs one in ``sample_every`` calls and at most ``per_second`` records per
+    second, counting what it drops. When the level is disabled the call
+    returns after a single ``isEnabledFor`` check, and arguments are only
+    formatted for records that are actually emitted.
+    """
+
+    def __init__(self, logger, level=logging.DEBUG, sample_every=1, per_second=20.0):
+        self.logger = logger
+        self.level = level
+        self.sample_every = max(1, sample_every)
+        self.per_second = per_second
+        self.dropped = 0
+        self._calls = 0
+        self._tokens = per_second
+        self._refilled = time.monotonic()
+        self._lock = threading.Lock()
+
+    def log(self, msg, *args, **kwargs):
+        if not self.logger.isEnabledFor(self.level):
+            return
+        with self._lock:
+            self._calls += 1
+            if self._calls % self.sample_every:
+                self.dropped += 1
+                return
+            now = time.monotonic()
+            self._tokens = min(self.per_second, self._tokens + (now - self._refilled) * self.per_second)
+            self._refilled = now
+            if self._tokens < 1:
+                self.dropped += 1
+                return
+            self._tokens -= 1
+            dropped, self.dropped = self.dropped, 0
+        if dropped:
+            kwargs.setdefault("extra", {})["dropped"] = dropped
+        self.logger.log(self.level, msg, *args, **kwargs)
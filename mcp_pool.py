@@ -0,0 +1,337 @@
+import asyncio
+import functools
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+
+logger = logging.getLogger(__name__)
+
+
+class MCPPoolTimeout(TimeoutError):
+    """Raised when no MCP session becomes available before the deadline."""
+
+
+class MCPPoolClosed(RuntimeError):
+    """Raised when acquiring from a pool that has been closed."""
+
+
+class _PooledSession:
+    __slots__ = ("client", "created_at", "last_used", "last_checked")
+
+    def __init__(self, client):
+        now = time.monotonic()
+        self.client = client
+        self.created_at = now
+        self.last_used = now
+        self.last_checked = now
+
+
+@functools.cache
+def _transport_errors():
+    errors = [OSError, EOFError]
+    try:
+        import anyio
+
+        errors += [anyio.ClosedResourceError, anyio.BrokenResourceError, anyio.EndOfStream]
+    except ImportError:
+        pass
+    try:
+        from mcp.shared.exceptions import McpError
+
+        errors.append(McpError)
+    except ImportError:
+        pass
+    return tuple(errors)
+
+
+def is_transport_error(error):
+    """Whether an exception means the MCP session itself may be broken."""
+    if isinstance(error, BaseExceptionGroup):
+        return any(is_transport_error(inner) for inner in error.exceptions)
+    return isinstance(error, _transport_errors())
+
+
+def _default_health_check(client):
+    # list_tools_syncはバックグラウンドスレッドが死んでいれば例外を送出する
+    client.list_tools_sync()
+    return True
+
+
+class MCPSessionPool:
+    """Process-wide pool of initialized MCP client sessions.
+
+    Sessions are started once and lent out to invocations. Idle sessions beyond
+    ``min_size`` are evicted after ``idle_timeout`` seconds, sessions idle longer
+    than ``health_check_interval`` are health-checked before being lent out, and
+    broken sessions are discarded so the next borrower reconnects.
+    """
+
+    def __init__(
+        self,
+        client_factory,
+        min_size=1,
+        max_size=4,
+        idle_timeout=300.0,
+        health_check_interval=30.0,
+        acquire_timeout=30.0,
+        connect_retries=2,
+        connect_backoff=0.5,
+        health_check=None,
+    ):
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError(f"invalid pool bounds: min_size={min_size}, max_size={max_size}")
+        self._client_factory = client_factory
+        self.min_size = min_size
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.health_check_interval = health_check_interval
+        self.acquire_timeout = acquire_timeout
+        self.connect_retries = connect_retries
+        self.connect_backoff = connect_backoff
+        self._health_check = health_check or _default_health_check
+
+        self._cond = threading.Condition()
+        self._idle = deque()
+        self._in_use = {}
+        self._size = 0
+        self._closed = False
+        self._reaper = None
+        self._stats = {"created": 0, "reused": 0, "discarded": 0, "evicted": 0, "health_failures": 0}
+
+    # ---- lifecycle -------------------------------------------------------
+
+    def start(self):
+        """Pre-connect ``min_size`` sessions and start the idle reaper."""
+        self._ensure_reaper()
+        self._replenish()
+        return self
+
+    def close(self):
+        """Stop every idle session; in-use sessions are stopped on release."""
+        with self._cond:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for pooled in idle:
+            self._stop(pooled.client)
+
+    # ---- borrowing -------------------------------------------------------
+
+    def acquire(self, timeout=None):
+        """Borrow a started MCP client, connecting a new one if needed."""
+        self._ensure_reaper()
+        deadline = time.monotonic() + (self.acquire_timeout if timeout is None else timeout)
+        while True:
+            pooled = None
+            create = False
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise MCPPoolClosed("MCP session pool is closed")
+                    if self._idle:
+                        # 直近に返却されたセッションほど接続が温まっているのでLIFOで取り出す
+                        pooled = self._idle.pop()
+                        break
+                    if self._size < self.max_size:
+                        self._size += 1
+                        create = True
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise MCPPoolTimeout(f"no MCP session available within {self.acquire_timeout}s")
+                    self._cond.wait(remaining)
+
+            if create:
+                try:
+                    pooled = _PooledSession(self._connect())
+                except BaseException:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+            elif not self._check(pooled):
+                self._discard(pooled)
+                continue
+
+            with self._cond:
+                if not create:
+                    self._stats["reused"] += 1
+                self._in_use[id(pooled.client)] = pooled
+            return pooled.client
+
+    async def acquire_async(self, timeout=None):
+        """``acquire()`` off the event loop; a client acquired after the caller gave up is returned to the pool."""
+        # 接続とヘルスチェックはブロッキングなのでイベントループ外で行う
+        future = asyncio.ensure_future(asyncio.to_thread(self.acquire, timeout))
+        try:
+            return await asyncio.shield(future)
+        except BaseException:
+            future.add_done_callback(self._release_late)
+            raise
+
+    def release(self, client, discard=False):
+        """Return a borrowed client; ``discard=True`` drops it so it is reconnected."""
+        with self._cond:
+            pooled = self._in_use.pop(id(client), None)
+            if pooled is None:
+                logger.warning("Released an MCP client that does not belong to this pool")
+                return
+            if not discard and not self._closed:
+                pooled.last_used = time.monotonic()
+                self._idle.append(pooled)
+                self._cond.notify()
+                return
+        self._discard(pooled)
+
+    @contextmanager
+    def session(self, timeout=None):
+        client = self.acquire(timeout)
+        discard = False
+        try:
+            yield client
+        except Exception as e:
+            # モデルのエラーなどセッションと無関係な例外では、健全なセッションを捨てない
+            discard = is_transport_error(e)
+            raise
+        finally:
+            self.release(client, discard=discard)
+
+    @asynccontextmanager
+    async def session_async(self, timeout=None):
+        client = await self.acquire_async(timeout)
+        discard = False
+        try:
+            yield client
+        except Exception as e:
+            discard = is_transport_error(e)
+            raise
+        finally:
+            self.release(client, discard=discard)
+
+    # ---- maintenance -----------------------------------------------------
+
+    def evict_idle(self):
+        """Stop idle sessions beyond ``min_size`` that exceeded ``idle_timeout``."""
+        now = time.monotonic()
+        expired = []
+        with self._cond:
+            # 古いものから順に並んでいるので先頭から見る
+            while self._idle and self._size - len(expired) > self.min_size:
+                if now - self._idle[0].last_used < self.idle_timeout:
+                    break
+                expired.append(self._idle.popleft())
+            self._size -= len(expired)
+            self._stats["evicted"] += len(expired)
+            if expired:
+                self._cond.notify_all()
+        for pooled in expired:
+            self._stop(pooled.client)
+        return len(expired)
+
+    def stats(self):
+        with self._cond:
+            return {
+                **self._stats,
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": len(self._in_use),
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+            }
+
+    # ---- internals -------------------------------------------------------
+
+    def _connect(self):
+        attempt = 0
+        while True:
+            client = self._client_factory()
+            try:
+                client.start()
+            except Exception:
+                if attempt >= self.connect_retries:
+                    raise
+                attempt += 1
+                logger.warning("MCP connect failed, retrying (%d/%d)", attempt, self.connect_retries, exc_info=True)
+                time.sleep(self.connect_backoff * attempt)
+                continue
+            with self._cond:
+                self._stats["created"] += 1
+            logger.debug("MCP session connected")
+            return client
+
+    def _check(self, pooled):
+        now = time.monotonic()
+        if now - pooled.last_checked < self.health_check_interval:
+            return True
+        try:
+            healthy = self._health_check(pooled.client)
+        except Exception:
+            logger.warning("MCP session health check failed", exc_info=True)
+            healthy = False
+        if healthy:
+            pooled.last_checked = now
+        else:
+            with self._cond:
+                self._stats["health_failures"] += 1
+        return healthy
+
+    def _discard(self, pooled):
+        with self._cond:
+            self._size -= 1
+            self._stats["discarded"] += 1
+            self._cond.notify()
+        self._stop(pooled.client)
+
+    def _release_late(self, future):
+        if not future.cancelled() and future.exception() is None:
+            self.release(future.result())
+
+    def _stop(self, client):
+        try:
+            client.stop(None, None, None)
+        except Exception:
+            logger.debug("Error while stopping MCP session", exc_info=True)
+
+    def _replenish(self):
+        while True:
+            with self._cond:
+                if self._closed or self._size >= self.min_size:
+                    return
+                self._size += 1
+            try:
+                pooled = _PooledSession(self._connect())
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                    self._cond.notify()
+                logger.warning("Failed to pre-connect MCP session", exc_info=True)
+                return
+            with self._cond:
+                self._idle.appendleft(pooled)
+                self._cond.notify()
+
+    def _ensure_reaper(self):
+        if self._reaper is not None:
+            return
+        with self._cond:
+            if self._reaper is not None:
+                return
+            interval = max(1.0, min(self.idle_timeout, self.health_check_interval) / 2)
+            self._reaper = threading.Thread(target=self._reap_loop, args=(interval,), name="mcp-pool-reaper", daemon=True)
+            self._reaper.start()
+
+    def _reap_loop(self, interval):
+        while True:
+            with self._cond:
+                if self._closed:
+                    return
+            time.sleep(interval)
+            try:
+                self.evict_idle()
+                self._replenish()
+            except Exception:
+                logger.warning("MCP pool maintenance failed", exc_info=True)
@@ -0,0 +1,424 @@
+import asyncio
+import json
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from datetime import timedelta
+
+from mcp_pool import MCPSessionPool, is_transport_error
+from tool_cache import CachingMCPClient
+from tool_catalog import ToolCatalog
+
+logger = logging.getLogger(__name__)
+
+# ツール名の名前空間に使えるサーバー名（モデルのツール名の制約に合わせる）
+_SERVER_NAME = re.compile(r"^[A-Za-z0-9_-]{1,32}$")
+
+# サーバーごとに上書きできる設定項目
+SERVER_OPTIONS = ("prefix", "connect_timeout", "list_timeout", "call_timeout", "failure_threshold", "reset_timeout")
+# ペイロードで追加されたサーバーが指定できる設定（接頭辞などは指定させず、既定の名前空間に閉じ込める）
+PAYLOAD_SERVER_OPTIONS = ("connect_timeout", "list_timeout", "call_timeout")
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker for one MCP server.
+
+    After ``failure_threshold`` failures in a row the circuit opens and the
+    server is skipped for ``reset_timeout`` seconds. Then a single trial is let
+    through (half-open): success closes the circuit, failure opens it again. A
+    trial that never reports back is replaced after another ``reset_timeout``.
+    """
+
+    def __init__(self, failure_threshold=3, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_at = 0.0
+        self._stats = {"failures": 0, "opened": 0, "rejected": 0}
+
+    @property
+    def state(self):
+        return self._state
+
+    def allow(self):
+        with self._lock:
+            if self._state == "closed":
+                return True
+            now = time.monotonic()
+            since = now - (self._opened_at if self._state == "open" else self._trial_at)
+            if since < self.reset_timeout:
+                self._stats["rejected"] += 1
+                return False
+            self._state = "half_open"
+            self._trial_at = now
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._state = "closed"
+            self._failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._stats["failures"] += 1
+            if self._state == "half_open" or self._failures >= self.failure_threshold:
+                if self._state != "open":
+                    self._stats["opened"] += 1
+                self._state = "open"
+                self._opened_at = time.monotonic()
+
+    def stats(self):
+        with self._lock:
+            return {**self._stats, "state": self._state, "consecutive_failures": self._failures}
+
+
+class MCPServer:
+    """One MCP endpoint with its own session pool, tool catalog, timeouts and circuit breaker.
+
+    Tool names are exposed as ``<prefix><name>`` (``prefix`` defaults to
+    ``<name>___``, like the ``aws___`` tools of the AWS Knowledge server);
+    names that already carry the prefix are left unchanged. ``transform``
+    runs on the namespaced definitions.
+    """
+
+    def __init__(
+        self,
+        name,
+        url,
+        client_factory,
+        prefix=None,
+        connect_timeout=10.0,
+        list_timeout=10.0,
+        call_timeout=60.0,
+        failure_threshold=3,
+        reset_timeout=30.0,
+        catalog_ttl=300.0,
+        transform=None,
+        pool_options=None,
+    ):
+        if not _SERVER_NAME.match(name or ""):
+            raise ValueError(f"invalid MCP server name: {name!r}")
+        self.name = name
+        self.url = url
+        self.prefix = f"{name}___" if prefix is None else prefix
+        self.connect_timeout = connect_timeout
+        self.list_timeout = list_timeout
+        self.call_timeout = call_timeout
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self._transform = transform
+        self._names = {}
+        self.catalog = ToolCatalog(
+            ttl=catalog_ttl, transform=self._namespace, session=lambda: self.pool.session(self.connect_timeout)
+        )
+        self.pool = MCPSessionPool(lambda: client_factory(self), **(pool_options or {}))
+
+    def server_name(self, name):
+        """Map an exposed (namespaced) tool name back to the server's own name."""
+        return self._names.get(name, name)
+
+    async def acquire(self):
+        """Borrow a pooled client, giving up after ``connect_timeout``."""
+        # 待つのをやめた後に接続できたセッションはプールが引き取る
+        return await asyncio.wait_for(self.pool.acquire_async(self.connect_timeout), self.connect_timeout)
+
+    async def list_tools(self, client):
+        tools = self.catalog.get_cached(client)
+        if tools is None:
+            # 他のリクエストの取得を待つ時間もlist_timeoutまで（待つのをやめたスレッドがたまらないように）
+            listing = asyncio.to_thread(self.catalog.get, client, self.list_timeout)
+            tools = await asyncio.wait_for(listing, self.list_timeout)
+        return tools
+
+    def warm(self):
+        """Pre-connect the pool and list the tools (blocking; for the startup phase)."""
+        if not self.breaker.allow():
+            return
+        try:
+            self.pool.start()
+            with self.pool.session(self.connect_timeout) as client:
+                self.catalog.get(client)
+        except Exception:
+            self.breaker.record_failure()
+            logger.warning("Warming MCP server %s failed", self.name, exc_info=True)
+        else:
+            self.breaker.record_success()
+
+    def stats(self):
+        return {
+            "url": self.url,
+            "breaker": self.breaker.stats(),
+            "pool": self.pool.stats(),
+            "catalog_version": self.catalog.version,
+            "tools": len(self.catalog.tool_names),
+        }
+
+    def _namespace(self, definition):
+        if self.prefix and not definition.name.startswith(self.prefix):
+            exposed = self.prefix + definition.name
+            self._names[exposed] = definition.name
+            definition = definition.model_copy(update={"name": exposed})
+        return self._transform(definition) if self._transform is not None else definition
+
+
+class ServerMCPClient(CachingMCPClient):
+    """Pooled client of one ``MCPServer``.
+
+    Calls are sent with the server's own tool name, fail fast while the
+    server's circuit is open and are abandoned after ``call_timeout``;
+    timeouts and transport errors count as circuit breaker failures.
+    """
+
+    def __init__(self, transport_callable, server, **kwargs):
+        # 結果キャッシュはサーバー（名前とURL）ごとに分ける
+        super().__init__(transport_callable, cache_scope=f"{server.name}@{server.url}", **kwargs)
+        self.server = server
+
+    async def _fetch(self, tool_use_id, name, arguments, read_timeout_seconds):
+        server = self.server
+        if not server.breaker.allow():
+            return _error_result(tool_use_id, f"MCP server {server.name} is unavailable (circuit open), try again later")
+        if read_timeout_seconds is None:
+            # セッション側の待ち時間はこちらの打ち切りより少し長くし、先にこちらで検知する
+            read_timeout_seconds = timedelta(seconds=server.call_timeout + 5)
+        try:
+            result = await asyncio.wait_for(
+                super()._fetch(tool_use_id, server.server_name(name), arguments, read_timeout_seconds),
+                server.call_timeout,
+            )
+        except TimeoutError:
+            server.breaker.record_failure()
+            logger.warning("MCP tool %s on %s timed out after %.1fs", name, server.name, server.call_timeout)
+            return _error_result(tool_use_id, f"MCP server {server.name} did not respond within {server.call_timeout:g}s")
+        except Exception:
+            server.breaker.record_failure()
+            raise
+        server.breaker.record_success()
+        return result
+
+    def _fetch_sync(self, tool_use_id, name, arguments, read_timeout_seconds):
+        return super()._fetch_sync(tool_use_id, self.server.server_name(name), arguments, read_timeout_seconds)
+
+
+class MCPConnection:
+    """Clients and tools of the servers connected for one invocation."""
+
+    def __init__(self):
+        self.clients = []
+        self.tools = []
+        self.unavailable = {}
+
+    @property
+    def binding(self):
+        """What the tools are bound to, for ``AgentCache.lease``."""
+        return tuple((server.name, client, server.catalog.version) for server, client in self.clients)
+
+    @property
+    def servers(self):
+        return [server.name for server, _ in self.clients]
+
+    def add_tools(self, server, tools):
+        names = {tool.tool_name for tool in self.tools}
+        for tool in tools:
+            if tool.tool_name in names:
+                logger.warning("Tool %s of MCP server %s shadows an earlier server's tool; skipped", tool.tool_name, server.name)
+                continue
+            self.tools.append(tool)
+
+    def release(self, discard=False):
+        for server, client in self.clients:
+            server.pool.release(client, discard=discard)
+        self.clients = []
+
+
+class MCPServerSet:
+    """The MCP servers tools are aggregated from.
+
+    ``servers`` are the configured endpoints; an invocation uses all of them
+    unless its payload selects a subset by name. Payload entries with a URL
+    add ad-hoc servers only when ``allow_payload_urls`` is set; they are kept
+    (up to ``max_dynamic``, least recently used first out) so their pools and
+    catalogs are reused by later requests.
+    """
+
+    def __init__(self, servers, server_factory, allow_payload_urls=False, max_dynamic=8):
+        self.servers = OrderedDict((server.name, server) for server in servers)
+        self.server_factory = server_factory
+        self.allow_payload_urls = allow_payload_urls
+        self.max_dynamic = max_dynamic
+        self._dynamic = OrderedDict()
+        self._lock = threading.Lock()
+
+    def resolve(self, spec=None):
+        """Servers for a payload's ``mcp_servers``; returns ``(servers, unavailable)``."""
+        if not spec:
+            return list(self.servers.values()), {}
+        selected = OrderedDict()
+        unavailable = {}
+        for entry in spec if isinstance(spec, list) else [spec]:
+            if isinstance(entry, str):
+                server = self.servers.get(entry) or self._dynamic.get(entry)
+                if server is None:
+                    unavailable[entry] = "unknown"
+                else:
+                    selected[server.name] = server
+                continue
+            if not isinstance(entry, dict) or not entry.get("name"):
+                unavailable[str(entry)] = "invalid"
+                continue
+            name = entry["name"]
+            if not entry.get("url") or entry["url"] == getattr(self.servers.get(name), "url", None):
+                server = self.servers.get(name)
+                if server is None:
+                    unavailable[name] = "unknown"
+                else:
+                    selected[name] = server
+            elif not self.allow_payload_urls:
+                unavailable[name] = "not_allowed"
+            else:
+                try:
+                    selected[name] = self._dynamic_server(entry)
+                except ValueError as e:
+                    unavailable[name] = f"invalid: {e}"
+        return list(selected.values()), unavailable
+
+    @asynccontextmanager
+    async def connect(self, servers, trace=None):
+        """Borrow a session from each server and list its tools, all in parallel.
+
+        Servers whose circuit is open, or that fail or time out while
+        connecting or listing, are left out and reported in ``unavailable``.
+        """
+        connection = MCPConnection()
+        results = {}
+
+        async def open_one(server):
+            if not server.breaker.allow():
+                connection.unavailable[server.name] = "circuit_open"
+                return
+            span = trace.start("mcp_acquire", server=server.name) if trace is not None else None
+            try:
+                client = await server.acquire()
+            except Exception as e:
+                _finish(span, error=type(e).__name__)
+                self._failed(server, connection, "connect", e)
+                return
+            _finish(span)
+            connection.clients.append((server, client))
+            span = trace.start("list_tools", server=server.name) if trace is not None else None
+            try:
+                tools = await server.list_tools(client)
+            except Exception as e:
+                _finish(span, error=type(e).__name__)
+                connection.clients.remove((server, client))
+                server.pool.release(client, discard=True)
+                self._failed(server, connection, "list_tools", e)
+                return
+            _finish(span, tools=len(tools))
+            server.breaker.record_success()
+            results[server.name] = tools
+
+        discard = False
+        try:
+            await asyncio.gather(*(open_one(server) for server in servers))
+            # ツールの並び順は接続の完了順ではなく設定順にする
+            for server in servers:
+                if server.name in results:
+                    connection.add_tools(server, results[server.name])
+            yield connection
+        except Exception as e:
+            # MCPの接続が壊れた場合だけセッションを捨てる（モデルのエラーなどでは再利用する）
+            discard = is_transport_error(e)
+            raise
+        finally:
+            connection.release(discard=discard)
+
+    def warm(self):
+        """Warm every configured server in parallel (blocking)."""
+        threads = [
+            threading.Thread(target=server.warm, name=f"mcp-warm-{server.name}", daemon=True)
+            for server in self.servers.values()
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def stats(self):
+        with self._lock:
+            servers = [*self.servers.values(), *self._dynamic.values()]
+        return {server.name: server.stats() for server in servers}
+
+    def close(self):
+        """Close the session pools of every server (configured and payload-added)."""
+        with self._lock:
+            servers = [*self.servers.values(), *self._dynamic.values()]
+        for server in servers:
+            server.pool.close()
+
+    # ---- internals -------------------------------------------------------
+
+    def _failed(self, server, connection, stage, error):
+        server.breaker.record_failure()
+        reason = f"{stage}_timeout" if isinstance(error, TimeoutError) else f"{stage}_error"
+        connection.unavailable[server.name] = reason
+        logger.warning("MCP server %s unavailable (%s): %r", server.name, reason, error)
+
+    def _dynamic_server(self, entry):
+        key = entry["name"]
+        with self._lock:
+            server = self._dynamic.get(key)
+            if server is not None and server.url == entry["url"]:
+                self._dynamic.move_to_end(key)
+                return server
+            if key in self.servers:
+                raise ValueError("name is already used by a configured server")
+            server = self.server_factory(entry, dynamic=True)
+            previous = self._dynamic.pop(key, None)
+            self._dynamic[key] = server
+            evicted = [previous] if previous is not None else []
+            while len(self._dynamic) > self.max_dynamic:
+                evicted.append(self._dynamic.popitem(last=False)[1])
+        for old in evicted:
+            old.pool.close()
+        logger.info("Added MCP server %s (%s) from payload", server.name, server.url)
+        return server
+
+
+def parse_server_config(value, default_url):
+    """Parse ``MCP_SERVERS`` into a list of server entries.
+
+    Accepts a JSON list of objects (``name``, ``url`` and any of
+    ``SERVER_OPTIONS``), a JSON object of ``name: url``, or
+    ``name=url,name=url``. Empty means one ``aws`` server at ``default_url``.
+    """
+    value = (value or "").strip()
+    if not value:
+        return [{"name": "aws", "url": default_url}]
+    if value[0] in "[{":
+        config = json.loads(value)
+        if isinstance(config, dict):
+            return [{"name": name, "url": url} for name, url in config.items()]
+        return [dict(entry) for entry in config]
+    entries = []
+    for item in value.split(","):
+        name, _, url = item.strip().partition("=")
+        if not url:
+            raise ValueError(f"MCP_SERVERS entry must be name=url: {item!r}")
+        entries.append({"name": name.strip(), "url": url.strip()})
+    return entries
+
+
+def _finish(span, **attributes):
+    if span is not None:
+        span.finish(**attributes)
+
+
+def _error_result(tool_use_id, message):
+    return {"status": "error", "toolUseId": tool_use_id, "content": [{"text": message}]}
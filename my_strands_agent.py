@@ -1,121 +1,532 @@
 from strands import Agent
-from bedrock_agentcore import BedrockAgentCoreApp
-from mcp.client.streamable_http import streamablehttp_client
-from strands.tools.mcp.mcp_client import MCPClient
+from bedrock_agentcore import BedrockAgentCoreApp, PingStatus
+from starlette.responses import JSONResponse
+import asyncio
 import logging
+import math
+import os
+import time
 
-# ロギング設定をDEBUGレベルに設定
-logging.basicConfig(
-    level=logging.DEBUG,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+from admission import AdmissionController, AdmissionRejected
+from agent_cache import AgentCache
+from cancellation import CancellationRegistry, DisconnectMiddleware
+from context_budget import ContextBudget, messages_from_history
+from doc_filter import RelevanceFilter, begin_query
+from event_classifier import classify
+from log_config import SampledLog, configure_logging
+from mcp_servers import PAYLOAD_SERVER_OPTIONS, SERVER_OPTIONS, MCPServer, MCPServerSet, ServerMCPClient, parse_server_config
+from response_cache import CacheControlMiddleware, Recording, ResponseCache, cache_directives
+from stream_format import CompactStream, negotiate
+from tool_cache import SQLiteToolResultStore, ToolResultCache
+from tracing import StreamTimer, Trace
+from warmup import Warmup
+
+# ロギング設定（LOG_LEVEL / LOG_FORMATで変更可能、出力はバックグラウンドスレッドで行う）
+configure_logging()
 logger = logging.getLogger(__name__)
 
+# ストリームイベントごとのデバッグログは間引いて出力する
+event_log = SampledLog(
+    logger,
+    sample_every=int(os.environ.get("LOG_EVENT_SAMPLE_EVERY", "1")),
+    per_second=float(os.environ.get("LOG_EVENT_MAX_PER_SECOND", "20")),
+)
+
 app = BedrockAgentCoreApp()
+# クライアントの切断を検知して実行中の呼び出しを中断する
+app.add_middleware(DisconnectMiddleware)
+# Cache-Controlヘッダーで応答キャッシュを迂回できるようにする
+app.add_middleware(CacheControlMiddleware)
+
+# 接続先MCPサーバー（ローカルのスタンドインサーバーに向ける場合は環境変数で上書き）
+MCP_SERVER_URL = os.environ.get("MCP_SERVER_URL", "https://knowledge-mcp.global.api.aws")
+# 複数のMCPサーバーからツールを集約する（未指定の場合はMCP_SERVER_URLの"aws"サーバーのみ）
+MCP_SERVERS = parse_server_config(os.environ.get("MCP_SERVERS"), MCP_SERVER_URL)
+# ペイロードのmcp_serversで設定にないURLを指定できるようにする（既定では設定済みサーバーの選択のみ）
+MCP_ALLOW_PAYLOAD_SERVERS = os.environ.get("MCP_ALLOW_PAYLOAD_SERVERS", "0") == "1"
+
+# 長いドキュメントのツール結果を質問に関係する箇所だけに絞ってからモデルに渡す（DOC_FILTER_MAX_TOKENS=0で無効）
+DOC_FILTER_MAX_TOKENS = int(os.environ.get("DOC_FILTER_MAX_TOKENS", "1500"))
+relevance_filter = RelevanceFilter(
+    max_tokens=DOC_FILTER_MAX_TOKENS,
+    top_k=int(os.environ.get("DOC_FILTER_TOP_K", "8")),
+    min_tokens=int(os.environ.get("DOC_FILTER_MIN_TOKENS", "2000")),
+) if DOC_FILTER_MAX_TOKENS > 0 else None
+
+# ドキュメント系MCPツールの結果キャッシュ（TOOL_CACHE_PATHを指定すると再起動後も保持）
+tool_result_cache = ToolResultCache(
+    max_entries=int(os.environ.get("TOOL_CACHE_MAX_ENTRIES", "512")),
+    store=SQLiteToolResultStore(os.environ["TOOL_CACHE_PATH"]) if os.environ.get("TOOL_CACHE_PATH") else None,
+)
+
+# MCPツール呼び出しの同時実行数の上限（キャッシュヒットはスロットを消費しない）
+tool_call_limiter = AdmissionController(
+    "mcp_tool_calls",
+    max_in_flight=int(os.environ.get("TOOL_CALL_MAX_IN_FLIGHT", "16")),
+    max_queue=int(os.environ.get("TOOL_CALL_MAX_QUEUE", "64")),
+    timeout=float(os.environ.get("TOOL_CALL_QUEUE_TIMEOUT", "30")),
+)
+
+# MCPクライアントを作成（セッションはサーバーごとのプールで管理し、リクエスト間で再利用する）
+def create_mcp_client(server):
+    # streamable HTTPトランスポートは初回接続時に読み込む（起動時のimportを軽くする）
+    from mcp.client.streamable_http import streamablehttp_client
+    
+    return ServerMCPClient(
+        # ツールカタログはサーバーごとに全リクエストで共有（TTL切れ・tools/list_changed通知で更新）
+        lambda: server.catalog.watch(streamablehttp_client(server.url)),
+        server=server,
+        result_cache=tool_result_cache,
+        call_limiter=tool_call_limiter,
+        result_filter=relevance_filter,
+    )
+
+def create_mcp_server(entry, dynamic=False):
+    # サーバーごとの設定がない項目は環境変数の値を使う
+    options = {
+        "connect_timeout": float(os.environ.get("MCP_CONNECT_TIMEOUT", "10")),
+        "list_timeout": float(os.environ.get("MCP_LIST_TIMEOUT", "10")),
+        "call_timeout": float(os.environ.get("MCP_CALL_TIMEOUT", "60")),
+        "failure_threshold": int(os.environ.get("MCP_BREAKER_FAILURES", "3")),
+        "reset_timeout": float(os.environ.get("MCP_BREAKER_RESET", "30")),
+    }
+    options.update((key, entry[key]) for key in (PAYLOAD_SERVER_OPTIONS if dynamic else SERVER_OPTIONS) if key in entry)
+    return MCPServer(
+        entry["name"],
+        entry["url"],
+        create_mcp_client,
+        catalog_ttl=float(os.environ.get("TOOL_CATALOG_TTL", "300")),
+        transform=relevance_filter.extend_schema if relevance_filter else None,
+        pool_options={
+            # ペイロードで追加されたサーバーは事前接続しない
+            "min_size": 0 if dynamic else int(os.environ.get("MCP_POOL_MIN_SIZE", "1")),
+            "max_size": int(os.environ.get("MCP_POOL_MAX_SIZE", "8")),
+            "idle_timeout": float(os.environ.get("MCP_POOL_IDLE_TIMEOUT", "300")),
+            "health_check_interval": float(os.environ.get("MCP_POOL_HEALTH_CHECK_INTERVAL", "30")),
+        },
+        **options,
+    )
+
+# プロセス全体で共有するMCPサーバー群（サーバーごとに初期化済みセッションのプール・ツールカタログ・サーキットブレーカーを持つ）
+mcp_servers = MCPServerSet(
+    [create_mcp_server(entry) for entry in MCP_SERVERS],
+    create_mcp_server,
+    allow_payload_urls=MCP_ALLOW_PAYLOAD_SERVERS,
+)
+
+# エージェントが使用するモデル（Noneの場合はStrandsの既定のBedrockモデル、ベンチマークではスクリプト化したモデルに差し替える）
+agent_model = None
+
+# セッションIDごとに生存中のエージェントを保持するキャッシュ
+agent_cache = AgentCache(
+    max_sessions=int(os.environ.get("AGENT_CACHE_MAX_SESSIONS", "64")),
+    memory_budget=int(os.environ.get("AGENT_CACHE_MEMORY_BUDGET_MB", "64")) * 1024 * 1024,
+    idle_ttl=float(os.environ.get("AGENT_CACHE_IDLE_TTL", "900")),
+)
+
+# 会話履歴を入力トークンの上限内に収める（古いターンは要約に置き換え、古いツール結果は取り除く。CONTEXT_MAX_TOKENS=0で無効）
+CONTEXT_MAX_TOKENS = int(os.environ.get("CONTEXT_MAX_TOKENS", "12000"))
+context_budget = ContextBudget(
+    max_tokens=CONTEXT_MAX_TOKENS,
+    keep_turns=int(os.environ.get("CONTEXT_KEEP_TURNS", "4")),
+    keep_tool_turns=int(os.environ.get("CONTEXT_KEEP_TOOL_TURNS", "1")),
+    summary_tokens=int(os.environ.get("CONTEXT_SUMMARY_TOKENS", "800")),
+) if CONTEXT_MAX_TOKENS > 0 else None
+
+# 同時実行数の上限と待ち行列（上限を超えた分は待たせ、溢れた分や締め切りに間に合わない分はbusyで返す）
+invocation_limiter = AdmissionController(
+    "invocations",
+    max_in_flight=int(os.environ.get("INVOCATION_MAX_IN_FLIGHT", "8")),
+    max_queue=int(os.environ.get("INVOCATION_MAX_QUEUE", "16")),
+    timeout=float(os.environ.get("INVOCATION_QUEUE_TIMEOUT", "30")),
+)
+# bedrock-agentcore 0.1.0のBedrockAgentCoreAppは独自のセマフォ（同時2件）で受付制御より先に503を返すため、
+# 実行中と待ち行列の全件を通せる大きさに置き換える（セマフォのない新しいSDKでは何もしない）
+if isinstance(getattr(app, "_invocation_semaphore", None), asyncio.Semaphore):
+    app._invocation_semaphore = asyncio.Semaphore(invocation_limiter.max_in_flight + invocation_limiter.max_queue)
+
+# 同じ質問への応答を記録し、モデルとツールを実行せずに再生する（RESPONSE_CACHE=1で有効、compact形式のみ）
+response_cache = ResponseCache(
+    max_entries=int(os.environ.get("RESPONSE_CACHE_MAX_ENTRIES", "256")),
+    max_bytes=int(os.environ.get("RESPONSE_CACHE_MAX_MB", "32")) * 1024 * 1024,
+    ttl=float(os.environ.get("RESPONSE_CACHE_TTL", "3600")),
+) if os.environ.get("RESPONSE_CACHE", "0") == "1" else None
+# 再生時に元の応答の間隔をどの程度再現するか（0で即時、1で元の速度。ペイロードのreplay_pacingで上書き可能）
+RESPONSE_CACHE_PACING = float(os.environ.get("RESPONSE_CACHE_PACING", "0"))
+
+# 段階別のスパンをOpenTelemetryにも送る（opentelemetryがインストールされている場合のみ）
+TRACE_EXPORT_OTEL = os.environ.get("TRACE_EXPORT_OTEL", "1") != "0"
+
+# バッチモードで同時に実行するプロンプト数の上限
+BATCH_MAX_CONCURRENCY = int(os.environ.get("BATCH_MAX_CONCURRENCY", "4"))
+
+# 起動フェーズ：トラフィックが来る前にモデルクライアント生成・MCP接続・ツール一覧取得を済ませる
+WARMUP_ENABLED = os.environ.get("WARMUP", "1") != "0"
+
+def warm_model():
+    # 既定のBedrockモデルを一度だけ生成して全エージェントで共有する（boto3クライアントとサービス定義の読み込み）
+    global agent_model
+    if agent_model is None:
+        from strands.models import BedrockModel
+        
+        agent_model = BedrockModel()
+
+warmup = Warmup([
+    ("model", warm_model),
+    # 全サーバーの事前接続とツール一覧の取得を並行して行う
+    ("mcp_servers", mcp_servers.warm),
+])
 
-# MCPクライアントを作成（セッション管理は各リクエストで行う）
-def create_mcp_client():
-    return MCPClient(lambda: streamablehttp_client("https://knowledge-mcp.global.api.aws"))
+# ヘルスチェックを起動フェーズのトリガーにもする（app.run()以外で起動された場合も含む）
+@app.ping
+def ping_status():
+    if WARMUP_ENABLED:
+        warmup.start()
+    if WARMUP_ENABLED and not warmup.ready:
+        return PingStatus.HEALTHY_BUSY
+    return PingStatus.HEALTHY
+
+# 実行中の呼び出し（切断・明示的なキャンセルで中断する）
+cancellations = CancellationRegistry()
+
+def runtime_stats():
+    return {
+        "cancellations": cancellations.stats(),
+        "warmup": warmup.stats(),
+        "invocations": invocation_limiter.stats(),
+        "mcp_tool_calls": tool_call_limiter.stats(),
+        "mcp_servers": mcp_servers.stats(),
+        "agent_cache": agent_cache.stats(),
+        "context": context_budget.stats() if context_budget else None,
+        "tool_result_cache": tool_result_cache.stats(),
+        "doc_filter": relevance_filter.stats() if relevance_filter else None,
+        "response_cache": response_cache.stats() if response_cache else None,
+    }
+
+# キューの深さや待ち時間などのメトリクス（ローカル・コンテナ内からの確認用）
+async def metrics_endpoint(request):
+    return JSONResponse(runtime_stats())
+
+app.add_route("/metrics", metrics_endpoint, methods=["GET"])
+
+def parse_number(value, name):
+    """A numeric payload field ``name`` as a finite float; ``None`` if it is missing or invalid."""
+    if value is None:
+        return None
+    try:
+        # JSONのtrue/falseは数値として扱わない
+        number = float(value) if not isinstance(value, bool) else math.nan
+    except (TypeError, ValueError):
+        number = math.nan
+    if not math.isfinite(number):
+        logger.warning("Ignoring invalid %s: %r", name, value)
+        return None
+    return number
+
+def parse_deadline(deadline_ms):
+    """Absolute ``time.monotonic()`` deadline of a payload's ``deadline_ms``; invalid values are ignored."""
+    deadline_ms = parse_number(deadline_ms, "deadline_ms")
+    return time.monotonic() + deadline_ms / 1000 if deadline_ms is not None and deadline_ms > 0 else None
 
 @app.entrypoint
-async def agent_invocation(payload):
+async def agent_invocation(payload, context):
     """Handler for agent invocation with MCP tools"""
-    logger.debug(f"Agent invocation started with payload: {payload}")
+    logger.debug("Agent invocation started with payload: %s", payload)
+    
+    # 同じセッションで実行中のターンを中断する（{"action": "cancel"}）
+    session_id = getattr(context, "session_id", None)
+    if payload.get("action") == "cancel":
+        cancelled = cancellations.cancel(session_id, "client")
+        logger.info("Cancel requested for session %s: %d running", session_id, cancelled)
+        yield {"type": "cancel_ack", "cancelled": cancelled}
+        return
+    
+    # 受付制御（deadline_msはクライアントが待てる残り時間）
+    deadline = parse_deadline(payload.get("deadline_ms"))
+    trace = Trace("invocation", session_id=session_id)
+    
+    # 同じ質問への応答がキャッシュにあれば、受付制御を通さずにそのまま再生する
+    cache_key = response_cache_key(payload, context)
+    if cache_key is not None and "no-cache" not in cache_directives(payload.get("cache_control")):
+        with trace.span("response_cache") as span:
+            cached = response_cache.get(cache_key)
+            span.set(hit=cached is not None)
+        if cached is not None:
+            async for item in replay_cached(payload, context, cached, trace):
+                yield item
+            return
+    
+    try:
+        with trace.span("admission"):
+            started = await invocation_limiter.acquire(deadline=deadline)
+    except AdmissionRejected as e:
+        logger.warning("Invocation rejected: %s %s", e, invocation_limiter.stats())
+        yield e.to_event()
+        return
+    
+    scope = cancellations.open(session_id)
+    try:
+        # "prompts"が指定された場合はバッチモード（複数プロンプトを1つのMCPセッションで並行実行）
+        if isinstance(payload.get("prompts"), list):
+            stream = run_batch(payload, context, trace)
+        else:
+            stream = run_agent(payload, context, trace, cache_key)
+        async for item in scope.run(stream):
+            yield item
+        
+        if scope.reason is not None:
+            # キャンセルされた場合はエージェントのストリームとMCP呼び出しを中断済み
+            if scope.reason != "disconnect":
+                yield {"type": "cancelled", "reason": scope.reason}
+            return
+        
+        # 段階別の所要時間（MCPセッション取得・ツール一覧・モデル・各ツール呼び出し・TTFT）を最後に送信
+        trace.finish()
+        timing = trace.to_event()
+        if payload.get("trace_format") == "otlp":
+            timing["otlp"] = trace.to_otlp()
+        yield timing
+    finally:
+        cancellations.close(scope, trace)
+        invocation_limiter.release(started)
+        trace.finish(cancelled=scope.reason)
+        if TRACE_EXPORT_OTEL:
+            trace.export_otel()
+
+def model_config():
+    # モデルIDや推論パラメータが変われば別の応答として扱う
+    get_config = getattr(agent_model, "get_config", None)
+    return get_config() if get_config is not None else type(agent_model).__name__
+
+def response_cache_key(payload, context):
+    """Response cache key of a request, or ``None`` when the cache must not be used."""
+    if response_cache is None:
+        return None
+    stream_format, _, debug = negotiate(payload)
+    prompt = payload.get("prompt")
+    if stream_format != "compact" or debug or not isinstance(prompt, str):
+        return None
+    # 会話の途中のターンは履歴によって答えが変わるのでキャッシュしない（生存中のエージェントの履歴か、
+    # エージェントがいない場合にペイロードのhistoryから作られる履歴。中身のないhistoryは使われないので対象外）
+    if (
+        "no-store" in cache_directives(payload.get("cache_control"))
+        or agent_cache.has_history(getattr(context, "session_id", None))
+        or messages_from_history(payload.get("history"))
+    ):
+        response_cache.bypass()
+        return None
+    servers, unavailable = mcp_servers.resolve(payload.get("mcp_servers"))
+    catalogs = [(server.name, server.catalog.fingerprint) for server in servers]
+    if unavailable or any(fingerprint is None for _, fingerprint in catalogs):
+        response_cache.bypass()
+        return None
+    return response_cache.key(prompt, catalogs, model_config())
+
+async def replay_cached(payload, context, cached, trace):
+    """Replay a cached response and add the turn to the session's history."""
+    _, encoding, _ = negotiate(payload)
+    # 不正な値は既定値、負の値は0（即時）として扱い、キャッシュヒットを失敗させない
+    pacing = parse_number(payload.get("replay_pacing"), "replay_pacing")
+    pacing = max(0.0, RESPONSE_CACHE_PACING if pacing is None else pacing)
+    logger.info("Replaying cached response (%d events)", len(cached.items))
+    yield {"type": "cached", "age_ms": int((time.monotonic() - cached.created) * 1000)}
+    text = []
+    with trace.span("replay", events=len(cached.items), pacing=pacing):
+        async for item in response_cache.replay(cached, pacing):
+            if item["type"] == "text":
+                trace.first_token()
+                text.append(item["text"])
+            yield CompactStream.pack(item) if encoding == "msgpack" else item
+    
+    # 次のターンが文脈を引き継げるよう、質問と回答を会話履歴に残す
+    session_id = getattr(context, "session_id", None)
+    if session_id:
+        def build(messages):
+            return Agent(model=agent_model, messages=messages, callback_handler=None)
+        
+        async with agent_cache.lease(session_id, None, build) as agent:
+            agent.messages.extend([
+                {"role": "user", "content": [{"text": payload["prompt"]}]},
+                {"role": "assistant", "content": [{"text": "".join(text)}]},
+            ])
+    
+    trace.finish(cache="hit")
+    yield trace.to_event()
+    if TRACE_EXPORT_OTEL:
+        trace.export_otel()
+
+async def run_agent(payload, context, trace, cache_key=None):
+    """Run one prompt through the agent and yield the events to stream.
+
+    With a ``cache_key`` the compact events are recorded and the finished
+    answer is stored in the response cache.
+    """
     user_message = payload.get(
         "prompt", "No prompt found in input, please guide customer to create a json payload with prompt key"
     )
-    logger.info(f"Processing user message: {user_message}")
+    logger.info("Processing user message: %s", user_message)
     
-    # MCPクライアントのコンテキスト内でエージェント操作を実行
-    logger.debug("Creating MCP client")
-    mcp_client = create_mcp_client()
+    # クライアントが要求した出力形式（compactの場合はスリムなイベントのみ送信）
+    stream_format, encoding, debug = negotiate(payload)
+    recording = Recording() if cache_key is not None else None
+    compact = CompactStream(
+        encoding=encoding, debug=debug, recorder=recording.add if recording is not None else None
+    ) if stream_format == "compact" else None
+    # ツール結果の絞り込みに使う検索語（このリクエストの質問）
+    begin_query(user_message)
     
-    with mcp_client:
-        logger.debug("MCP client context entered")
-        # MCPサーバーからツールを取得
-        tools = mcp_client.list_tools_sync()
+    # 各MCPサーバーのプールから初期化済みのセッションを並行して借り、ツールを集約してエージェント操作を実行
+    logger.debug("Acquiring MCP sessions from pools")
+    servers, unavailable = mcp_servers.resolve(payload.get("mcp_servers"))
+    async with mcp_servers.connect(servers, trace) as connection:
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("MCP sessions acquired from %s: %s", connection.servers, mcp_servers.stats())
+        unavailable.update(connection.unavailable)
+        if unavailable:
+            # 使えないサーバーのツールを除いて続行する
+            yield {"type": "mcp_unavailable", "servers": unavailable}
+        tools = connection.tools
         
-        # 利用可能なツール情報をログ出力
-        tool_names = [tool.tool_name for tool in tools] if tools else []
-        logger.info(f"Available tools: {tool_names}")
+        # 同じセッションの生存中エージェントを再利用（ツールの接続先が変わった場合は履歴を引き継いで再作成）
+        session_id = getattr(context, "session_id", None)
+        binding = connection.binding
         
-        # ツール詳細情報を安全に取得
-        tool_details = []
-        for tool in tools if tools else []:
-            tool_info = {'name': tool.tool_name}
-            # descriptionが存在するかチェック
-            if hasattr(tool, 'description'):
-                tool_info['description'] = tool.description
-            else:
-                tool_info['description'] = 'No description available'
-            # その他の属性も安全に取得
-            if hasattr(tool, 'input_schema'):
-                tool_info['input_schema'] = str(tool.input_schema)
-            tool_details.append(tool_info)
+        def build(messages):
+            # 生存中のエージェントがなければペイロードの会話履歴から始める
+            if messages is None:
+                messages = messages_from_history(payload.get("history"))
+            # 既定のPrintingCallbackHandlerは全トークンを同期的にstdoutへ書くので使わない
+            return Agent(model=agent_model, tools=tools, messages=messages, callback_handler=None)
         
-        logger.debug(f"Tool details: {tool_details}")
+        def prepare(agent):
+            # ターンの開始前に会話履歴をトークン予算内に圧縮する
+            if context_budget is not None:
+                with trace.span("compact_context") as compact_span:
+                    tokens_before, tokens_after = context_budget.compact(agent.messages)
+                    compact_span.set(tokens_before=tokens_before, tokens_after=tokens_after)
         
-        # MCPツールを含むエージェントを作成
-        agent = Agent(tools=tools)
+        span = trace.start("agent_lease")
+        async with agent_cache.lease(session_id, binding, build, prepare) as agent:
+            span.finish()
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Agent leased for session %s: %s", session_id, agent_cache.stats())
+                logger.debug("Tool result cache: %s", tool_result_cache.stats())
+            async for item in stream_agent(agent, user_message, compact, StreamTimer(trace)):
+                yield item
         
-        # エージェントをストリーミング実行
-        logger.debug(f"Starting agent stream for message: {user_message}")
-        stream = agent.stream_async(user_message)
+        # 全サーバーのツールが使えた場合の完了した応答だけを保存する
+        if recording is not None and not unavailable:
+            response_cache.put(cache_key, recording)
+
+async def run_batch(payload, context, trace):
+    """Run many prompts concurrently over one set of MCP sessions, multiplexing their events.
+
+    Every streamed event carries the ``prompt_index`` of the prompt it belongs to.
+    """
+    prompts = payload["prompts"]
+    # 不正な値は無視して上限で実行する（受付後に失敗させない）
+    max_concurrency = parse_number(payload.get("max_concurrency"), "max_concurrency")
+    if max_concurrency is None:
+        max_concurrency = BATCH_MAX_CONCURRENCY
+    fan_out = max(1, min(int(max_concurrency), BATCH_MAX_CONCURRENCY))
+    stream_format, encoding, debug = negotiate(payload)
+    logger.info("Processing batch of %d prompts (fan-out %d)", len(prompts), fan_out)
+    
+    started = time.monotonic()
+    yield {"type": "batch_start", "count": len(prompts), "max_concurrency": fan_out}
+    
+    servers, unavailable = mcp_servers.resolve(payload.get("mcp_servers"))
+    async with mcp_servers.connect(servers, trace) as connection:
+        # MCPセッションとツールカタログは全プロンプトで共有する
+        unavailable.update(connection.unavailable)
+        if unavailable:
+            yield {"type": "mcp_unavailable", "servers": unavailable}
+        tools = connection.tools
+        semaphore = asyncio.Semaphore(fan_out)
+        # 出力キューを有界にして、送信が追いつかない場合は各プロンプトの処理側を待たせる
+        queue = asyncio.Queue(maxsize=256)
+        results = {"ok": 0, "error": 0}
+        
+        async def run_one(index, prompt):
+            async with semaphore:
+                begin_query(prompt)
+                tag = {"prompt_index": index}
+                compact = CompactStream(encoding=encoding, debug=debug, extra=tag) if stream_format == "compact" else None
+                agent = Agent(model=agent_model, tools=tools, callback_handler=None)
+                span = trace.start("prompt", prompt_index=index)
+                timer = StreamTimer(trace, span, prompt_index=index)
+                try:
+                    async for item in stream_agent(agent, prompt, compact, timer):
+                        # compact形式はCompactStream側でタグ付け済み
+                        await queue.put(item if compact is not None else {**item, **tag})
+                except Exception as e:
+                    logger.exception("Batch prompt %d failed", index)
+                    span.finish(status="error")
+                    results["error"] += 1
+                    await queue.put({"type": "prompt_end", "prompt_index": index, "status": "error", "error": str(e)})
+                else:
+                    span.finish(status="ok")
+                    results["ok"] += 1
+                    await queue.put({"type": "prompt_end", "prompt_index": index, "status": "ok"})
+        
+        tasks = [asyncio.create_task(run_one(index, prompt)) for index, prompt in enumerate(prompts)]
+        done = asyncio.gather(*tasks)
+        try:
+            while not (done.done() and queue.empty()):
+                getter = asyncio.ensure_future(queue.get())
+                await asyncio.wait({getter, done}, return_when=asyncio.FIRST_COMPLETED)
+                if getter.done():
+                    yield getter.result()
+                else:
+                    getter.cancel()
+        finally:
+            # クライアントが切断した場合などは残りのプロンプトを中断する
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+    
+    yield {
+        "type": "batch_end",
+        "completed": results["ok"],
+        "failed": results["error"],
+        "elapsed_ms": int((time.monotonic() - started) * 1000),
+    }
+
+async def stream_agent(agent, user_message, compact, timer):
+    """Stream one prompt through ``agent`` and yield the events to send.
+
+    ``timer`` records the model-turn and tool-call spans of the stream.
+    """
+    logger.debug("Starting agent stream for message: %s", user_message)
+    stream = agent.stream_async(user_message)
+    seen_tool_ids = set()
+    try:
         async for event in stream:
-            logger.debug(f"Raw event received: {event}")
-            logger.debug(f"Event type: {type(event)}, Event data: {event}")
+            # イベントのキー構造からツール使用を検出（同じツール呼び出しは一度だけ通知）
+            kind, info = classify(event)
+            event_log.log("Stream event (%s): %s", kind, event)
+            timer.observe(kind, info)
+            if compact is not None:
+                for item in compact.translate(kind, info, event):
+                    yield item
+                continue
             
-            # ツール使用イベントを特別に処理
-            if isinstance(event, dict):
-                # Strands Agentのツール使用イベントの詳細検出
-                event_type = event.get('type', '')
-                event_str = str(event).lower()
-                
-                # 具体的なツール名を抽出する試み
-                tool_name = None
-                
-                # 1. 直接的なツール名の検出
-                if event_type == 'tool_use' or 'tool_use' in event_str:
-                    tool_name = event.get('name', event.get('tool_name', event.get('function_name', None)))
-                
-                # 2. toolオブジェクトからの抽出
-                elif 'tool' in event and isinstance(event['tool'], dict):
-                    tool_obj = event['tool']
-                    tool_name = tool_obj.get('name', tool_obj.get('tool_name', tool_obj.get('function', None)))
-                
-                # 3. AWS MCP関連の検出
-                elif 'aws' in event_str and 'documentation' in event_str:
-                    if 'search' in event_str:
-                        tool_name = "AWS Documentation Search"
-                    elif 'read' in event_str:
-                        tool_name = "AWS Documentation Reader"
-                    else:
-                        tool_name = "AWS Documentation Tool"
-                
-                # 4. MCP一般的な検出
-                elif 'mcp' in event_str and any(keyword in event_str for keyword in ['call', 'invoke', 'execute']):
-                    # より具体的な情報を抽出しようと試みる
-                    if 'search_documentation' in event_str:
-                        tool_name = "Documentation Search"
-                    elif 'read_documentation' in event_str:
-                        tool_name = "Documentation Reader"
-                    elif 'recommend' in event_str:
-                        tool_name = "Content Recommender"
-                    else:
-                        tool_name = "MCP Tool"
-                
-                # 5. その他のパターン検出
-                elif any(keyword in event_str for keyword in ['function_call', 'api_call', 'service_call']):
-                    tool_name = "External Service"
-                
-                # ツール名が見つかった場合のみイベントを送信
-                if tool_name and tool_name not in ['Unknown Tool', '']:
-                    logger.info(f"Tool detected: {tool_name}")
-                    logger.debug(f"Tool event details: {event}")
-                    yield {"tool_name": tool_name, "type": "tool_use", "debug_data": event}
+            if kind == 'tool_start':
+                for tool in info:
+                    if tool['id'] in seen_tool_ids:
+                        continue
+                    seen_tool_ids.add(tool['id'])
+                    logger.info("Tool detected: %s", tool['label'])
+                    logger.debug("Tool event details: %s", event)
+                    yield {"tool_name": tool['label'], "type": "tool_use", "debug_data": event}
             
             # 通常のイベントも送信
             yield (event)
+    finally:
+        # 中断された場合もStrands側の後始末を確実に行う
+        await stream.aclose()
 
 if __name__ == "__main__":
+    if WARMUP_ENABLED:
+        warmup.start()
     app.run()
@@ -0,0 +1,58 @@
+import io
+import time
+
+
+class RenderScheduler:
+    """Coalesce streamed text deltas into throttled re-renders.
+
+    Deltas are appended to an ``io.StringIO`` accumulator and ``render`` is only
+    called when ``1 / fps`` seconds have passed since the last frame or at least
+    ``flush_bytes`` of new text is pending. ``finish`` always renders the final
+    text (without the cursor).
+    """
+
+    def __init__(self, render, fps=12.0, flush_bytes=2048, cursor="▌", clock=time.monotonic):
+        self._render = render
+        self.interval = 1.0 / fps if fps > 0 else 0.0
+        self.flush_bytes = flush_bytes
+        self.cursor = cursor
+        self._clock = clock
+        self._buffer = io.StringIO()
+        self._pending = 0
+        self._last_flush = None
+        self.frames = 0
+
+    @property
+    def text(self):
+        return self._buffer.getvalue()
+
+    def append(self, delta):
+        self._buffer.write(delta)
+        self._pending += len(delta)
+        now = self._clock()
+        # 最初のテキストは即座に表示し、以降はフレームレートかバイト数で間引く
+        if (
+            self._last_flush is None
+            or now - self._last_flush >= self.interval
+            or self._pending >= self.flush_bytes
+        ):
+            self._flush(now, self.cursor)
+
+    def flush(self):
+        if self._pending:
+            self._flush(self._clock(), self.cursor)
+
+    def finish(self):
+        """Render the complete text once more without the cursor."""
+        text = self.text
+        if text:
+            self._render(text)
+            self.frames += 1
+        self._pending = 0
+        return text
+
+    def _flush(self, now, suffix):
+        self._render(self._buffer.getvalue() + suffix)
+        self.frames += 1
+        self._pending = 0
+        self._last_flush = now
@@ -0,0 +1,179 @@
+import asyncio
+import contextvars
+import hashlib
+import json
+import logging
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# キャッシュを迂回させるリクエストヘッダー（AgentCore Runtimeはカスタムヘッダーをこの接頭辞付きで転送する）
+CACHE_CONTROL_HEADERS = (b"cache-control", b"x-amzn-bedrock-agentcore-runtime-custom-cache-control")
+
+# 現在のリクエストのCache-Controlディレクティブ（CacheControlMiddlewareが設定する）
+_directives = contextvars.ContextVar("cache_control", default=frozenset())
+
+_SPACE = re.compile(r"\s+")
+
+
+class CacheControlMiddleware:
+    """ASGI middleware that exposes the request's ``Cache-Control`` directives.
+
+    ``no-cache`` skips the response cache lookup (the fresh answer is still
+    stored), ``no-store`` bypasses the cache entirely.
+    """
+
+    def __init__(self, app, paths=("/invocations",)):
+        self.app = app
+        self.paths = paths
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+        directives = set()
+        for name, value in scope.get("headers", ()):
+            if name.lower() in CACHE_CONTROL_HEADERS:
+                directives.update(part.strip().lower() for part in value.decode("latin-1").split(","))
+        token = _directives.set(frozenset(directives))
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _directives.reset(token)
+
+
+def cache_directives(payload_value=None):
+    """``Cache-Control`` directives of the current request, plus those of the payload's ``cache_control``."""
+    directives = _directives.get()
+    if payload_value:
+        directives = directives | {part.strip().lower() for part in str(payload_value).split(",")}
+    return directives
+
+
+def normalize_prompt(text):
+    # 全角・半角、大文字・小文字、空白の違いは同じ質問として扱う
+    return _SPACE.sub(" ", unicodedata.normalize("NFKC", text)).strip().casefold()
+
+
+class Recording:
+    """Compact events of one finished stream with their offsets from the start."""
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.items = []
+
+    def add(self, item):
+        self.items.append((time.monotonic() - self.started, item))
+
+    @property
+    def text(self):
+        return "".join(item["text"] for _, item in self.items if item.get("type") == "text")
+
+    @property
+    def complete(self):
+        """Whether the stream ended with the model finishing its answer."""
+        stops = [item for _, item in self.items if item.get("type") == "message_stop"]
+        return bool(stops) and stops[-1].get("stop_reason") == "end_turn"
+
+
+class _Entry:
+    __slots__ = ("items", "created", "expires_at", "duration", "size")
+
+    def __init__(self, items, ttl):
+        self.items = items
+        self.created = time.monotonic()
+        self.expires_at = self.created + ttl
+        self.duration = items[-1][0] if items else 0.0
+        self.size = len(json.dumps(items, ensure_ascii=False, default=str))
+
+
+class ResponseCache:
+    """Exact-match cache of finished compact event streams.
+
+    Keys are built by ``key()`` from the normalized prompt, the tool catalog
+    fingerprints and the model configuration. Entries expire after ``ttl``
+    seconds and the least recently used ones are dropped beyond
+    ``max_entries`` or ``max_bytes`` (JSON size of the events). ``replay()``
+    yields a cached stream, optionally paced like the original.
+    """
+
+    def __init__(self, max_entries=256, max_bytes=32 * 1024 * 1024, ttl=3600.0):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._stats = {"hits": 0, "misses": 0, "bypassed": 0, "stored": 0, "evicted": 0, "expired": 0, "saved_ms": 0.0}
+
+    @staticmethod
+    def key(prompt, catalogs, model_config):
+        """Cache key of a prompt; ``catalogs`` are ``(server, fingerprint)`` pairs."""
+        material = json.dumps(
+            [normalize_prompt(prompt), sorted(catalogs), model_config], ensure_ascii=False, sort_keys=True, default=str
+        )
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def bypass(self):
+        with self._lock:
+            self._stats["bypassed"] += 1
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at <= now:
+                self._remove(key)
+                self._stats["expired"] += 1
+                entry = None
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            self._stats["saved_ms"] += entry.duration * 1000
+            return entry
+
+    def put(self, key, recording):
+        # 途中で終わった応答（トークン上限など）は保存しない
+        if not recording.complete:
+            return
+        entry = _Entry(recording.items, self.ttl)
+        if entry.size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = entry
+            self._bytes += entry.size
+            self._stats["stored"] += 1
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self._stats["evicted"] += 1
+
+    async def replay(self, entry, pacing=0.0, max_gap=1.0):
+        """Yield the cached events; ``pacing`` scales the original gaps (0 sends them at once)."""
+        previous = 0.0
+        for offset, item in entry.items:
+            if pacing > 0:
+                await asyncio.sleep(min((offset - previous) * pacing, max_gap))
+            previous = offset
+            yield dict(item)
+
+    def stats(self):
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {
+                **self._stats,
+                "hit_rate": self._stats["hits"] / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+            }
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
@@ -0,0 +1,241 @@
+import json
+import time
+
+MIN_CHUNK_SIZE = 256
+MAX_CHUNK_SIZE = 64 * 1024
+
+# A blocking read that returns faster than this means the data was already buffered
+_FAST_READ_SECONDS = 0.005
+
+
+def iter_chunks(body, min_size=MIN_CHUNK_SIZE, max_size=MAX_CHUNK_SIZE):
+    """Yield raw byte chunks from a response body as soon as they arrive.
+
+    Uses ``read1`` on the underlying stream when available, which returns
+    whatever is buffered instead of waiting for a full chunk; the request size
+    then grows while reads keep filling it. Plain blocking ``read`` streams
+    start small to keep first-token latency low and grow only while reads are
+    served from the buffer.
+    """
+    raw = getattr(body, "_raw_stream", body)
+    read1 = getattr(raw, "read1", None)
+    size = min_size
+    while True:
+        if read1 is not None:
+            chunk = read1(size)
+            if len(chunk) == size:
+                size = min(size * 2, max_size)
+        else:
+            started = time.perf_counter()
+            chunk = body.read(size)
+            if time.perf_counter() - started < _FAST_READ_SECONDS:
+                size = min(size * 2, max_size)
+            else:
+                size = max(size // 2, min_size)
+        if not chunk:
+            return
+        yield chunk
+
+
+class SSEDecoder:
+    """Incremental byte-level parser for ``text/event-stream`` frames.
+
+    ``feed`` returns the data payload of every frame completed by the chunk;
+    multi-line ``data:`` fields are joined with newlines as in the SSE spec.
+    """
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._data = []
+
+    def feed(self, chunk):
+        buffer = self._buffer
+        buffer += chunk
+        frames = []
+        start = 0
+        while True:
+            end = buffer.find(b"\n", start)
+            if end < 0:
+                break
+            line = buffer[start:end]
+            start = end + 1
+            if line.endswith(b"\r"):
+                line = line[:-1]
+            self._line(bytes(line), frames)
+        del buffer[:start]
+        return frames
+
+    def flush(self):
+        frames = []
+        if self._buffer:
+            self._line(bytes(self._buffer), frames)
+            self._buffer.clear()
+        self._line(b"", frames)
+        return frames
+
+    def _line(self, line, frames):
+        if not line:
+            # Blank line dispatches the pending frame
+            if self._data:
+                frames.append(self._data[0] if len(self._data) == 1 else b"\n".join(self._data))
+                self._data = []
+        elif line.startswith(b"data:"):
+            value = line[5:]
+            self._data.append(value[1:] if value.startswith(b" ") else value)
+        # Comments (":") and other fields (event, id, retry) are not used by AgentCore
+
+
+def iter_sse_data(body, min_size=MIN_CHUNK_SIZE, max_size=MAX_CHUNK_SIZE):
+    """Yield the data payload (bytes) of every SSE frame in a response body."""
+    decoder = SSEDecoder()
+    for chunk in iter_chunks(body, min_size, max_size):
+        yield from decoder.feed(chunk)
+    yield from decoder.flush()
+
+
+# ---- payload dispatch ------------------------------------------------------
+
+def _tool_use(tool_use):
+    return ('tool_use', {
+        'name': tool_use.get('name', 'Unknown Tool'),
+        'id': tool_use.get('toolUseId', ''),
+        'input': tool_use.get('input', {})
+    })
+
+
+# Compact stream events (see stream_format.py), keyed on their "type"
+COMPACT_EVENT_PARSERS = {
+    'start': lambda data: ('init', data),
+    'message_start': lambda data: ('message_start', data),
+    'text': lambda data: ('text', data['text']),
+    'tool_start': lambda data: ('tool_use', {
+        'name': data.get('name', 'Unknown Tool'),
+        'id': data.get('id', ''),
+        'input': data.get('input', {})
+    }),
+    'tool_end': lambda data: ('tool_end', data),
+    'message_stop': lambda data: ('message_stop', {'stopReason': data.get('stop_reason')}),
+    'metadata': lambda data: ('metadata', data),
+    'busy': lambda data: ('busy', data),
+    'timing': lambda data: ('timing', data),
+    'cancelled': lambda data: ('cancelled', data),
+    'cancel_ack': lambda data: ('cancel_ack', data),
+    'mcp_unavailable': lambda data: ('mcp_unavailable', data.get('servers', {})),
+    'cached': lambda data: ('cached', data),
+}
+
+
+def _content_block_delta(body):
+    text = body.get('delta', {}).get('text', '')
+    # Tool use input deltas are partial and skipped
+    return ('text', text) if text else None
+
+
+def _content_block_start(body):
+    tool_use = body.get('start', {}).get('toolUse')
+    return _tool_use(tool_use) if tool_use else None
+
+
+# Model stream events ({"event": {...}}), keyed on the event's first key
+STREAM_EVENT_PARSERS = {
+    'messageStart': lambda body: ('message_start', body),
+    'contentBlockDelta': _content_block_delta,
+    'contentBlockStart': _content_block_start,
+    'contentBlockStop': lambda body: ('content_block_stop', body),
+    'messageStop': lambda body: ('message_stop', body),
+    'metadata': lambda body: ('metadata', body),
+}
+
+
+def _stream_event(data):
+    for key, body in data['event'].items():
+        parser = STREAM_EVENT_PARSERS.get(key)
+        if parser is not None:
+            return parser(body)
+    return None
+
+
+def _strands_tool(data):
+    if data.get('type') != 'tool_use':
+        return None
+    return ('strands_tool', {'name': data['tool_name'], 'debug_data': data.get('debug_data', {})})
+
+
+def _message(data):
+    # Complete message - only extract toolUse, not text (to avoid duplication)
+    content = data['message'].get('content') if isinstance(data['message'], dict) else None
+    if not content:
+        return None
+    tool_uses = [_tool_use(item['toolUse']) for item in content if 'toolUse' in item]
+    return tool_uses or None
+
+
+def _init(data):
+    return ('init', data)
+
+
+# Raw Strands events, checked in priority order by top-level key
+RAW_EVENT_PARSERS = [
+    ('init_event_loop', _init),
+    ('start', _init),
+    ('start_event_loop', _init),
+    ('event', _stream_event),
+    ('tool_name', _strands_tool),
+    ('event_loop_cycle_id', lambda data: ('strands_internal', data)),
+    ('message', _message),
+    ('data', lambda data: ('text', data['data']) if isinstance(data['data'], str) else None),
+]
+
+
+def _parse_object(payload):
+    try:
+        data = json.loads(payload)
+    except ValueError:
+        return None
+    if not isinstance(data, dict):
+        return None
+    parser = COMPACT_EVENT_PARSERS.get(data.get('type'))
+    if parser is not None:
+        return parser(data)
+    for key, parser in RAW_EVENT_PARSERS:
+        if key in data and data[key] is not False:
+            return parser(data)
+    return None
+
+
+def _parse_string(payload):
+    # Strands internal events are sent as the JSON-encoded Python repr of the
+    # event dict; recognize them from their prefix instead of decoding them.
+    if payload.startswith(b'"{\''):
+        return ('strands_internal', payload.decode('utf-8', 'replace'))
+    try:
+        text = json.loads(payload)
+    except ValueError:
+        return None
+    return ('text', text) if isinstance(text, str) else None
+
+
+def _parse_repr(payload):
+    return ('strands_internal', payload.decode('utf-8', 'replace'))
+
+
+# Payload parsers keyed on the first byte of the frame
+PAYLOAD_PARSERS = {
+    ord('{'): lambda payload: _parse_repr(payload) if payload.startswith(b"{'") else _parse_object(payload),
+    ord('"'): _parse_string,
+}
+
+
+def parse_payload(payload):
+    """Map one SSE data payload onto a UI event tuple.
+
+    Returns ``None`` for payloads the UI ignores and a list of tuples when one
+    payload carries several events (a complete message with multiple tool uses).
+    """
+    if not payload:
+        return None
+    parser = PAYLOAD_PARSERS.get(payload[0])
+    if parser is not None:
+        return parser(payload)
+    # Plain text line
+    return ('text', payload.decode('utf-8', 'replace'))
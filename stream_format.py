@@ -0,0 +1,102 @@
+import base64
+import logging
+
+logger = logging.getLogger(__name__)
+
+try:
+    import msgpack
+except ImportError:  # msgpackはオプション依存
+    msgpack = None
+
+STREAM_FORMATS = ("raw", "compact")
+ENCODINGS = ("json", "msgpack")
+
+
+def negotiate(payload):
+    """Return ``(stream_format, encoding, debug)`` requested by the payload."""
+    stream_format = payload.get("stream_format", "raw")
+    if stream_format not in STREAM_FORMATS:
+        logger.warning("Unknown stream_format %r, falling back to raw", stream_format)
+        stream_format = "raw"
+    encoding = payload.get("encoding", "json")
+    if encoding not in ENCODINGS:
+        logger.warning("Unknown encoding %r, falling back to json", encoding)
+        encoding = "json"
+    elif encoding == "msgpack" and msgpack is None:
+        logger.warning("msgpack is not installed, falling back to json")
+        encoding = "json"
+    return stream_format, encoding, bool(payload.get("debug", False))
+
+
+class CompactStream:
+    """Translate classified Strands events into the compact wire schema.
+
+    Emitted events (one small dict each):
+        {"type": "start"}
+        {"type": "message_start"}
+        {"type": "text", "text": ...}
+        {"type": "tool_start", "id": ..., "name": ..., "label": ...[, "input": ...]}
+        {"type": "tool_input", "id": ..., "input": ...}
+        {"type": "tool_end", "id": ..., "status": ...}
+        {"type": "message_stop", "stop_reason": ...}
+        {"type": "metadata", "usage": {...}, "metrics": {...}}
+        {"type": "debug", "event": <raw event>}     (only with debug=True)
+
+    With ``encoding="msgpack"`` each event is packed and sent as a base64
+    string, since SSE frames are text. Fields in ``extra`` (such as the batch
+    ``prompt_index``) are added to every event before encoding, and
+    ``recorder`` is called with each event before encoding.
+    """
+
+    def __init__(self, encoding="json", debug=False, extra=None, recorder=None):
+        self.encoding = encoding
+        self.debug = debug
+        self.extra = extra
+        self.recorder = recorder
+        self._seen_tools = set()
+        self._started = False
+
+    def translate(self, kind, info, event):
+        items = []
+        if kind == "text":
+            items.append({"type": "text", "text": info})
+        elif kind == "tool_start":
+            for tool in info:
+                if tool["id"] in self._seen_tools:
+                    # contentBlockStart時点では入力が未確定なので、完成したメッセージから補う
+                    if tool["input"]:
+                        items.append({"type": "tool_input", "id": tool["id"], "input": tool["input"]})
+                    continue
+                self._seen_tools.add(tool["id"])
+                item = {"type": "tool_start", "id": tool["id"], "name": tool["name"], "label": tool["label"]}
+                if tool["input"]:
+                    item["input"] = tool["input"]
+                items.append(item)
+        elif kind == "tool_result":
+            for result in info:
+                items.append({"type": "tool_end", "id": result["id"], "status": result["status"]})
+        elif kind == "message_start":
+            items.append({"type": "message_start"})
+        elif kind == "message_stop":
+            items.append({"type": "message_stop", "stop_reason": info.get("stopReason")})
+        elif kind == "metadata":
+            items.append({"type": "metadata", "usage": info.get("usage", {}), "metrics": info.get("metrics", {})})
+        elif kind == "lifecycle" and not self._started:
+            self._started = True
+            items.append({"type": "start"})
+
+        if self.debug:
+            items.append({"type": "debug", "event": event})
+        if self.extra:
+            for item in items:
+                item.update(self.extra)
+        if self.recorder is not None:
+            for item in items:
+                self.recorder(item)
+        if self.encoding == "msgpack":
+            return [self.pack(item) for item in items]
+        return items
+
+    @staticmethod
+    def pack(item):
+        return base64.b64encode(msgpack.packb(item, default=str)).decode("ascii")
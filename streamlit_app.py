@@ -1,166 +1,142 @@
 import streamlit as st
-import boto3
-import json
+import altair as alt
+import pathlib
 import uuid
 from typing import Generator
 
+from agentcore_client import AgentCoreClient
+from chat_history import ChatHistory, EventBuffer
+from render_scheduler import RenderScheduler
+
 # Initialize session state
 if 'session_id' not in st.session_state:
     st.session_state.session_id = str(uuid.uuid4())
-if 'messages' not in st.session_state:
-    st.session_state.messages = []
 if 'show_tool_usage' not in st.session_state:
     st.session_state.show_tool_usage = True
+if 'active_turn' not in st.session_state:
+    st.session_state.active_turn = None  # Session ID of a turn that is still streaming
 
 # Configuration
 AGENT_ARN = "arn:aws:bedrock-agentcore:us-east-1:975050047634:runtime/my_strands_agent-366VYQ9G8U"
 AWS_REGION = "us-east-1"
 
+# One client is shared by every browser session: its HTTP pool keeps up to
+# AGENTCORE_MAX_CONNECTIONS keep-alive connections, and a turn that fails before
+# streaming (throttling, busy agent, connection error) is retried with backoff
+AGENTCORE_MAX_CONNECTIONS = 32
+AGENTCORE_MAX_ATTEMPTS = 3
+
+# Streamed text is re-rendered at most RENDER_FPS times per second,
+# or sooner once RENDER_FLUSH_BYTES of new text is pending
+RENDER_FPS = 12
+RENDER_FLUSH_BYTES = 2048
+
+# Earlier messages sent with each prompt, so a session whose agent was evicted or
+# moved to a new container keeps its context (the agent compacts them to its token budget)
+HISTORY_MAX_MESSAGES = 20
+
+# Chat history kept in the session: the oldest turns are evicted beyond these caps,
+# and only the latest CHAT_PAGE_SIZE messages are drawn one by one on each rerun
+CHAT_MAX_MESSAGES = 200
+CHAT_MEMORY_CAP_BYTES = 2 * 1024 * 1024
+CHAT_PAGE_SIZE = 20
+
+# Debug and raw events kept per turn; older ones are dropped, or appended to a
+# JSON-lines file under DEBUG_SPILL_DIR when spilling is enabled in the sidebar
+EVENT_BUFFER_SIZE = 200
+DEBUG_SPILL_DIR = pathlib.Path("debug_spill")
+
+if 'chat' not in st.session_state:
+    st.session_state.chat = ChatHistory(
+        max_messages=CHAT_MAX_MESSAGES, max_bytes=CHAT_MEMORY_CAP_BYTES, page_size=CHAT_PAGE_SIZE
+    )
+
 # Initialize the Bedrock AgentCore client
 @st.cache_resource
 def get_agentcore_client():
-    return boto3.client('bedrock-agentcore', region_name=AWS_REGION)
+    return AgentCoreClient(
+        AGENT_ARN,
+        AWS_REGION,
+        max_connections=AGENTCORE_MAX_CONNECTIONS,
+        max_attempts=AGENTCORE_MAX_ATTEMPTS
+    )
 
 def invoke_agent(prompt: str, session_id: str) -> Generator[tuple, None, None]:
     """Invoke the AgentCore agent and yield streaming responses with metadata."""
-    client = get_agentcore_client()
-    
-    # Prepare the payload
-    payload = json.dumps({"prompt": prompt}).encode()
+    # Prepare the payload (request the compact stream unless raw events are being analyzed)
+    request = {
+        "prompt": prompt,
+        "stream_format": "raw" if show_raw_response else "compact",
+        # The current prompt is already the last message
+        "history": st.session_state.chat.history(HISTORY_MAX_MESSAGES)
+    }
+    if not use_response_cache:
+        # Ask for a fresh answer (it still refreshes the agent's response cache)
+        request["cache_control"] = "no-cache"
     
+    # Events are (type, data) tuples; closing the stream early releases the connection
+    yield from get_agentcore_client().stream(session_id, request, raw=show_raw_response)
+
+def cancel_turn(session_id: str) -> int:
+    """Ask the agent to stop the turn still running for this session; returns how many were cancelled."""
+    client = get_agentcore_client()
     try:
-        # Invoke the agent
-        response = client.invoke_agent_runtime(
-            agentRuntimeArn=AGENT_ARN,
-            runtimeSessionId=session_id,
-            payload=payload
-        )
-        
-        # Process streaming response
-        if "text/event-stream" in response.get("contentType", ""):
-            # Handle streaming response
-            for line in response["response"].iter_lines(chunk_size=10):
-                if line:
-                    line = line.decode("utf-8")
-                    if line.startswith("data: "):
-                        line = line[6:]
-                        
-                        # Raw response analysis mode
-                        if show_raw_response:
-                            yield ('raw', f"RAW LINE: {line}")
-                        
-                        # Parse the JSON and extract text content
-                        try:
-                            data = json.loads(line)
-                            
-                            # Raw data analysis mode
-                            if show_raw_response:
-                                yield ('raw', f"PARSED DATA: {json.dumps(data, indent=2)}")
-                            
-                            if isinstance(data, dict):
-                                # Check for initialization events
-                                if data.get('init_event_loop') or data.get('start') or data.get('start_event_loop'):
-                                    yield ('init', data)
-                                
-                                # Check for message events
-                                elif 'event' in data:
-                                    event = data['event']
-                                    
-                                    # Message start
-                                    if 'messageStart' in event:
-                                        yield ('message_start', event['messageStart'])
-                                    
-                                    # Text streaming
-                                    elif 'contentBlockDelta' in event:
-                                        text = event['contentBlockDelta'].get('delta', {}).get('text', '')
-                                        if text:
-                                            yield ('text', text)
-                                    
-                                    # Tool use streaming (contentBlockDelta with toolUse)
-                                    elif 'contentBlockDelta' in event and 'delta' in event['contentBlockDelta']:
-                                        delta = event['contentBlockDelta']['delta']
-                                        if 'toolUse' in delta:
-                                            # Tool use delta - skip these as they're partial
-                                            pass
-                                    
-                                    # Tool use start (contentBlockStart with toolUse) - this is the main tool event
-                                    elif 'contentBlockStart' in event:
-                                        start = event['contentBlockStart'].get('start', {})
-                                        if 'toolUse' in start:
-                                            tool_info = start['toolUse']
-                                            yield ('tool_use', {
-                                                'name': tool_info.get('name', 'Unknown Tool'),
-                                                'id': tool_info.get('toolUseId', ''),
-                                                'input': tool_info.get('input', {})
-                                            })
-                                    
-                                    # Content block stop event
-                                    elif 'contentBlockStop' in event:
-                                        yield ('content_block_stop', event['contentBlockStop'])
-                                    
-                                    # Message stop
-                                    elif 'messageStop' in event:
-                                        yield ('message_stop', event['messageStop'])
-                                    
-                                    # Metadata (usage and metrics)
-                                    elif 'metadata' in event:
-                                        yield ('metadata', event['metadata'])
-                                
-                                # Check for Strands Agent tool events
-                                elif 'tool_name' in data and data.get('type') == 'tool_use':
-                                    yield ('strands_tool', {
-                                        'name': data['tool_name'],
-                                        'debug_data': data.get('debug_data', {})
-                                    })
-                                
-                                # Strands internal event (contains event loop info)
-                                elif 'event_loop_cycle_id' in str(data):
-                                    yield ('strands_internal', data)
-                                elif 'message' in data and 'content' in data['message']:
-                                    # Complete message - only extract toolUse, not text (to avoid duplication)
-                                    for content in data['message']['content']:
-                                        if 'toolUse' in content:
-                                            # Extract tool information from toolUse object
-                                            tool_use = content['toolUse']
-                                            yield ('tool_use', {
-                                                'name': tool_use.get('name', 'Unknown Tool'),
-                                                'id': tool_use.get('toolUseId', ''),
-                                                'input': tool_use.get('input', {})
-                                            })
-                                elif 'data' in data and isinstance(data['data'], str):
-                                    # Simple text data
-                                    yield ('text', data['data'])
-                                elif isinstance(data, str):
-                                    # Direct text content
-                                    yield ('text', data)
-                        except json.JSONDecodeError:
-                            # Raw response analysis for non-JSON
-                            if show_raw_response:
-                                yield ('raw', f"NON-JSON LINE: {line}")
-                            
-                            # Handle Strands internal events that come as strings
-                            if "'event_loop_cycle_id'" in line:
-                                yield ('strands_internal', line)
-                            elif not line.startswith("{'") and not line.startswith('{"'):
-                                yield ('text', line)
-        
-        elif response.get("contentType") == "application/json":
-            # Handle standard JSON response
-            content = []
-            for chunk in response.get("response", []):
-                content.append(chunk.decode('utf-8'))
-            result = json.loads(''.join(content))
-            if isinstance(result, dict) and 'message' in result:
-                yield ('text', result['message'])
-            else:
-                yield ('text', str(result))
-        
-        else:
-            # Yield raw response for other content types
-            yield ('text', str(response))
-            
-    except Exception as e:
-        yield ('error', f"Error: {str(e)}")
+        return client.run(client.cancel(session_id), timeout=10)
+    except Exception:
+        return 0
+
+# A rerun while a turn was still streaming (Stop / New Session / any widget) abandons that turn;
+# tell the agent so it stops the model stream and tool calls instead of running them to completion
+if st.session_state.active_turn:
+    cancel_turn(st.session_state.active_turn)
+    st.session_state.active_turn = None
+
+def show_buffer_overflow(buffer):
+    """Note how many older events a bounded event buffer left out."""
+    if buffer.spilled:
+        st.caption(f"古いイベント{buffer.spilled}件は {buffer.spill_path} に書き出しました")
+    elif buffer.dropped:
+        st.caption(f"古いイベント{buffer.dropped}件は表示していません（直近{len(buffer)}件のみ）")
+
+
+def span_label(span):
+    """Row label of a span in the timing waterfall."""
+    attributes = span.get('attributes', {})
+    label = span['name']
+    if 'tool' in attributes:
+        label = f"tool: {attributes['tool']}"
+    elif 'cycle' in attributes:
+        label = f"model #{attributes['cycle']}"
+    elif 'server' in attributes:
+        label = f"{label} ({attributes['server']})"
+    if 'prompt_index' in attributes:
+        label = f"[{attributes['prompt_index']}] {label}"
+    return label
+
+
+def render_waterfall(timing):
+    """Render the per-stage spans of one invocation as a waterfall chart."""
+    rows = [
+        {
+            'stage': span_label(span),
+            'start': span['start_ms'],
+            'end': span['start_ms'] + span['duration_ms'],
+            'duration_ms': span['duration_ms'],
+            'order': index,
+        }
+        for index, span in enumerate(timing.get('spans', []))
+        if span.get('parent')
+    ]
+    if not rows:
+        return
+    chart = alt.Chart(alt.Data(values=rows)).mark_bar().encode(
+        x=alt.X('start:Q', title='ms'),
+        x2='end:Q',
+        y=alt.Y('stage:N', sort=alt.SortField('order'), title=None),
+        color=alt.Color('stage:N', legend=None),
+        tooltip=['stage:N', 'start:Q', 'duration_ms:Q'],
+    )
+    st.altair_chart(chart, use_container_width=True)
 
 # Streamlit UI
 st.title("🤖 Bedrock AgentCore Chat Interface")
@@ -170,9 +146,11 @@ with st.sidebar:
     st.header("Session Information")
     st.text(f"Session ID: {st.session_state.session_id[:8]}...")
     
+    st.button("⏹ Stop response", help="Cancel the turn that is currently streaming")
+    
     if st.button("New Session"):
         st.session_state.session_id = str(uuid.uuid4())
-        st.session_state.messages = []
+        st.session_state.chat.clear()
         st.rerun()
     
     st.divider()
@@ -197,41 +175,73 @@ with st.sidebar:
         help="Display complete raw response structure for analysis"
     )
     
+    use_response_cache = st.checkbox(
+        "Use cached answers",
+        value=True,
+        help="Replay the agent's cached answer to a repeated question instead of running the model again"
+    )
+    
+    spill_events = st.checkbox(
+        "Spill old debug events to file",
+        value=False,
+        help=f"Keep only the last {EVENT_BUFFER_SIZE} debug/raw events on screen and append older ones to {DEBUG_SPILL_DIR}/"
+    )
+    
     st.divider()
     st.caption("This app connects to your deployed AgentCore agent")
 
-# Display chat messages
-for message in st.session_state.messages:
+# Display chat messages (older pages are only rendered on request, each as one cached markdown block)
+chat = st.session_state.chat
+if chat.evicted:
+    st.caption(f"🗑 メモリ上限のため古いメッセージ{chat.evicted}件を削除しました")
+older_pages = chat.older_pages()
+if older_pages and st.checkbox(f"以前のメッセージを表示（{len(older_pages)}ページ）", key="show_older"):
+    page = older_pages[-1]
+    if len(older_pages) > 1:
+        page = st.select_slider("ページ", options=older_pages, value=older_pages[-1])
+    with st.container(border=True):
+        st.markdown(chat.page_markdown(page))
+for message in chat.recent():
     with st.chat_message(message["role"]):
         st.markdown(message["content"])
 
 # Chat input
 if prompt := st.chat_input("Ask your agent anything..."):
     # Add user message to chat history
-    st.session_state.messages.append({"role": "user", "content": prompt})
+    chat.append("user", prompt)
     
     # Display user message
     with st.chat_message("user"):
         st.markdown(prompt)
     
     # Display assistant response
-    with st.chat_message("assistant"):
+    # Per-turn event buffers are bounded (ring buffers, optionally spilled to a file);
+    # the with block closes their spill files even when the turn is interrupted or fails
+    spill_prefix = DEBUG_SPILL_DIR / st.session_state.session_id
+    with st.chat_message("assistant"), \
+            EventBuffer(EVENT_BUFFER_SIZE, f"{spill_prefix}-raw.jsonl" if spill_events else None) as raw_info, \
+            EventBuffer(EVENT_BUFFER_SIZE, f"{spill_prefix}-debug.jsonl" if spill_events else None) as debug_events:
         # Use a single container for all chronological events
         main_container = st.container()
         full_response = ""
-        raw_info = []
+        renderer = None  # Throttled renderer for the streamed text, created when text starts
         
         # Track events for display
         displayed_tools = {}  # Track displayed tools by ID
         metadata_info = None
-        debug_events = []
+        timing_info = None
         thinking_placeholder = None  # Placeholder for thinking status
         active_tool_placeholders = {}  # Track active tool execution status
         message_placeholder = None  # Will be created when text starts
         text_started = False  # Track if text output has started
         
-        # Stream the response
+        # Stream the response (marked active until it completes, so an interrupted turn gets cancelled)
+        st.session_state.active_turn = st.session_state.session_id
         for response_type, response_chunk in invoke_agent(prompt, st.session_state.session_id):
+            # Show buffered text before any other status update
+            if renderer and response_type != 'text':
+                renderer.flush()
+            
             if response_type == 'init':
                 # Initialization events - show agent is starting
                 if not thinking_placeholder:
@@ -336,6 +346,10 @@ if prompt := st.chat_input("Ask your agent anything..."):
                 # Store metadata for display at the end
                 metadata_info = response_chunk
             
+            elif response_type == 'timing':
+                # Per-stage spans, sent once at the end of the invocation
+                timing_info = response_chunk
+            
             elif response_type == 'message_stop':
                 # Message stop event
                 if show_debug:
@@ -353,15 +367,48 @@ if prompt := st.chat_input("Ask your agent anything..."):
                     text_started = True
                     with main_container:
                         message_placeholder = st.empty()
+                    renderer = RenderScheduler(
+                        message_placeholder.markdown,
+                        fps=RENDER_FPS,
+                        flush_bytes=RENDER_FLUSH_BYTES
+                    )
                 
-                full_response += response_chunk
-                # Update the placeholder with the accumulated response
-                if message_placeholder:
-                    message_placeholder.markdown(full_response + "▌")
+                # Buffer the delta; the placeholder is re-rendered at most RENDER_FPS times per second
+                renderer.append(response_chunk)
             
             elif response_type == 'error':
                 st.error(response_chunk)
             
+            elif response_type == 'cached':
+                # The answer is replayed from the agent's response cache
+                with main_container:
+                    st.caption(f"⚡ キャッシュされた応答を表示しています（{response_chunk.get('age_ms', 0) / 1000:.0f}秒前）")
+            
+            elif response_type == 'busy':
+                # The agent rejected the request under load (admission control)
+                retry_after = response_chunk.get('retry_after_ms', 0) / 1000
+                st.warning(f"⏳ エージェントが混雑しています。{retry_after:.0f}秒ほど待ってから再度お試しください。", icon="⏳")
+            
+            elif response_type == 'mcp_unavailable':
+                # Some MCP servers were skipped; the agent answers with the tools of the others
+                servers = ", ".join(f"{name} ({reason})" for name, reason in response_chunk.items())
+                st.warning(f"⚠️ 一部のMCPサーバーを利用できません: {servers}", icon="⚠️")
+            
+            elif response_type == 'retry':
+                # The turn failed before streaming and is retried by the client
+                if show_debug:
+                    debug_events.append((f"🔁 再試行 {response_chunk['attempt']}回目 ({response_chunk['reason']})", response_chunk))
+            
+            elif response_type == 'cancelled':
+                st.info("⏹ 応答を停止しました", icon="⏹")
+            
+            elif response_type == 'tool_end':
+                # Tool finished (compact stream) - mark that specific tool as complete
+                tool_status = active_tool_placeholders.pop(response_chunk.get('id', ''), None)
+                if tool_status:
+                    placeholder, tool_name = tool_status
+                    placeholder.success(f"✅ {tool_name}の実行が完了しました", icon="✅")
+            
             elif response_type == 'content_block_stop':
                 # Content block stopped - could be tool completion
                 # Check if this is a tool completion
@@ -377,33 +424,47 @@ if prompt := st.chat_input("Ask your agent anything..."):
                 # Display raw response format analysis
                 raw_info.append(response_chunk)
         
+        st.session_state.active_turn = None
+        
         # Display debug events if enabled
         if show_debug and debug_events:
             with main_container:
                 with st.expander("🔧 デバッグ情報", expanded=False):
+                    show_buffer_overflow(debug_events)
                     for event_name, event_data in debug_events:
                         st.write(f"**{event_name}**")
                         st.json(event_data)
         
         # Display metadata at the end if available
-        if metadata_info:
+        if metadata_info or timing_info:
             with main_container:
                 with st.expander("📊 使用統計とパフォーマンス", expanded=False):
-                    usage = metadata_info.get('usage', {})
-                    metrics = metadata_info.get('metrics', {})
+                    if metadata_info:
+                        usage = metadata_info.get('usage', {})
+                        metrics = metadata_info.get('metrics', {})
+                        
+                        col1, col2 = st.columns(2)
+                        with col1:
+                            st.metric("入力トークン", usage.get('inputTokens', 0))
+                            st.metric("出力トークン", usage.get('outputTokens', 0))
+                        with col2:
+                            st.metric("合計トークン", usage.get('totalTokens', 0))
+                            st.metric("レイテンシ", f"{metrics.get('latencyMs', 0)}ms")
                     
-                    col1, col2 = st.columns(2)
-                    with col1:
-                        st.metric("入力トークン", usage.get('inputTokens', 0))
-                        st.metric("出力トークン", usage.get('outputTokens', 0))
-                    with col2:
-                        st.metric("合計トークン", usage.get('totalTokens', 0))
-                        st.metric("レイテンシ", f"{metrics.get('latencyMs', 0)}ms")
+                    if timing_info:
+                        # Where the time went: MCP session, tool listing, model turns and tool calls
+                        col1, col2 = st.columns(2)
+                        with col1:
+                            st.metric("最初のトークンまで", f"{timing_info.get('ttft_ms') or 0:.0f}ms")
+                        with col2:
+                            st.metric("合計時間", f"{timing_info.get('total_ms') or 0:.0f}ms")
+                        render_waterfall(timing_info)
         
         # Display raw response analysis if enabled
         if show_raw_response and raw_info:
             with main_container:
                 with st.expander("🔍 Raw Response Analysis", expanded=True):
+                    show_buffer_overflow(raw_info)
                     for raw_msg in raw_info:
                         st.code(raw_msg, language="json")
         
@@ -415,9 +476,9 @@ if prompt := st.chat_input("Ask your agent anything..."):
         for tool_id, (placeholder, tool_name) in active_tool_placeholders.items():
             placeholder.success(f"✅ {tool_name}の実行が完了しました", icon="✅")
         
-        # Remove the cursor by updating with final response (no cursor)
-        if full_response and message_placeholder:
-            message_placeholder.markdown(full_response)
+        # Final flush: render the complete response without the cursor
+        if renderer:
+            full_response = renderer.finish()
     
     # Add assistant response to chat history
-    st.session_state.messages.append({"role": "assistant", "content": full_response})
\ No newline at end of file
+    chat.append("assistant", full_response)
\ No newline at end of file
@@ -0,0 +1,257 @@
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from strands.tools.mcp.mcp_client import MCPClient
+
+logger = logging.getLogger(__name__)
+
+# キャッシュ対象のツールとTTL（秒）。ここに無いツールは副作用があり得るためキャッシュしない
+DEFAULT_TOOL_TTLS = {
+    "aws___search_documentation": 3600.0,
+    "aws___read_documentation": 86400.0,
+    "aws___recommend": 86400.0,
+}
+
+
+def cache_key(name, arguments, scope=""):
+    # 引数の順序や空白の違いで別キーにならないよう正規化する。scopeは接続先サーバーの識別子で、
+    # 同じ公開名のツールでも別のサーバーの結果を返さないようにする
+    return name + "\0" + scope + "\0" + json.dumps(arguments or {}, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+
+
+class SQLiteToolResultStore:
+    """On-disk backend so cached tool results survive restarts."""
+
+    def __init__(self, path):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS tool_results (key TEXT PRIMARY KEY, expires_at REAL, result TEXT)"
+        )
+        self._conn.commit()
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT expires_at, result FROM tool_results WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        expires_at, result = row
+        if expires_at <= time.time():
+            self.delete(key)
+            return None
+        return expires_at, json.loads(result)
+
+    def put(self, key, expires_at, result):
+        try:
+            encoded = json.dumps(result, ensure_ascii=False)
+        except (TypeError, ValueError):
+            return
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO tool_results (key, expires_at, result) VALUES (?, ?, ?)",
+                (key, expires_at, encoded),
+            )
+            self._conn.commit()
+
+    def delete(self, key):
+        with self._lock:
+            self._conn.execute("DELETE FROM tool_results WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM tool_results")
+            self._conn.commit()
+
+
+class ToolResultCache:
+    """Size-bounded LRU cache of successful MCP tool results with per-tool TTLs.
+
+    Keys are the tool name, the ``scope`` of the server that answers it and
+    the canonicalized arguments. Identical concurrent
+    calls are coalesced into a single MCP round trip, and an optional on-disk
+    ``store`` backs the in-memory LRU.
+    """
+
+    def __init__(self, max_entries=512, ttls=None, store=None):
+        self.max_entries = max_entries
+        self.ttls = dict(DEFAULT_TOOL_TTLS if ttls is None else ttls)
+        self.store = store
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._in_flight = {}
+        self._stats = {"hits": 0, "misses": 0, "coalesced": 0, "disk_hits": 0, "evictions": 0, "errors": 0, "cancelled": 0}
+
+    def cacheable(self, name):
+        return name in self.ttls
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is not None:
+                expires_at, result = cached
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self._stats["hits"] += 1
+                    return result
+                del self._entries[key]
+        if self.store is not None:
+            stored = self.store.get(key)
+            if stored is not None:
+                self._remember(key, *stored)
+                with self._lock:
+                    self._stats["hits"] += 1
+                    self._stats["disk_hits"] += 1
+                return stored[1]
+        return None
+
+    def put(self, name, key, result):
+        if result.get("status") != "success":
+            with self._lock:
+                self._stats["errors"] += 1
+            return
+        expires_at = time.time() + self.ttls[name]
+        self._remember(key, expires_at, result)
+        if self.store is not None:
+            self.store.put(key, expires_at, result)
+
+    def invalidate(self, name=None):
+        with self._lock:
+            if name is None:
+                self._entries.clear()
+            else:
+                prefix = name + "\0"
+                for key in [key for key in self._entries if key.startswith(prefix)]:
+                    del self._entries[key]
+        if self.store is not None and name is None:
+            self.store.clear()
+
+    def stats(self):
+        with self._lock:
+            return {**self._stats, "entries": len(self._entries), "in_flight": len(self._in_flight)}
+
+    async def call_async(self, name, arguments, tool_use_id, fetch, scope=""):
+        """Return the cached result for this call or run ``fetch()`` once for all waiters."""
+        key = cache_key(name, arguments, scope)
+        cached = self.get(key)
+        if cached is not None:
+            return {**cached, "toolUseId": tool_use_id}
+
+        in_flight = self._in_flight.get(key)
+        while in_flight is not None:
+            with self._lock:
+                self._stats["coalesced"] += 1
+            try:
+                result = await asyncio.shield(in_flight)
+            except asyncio.CancelledError:
+                # 先行した呼び出しだけが（クライアント切断などで）中断された場合は、自分で取得し直す
+                if not in_flight.cancelled() or asyncio.current_task().cancelling():
+                    raise
+                in_flight = self._in_flight.get(key)
+                continue
+            return {**result, "toolUseId": tool_use_id}
+
+        with self._lock:
+            self._stats["misses"] += 1
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            result = await fetch()
+        except asyncio.CancelledError:
+            with self._lock:
+                self._stats["cancelled"] += 1
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # 待機者がいない場合に「未取得の例外」警告が出ないようにする
+            future.exception()
+            raise
+        else:
+            self.put(name, key, result)
+            future.set_result(result)
+            return result
+        finally:
+            del self._in_flight[key]
+
+    def call_sync(self, name, arguments, tool_use_id, fetch, scope=""):
+        key = cache_key(name, arguments, scope)
+        cached = self.get(key)
+        if cached is not None:
+            return {**cached, "toolUseId": tool_use_id}
+        with self._lock:
+            self._stats["misses"] += 1
+        result = fetch()
+        self.put(name, key, result)
+        return result
+
+    def _remember(self, key, expires_at, result):
+        with self._lock:
+            self._entries[key] = (expires_at, result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+
+class CachingMCPClient(MCPClient):
+    """MCPClient whose tool calls are memoized through a ``ToolResultCache``.
+
+    Caching sits on the client's call path, so the ``MCPAgentTool`` objects the
+    Agent receives are unchanged. Calls that reach the server (cache misses and
+    uncached tools) take a slot from ``call_limiter`` when one is given. An
+    optional ``result_filter`` (see ``doc_filter.RelevanceFilter``) post-processes
+    results after the cache, so the cache always holds the full result.
+    ``cache_scope`` identifies the server in the cache keys.
+    """
+
+    def __init__(self, transport_callable, result_cache, call_limiter=None, result_filter=None, cache_scope="", **kwargs):
+        super().__init__(transport_callable, **kwargs)
+        self.result_cache = result_cache
+        self.cache_scope = cache_scope
+        self.call_limiter = call_limiter
+        self.result_filter = result_filter
+
+    async def call_tool_async(self, tool_use_id, name, arguments=None, read_timeout_seconds=None):
+        if self.result_filter is None:
+            return await self._call_tool_async(tool_use_id, name, arguments, read_timeout_seconds)
+        arguments, full_content = self.result_filter.split_arguments(name, arguments)
+        result = await self._call_tool_async(tool_use_id, name, arguments, read_timeout_seconds)
+        return self.result_filter.apply(name, arguments, result, full_content)
+
+    async def _call_tool_async(self, tool_use_id, name, arguments, read_timeout_seconds):
+        async def fetch():
+            if self.call_limiter is None:
+                return await self._fetch(tool_use_id, name, arguments, read_timeout_seconds)
+            async with self.call_limiter.slot():
+                return await self._fetch(tool_use_id, name, arguments, read_timeout_seconds)
+
+        if not self.result_cache.cacheable(name):
+            return await fetch()
+        return await self.result_cache.call_async(name, arguments, tool_use_id, fetch, self.cache_scope)
+
+    def call_tool_sync(self, tool_use_id, name, arguments=None, read_timeout_seconds=None):
+        fetch = self._fetch_sync
+        if self.result_filter is not None:
+            # 同期呼び出しにはリクエストの検索語が届かないので、追加した引数を取り除くだけにする
+            arguments, _ = self.result_filter.split_arguments(name, arguments)
+        if not self.result_cache.cacheable(name):
+            return fetch(tool_use_id, name, arguments, read_timeout_seconds)
+        return self.result_cache.call_sync(
+            name, arguments, tool_use_id, lambda: fetch(tool_use_id, name, arguments, read_timeout_seconds), self.cache_scope
+        )
+
+    async def _fetch(self, tool_use_id, name, arguments, read_timeout_seconds):
+        """Send one tool call to the server (cache misses and uncached tools)."""
+        return await super().call_tool_async(tool_use_id, name, arguments, read_timeout_seconds)
+
+    def _fetch_sync(self, tool_use_id, name, arguments, read_timeout_seconds):
+        return super().call_tool_sync(tool_use_id, name, arguments, read_timeout_seconds)
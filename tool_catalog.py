@@ -0,0 +1,258 @@
+import hashlib
+import json
+import logging
+import threading
+import time
+import weakref
+from contextlib import asynccontextmanager
+
+from strands.tools.mcp.mcp_agent_tool import MCPAgentTool
+
+logger = logging.getLogger(__name__)
+
+TOOLS_LIST_CHANGED = "notifications/tools/list_changed"
+
+
+def _list_all_tools(client):
+    # 新しいstrandsはページネーションされたリストを返すので全ページを辿る
+    tools = list(client.list_tools_sync())
+    token = getattr(tools, "pagination_token", None)
+    while token:
+        page = client.list_tools_sync(pagination_token=token)
+        tools.extend(page)
+        token = getattr(page, "pagination_token", None)
+    return tools
+
+
+class ToolCatalog:
+    """Shared cache of the MCP tool catalog.
+
+    The tool definitions are listed once and shared by every request; each
+    pooled MCP client gets its own bound ``MCPAgentTool`` list, built lazily
+    and reused while the catalog version is unchanged. Entries expire after
+    ``ttl`` seconds (stale data is served while a background refresh runs) and
+    are dropped immediately on ``invalidate()`` or a ``tools/list_changed``
+    notification. ``transform`` may rewrite each MCP tool definition before it
+    is bound (for example to extend its input schema).
+
+    The background refresh borrows its own client from ``session`` (a context
+    manager factory such as ``MCPSessionPool.session``), as the caller's client
+    may be released or stopped before the refresh runs. Without ``session`` an
+    expired catalog is listed again synchronously by ``get()``.
+
+    Listing never holds the catalog lock: notifications are handled on the MCP
+    client's event loop, which must keep reading while a listing waits on it.
+    Concurrent listings are coalesced into one, and a listing that overlaps an
+    invalidation is not published.
+    """
+
+    def __init__(self, ttl=300.0, transform=None, session=None):
+        self.ttl = ttl
+        self.transform = transform
+        self.session = session
+        self._lock = threading.Lock()
+        self._definitions = None
+        self._details = []
+        self._loaded_at = 0.0
+        self._version = 0
+        self._fingerprint = None
+        self._generation = 0
+        self._loading = None
+        self._bound = weakref.WeakKeyDictionary()
+
+    @property
+    def version(self):
+        return self._version
+
+    @property
+    def fingerprint(self):
+        """Hash of the tool definitions, stable across reloads of an unchanged catalog (``None`` until listed)."""
+        return self._fingerprint
+
+    @property
+    def tool_names(self):
+        return [detail["name"] for detail in self._details]
+
+    @property
+    def tool_details(self):
+        return list(self._details)
+
+    def get_cached(self, client):
+        """Return bound tools without any I/O, or ``None`` if a listing is required."""
+        definitions = self._definitions
+        if definitions is None:
+            return None
+        if self._expired():
+            if self.session is None:
+                # 別のセッションを借りられないので、呼び出し元のクライアントで取り直してもらう
+                return None
+            self._refresh_in_background()
+        return self._bind(client, definitions)
+
+    def get(self, client, timeout=None):
+        """Return bound tools, listing them through ``client`` if nothing is cached.
+
+        Concurrent callers wait for one shared listing, at most ``timeout``
+        seconds, before listing through their own client.
+        """
+        cached = self.get_cached(client)
+        if cached is not None:
+            return cached
+        with self._lock:
+            # 待っている間に別のリクエストが取得済みなら再取得しない
+            definitions = self._fresh_definitions()
+            loading = self._loading
+            owner = definitions is None and loading is None
+            if owner:
+                loading = self._loading = threading.Event()
+        if definitions is not None:
+            return self._bind(client, definitions)
+        if not owner:
+            # 取得中の一覧を待ち、公開されなかった（失敗・無効化・応答なし）場合は自分で取得する
+            if loading.wait(timeout):
+                definitions = self._fresh_definitions()
+                if definitions is not None:
+                    return self._bind(client, definitions)
+            return self._load(client)
+        try:
+            return self._load(client)
+        finally:
+            self._finish_loading(loading)
+
+    def invalidate(self):
+        # 一覧の取得中もロックは保持しないので、通知を処理するイベントループを止めない
+        with self._lock:
+            self._generation += 1
+            self._definitions = None
+            self._details = []
+            self._version += 1
+            self._fingerprint = None
+            self._bound = weakref.WeakKeyDictionary()
+        logger.info("Tool catalog invalidated")
+
+    def on_message(self, message):
+        """Inspect an incoming MCP message and invalidate on ``tools/list_changed``."""
+        root = getattr(getattr(message, "message", message), "root", None)
+        if getattr(root, "method", None) == TOOLS_LIST_CHANGED:
+            self.invalidate()
+
+    @asynccontextmanager
+    async def watch(self, transport):
+        """Wrap an MCP transport so server notifications reach this catalog."""
+        async with transport as streams:
+            read_stream, *rest = streams
+            yield (_NotifyingReceiveStream(read_stream, self.on_message), *rest)
+
+    # ---- internals -------------------------------------------------------
+
+    def _load(self, client):
+        generation = self._generation
+        tools = _list_all_tools(client)
+        definitions = [tool.mcp_tool for tool in tools]
+        if self.transform is not None:
+            definitions = [self.transform(definition) for definition in definitions]
+            tools = [MCPAgentTool(definition, client) for definition in definitions]
+        details = []
+        for definition in definitions:
+            details.append({
+                "name": definition.name,
+                "description": definition.description or "No description available",
+                "input_schema": definition.inputSchema,
+            })
+        fingerprint = hashlib.sha256(
+            json.dumps(details, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8")
+        ).hexdigest()
+        with self._lock:
+            if self._generation != generation:
+                # 取得中にtools/list_changedを受けた：古いかもしれない一覧は公開せず、この呼び出しだけで使う
+                logger.info("Tool catalog changed while listing; listing not cached")
+                return tools
+            self._definitions = definitions
+            self._details = details
+            self._fingerprint = fingerprint
+            self._loaded_at = time.monotonic()
+            self._version += 1
+            self._bound = weakref.WeakKeyDictionary()
+            # 取得済みのツールはこのクライアント用にそのまま使う
+            self._bound[client] = (self._version, tools)
+            version = self._version
+        logger.info("Tool catalog loaded (version %d): %s", version, [detail["name"] for detail in details])
+        logger.debug("Tool details: %s", details)
+        return tools
+
+    def _fresh_definitions(self):
+        definitions = self._definitions
+        if definitions is None or self._expired():
+            return None
+        return definitions
+
+    def _finish_loading(self, loading):
+        with self._lock:
+            self._loading = None
+        loading.set()
+
+    def _expired(self):
+        return time.monotonic() - self._loaded_at >= self.ttl
+
+    def _bind(self, client, definitions):
+        version = self._version
+        bound = self._bound.get(client)
+        if bound is not None and bound[0] == version:
+            return bound[1]
+        tools = [MCPAgentTool(definition, client) for definition in definitions]
+        self._bound[client] = (version, tools)
+        return tools
+
+    def _refresh_in_background(self):
+        with self._lock:
+            if self._loading is not None:
+                return
+            loading = self._loading = threading.Event()
+
+        def refresh():
+            try:
+                # リクエストのクライアントは返却・停止されうるので、プールから別に借りる
+                with self.session() as client:
+                    self._load(client)
+            except Exception:
+                # 取得に失敗しても古いカタログを使い続け、次回のTTL切れで再試行する
+                self._loaded_at = time.monotonic()
+                logger.warning("Background tool catalog refresh failed", exc_info=True)
+            finally:
+                self._finish_loading(loading)
+
+        threading.Thread(target=refresh, name="tool-catalog-refresh", daemon=True).start()
+
+
+class _NotifyingReceiveStream:
+    """Receive stream proxy that reports every message to a callback."""
+
+    def __init__(self, stream, on_message):
+        self._stream = stream
+        self._on_message = on_message
+
+    def _observe(self, message):
+        try:
+            self._on_message(message)
+        except Exception:
+            logger.debug("Tool catalog notification hook failed", exc_info=True)
+        return message
+
+    async def receive(self):
+        return self._observe(await self._stream.receive())
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        return self._observe(await self._stream.__anext__())
+
+    async def __aenter__(self):
+        await self._stream.__aenter__()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return await self._stream.__aexit__(*exc_info)
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
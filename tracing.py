@@ -0,0 +1,241 @@
+import logging
+import os
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+try:
+    from opentelemetry import trace as otel_trace
+except ImportError:  # OpenTelemetryはオプション依存（コンテナではADOTが導入済み）
+    otel_trace = None
+
+
+class Span:
+    __slots__ = ("span_id", "parent_id", "name", "start", "end", "attributes")
+
+    def __init__(self, span_id, parent_id, name, start, attributes):
+        self.span_id = span_id
+        self.parent_id = parent_id
+        self.name = name
+        self.start = start
+        self.end = None
+        self.attributes = attributes
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+        return self
+
+    def finish(self, **attributes):
+        if self.end is None:
+            self.end = time.monotonic()
+        self.attributes.update(attributes)
+        return self
+
+
+class Trace:
+    """Per-invocation span recorder.
+
+    Spans are timed with the monotonic clock relative to the root span and
+    converted to wall-clock nanoseconds only on export. ``to_event()`` is the
+    ``{"type": "timing"}`` stream event, ``to_otlp()`` the same spans as OTLP
+    JSON, and ``export_otel()`` replays them into the active OpenTelemetry
+    tracer (when ``opentelemetry`` is installed).
+    """
+
+    def __init__(self, name="invocation", **attributes):
+        self.trace_id = os.urandom(16).hex()
+        self.spans = []
+        self.ttft = None
+        self._wall_start = time.time_ns()
+        self.root = self.start(name, parent=False, **attributes)
+
+    def start(self, name, parent=None, **attributes):
+        """Open a span; ``parent`` defaults to the root span."""
+        if parent is None:
+            parent = self.root
+        span = Span(os.urandom(8).hex(), parent.span_id if parent else None, name, time.monotonic(), attributes)
+        self.spans.append(span)
+        return span
+
+    @contextmanager
+    def span(self, name, parent=None, **attributes):
+        span = self.start(name, parent, **attributes)
+        try:
+            yield span
+        except BaseException as e:
+            span.set(error=type(e).__name__)
+            raise
+        finally:
+            span.finish()
+
+    def first_token(self):
+        if self.ttft is None:
+            self.ttft = time.monotonic() - self.root.start
+
+    def finish(self, **attributes):
+        """End the root span and any span left open."""
+        now = time.monotonic()
+        for span in self.spans:
+            if span.end is None:
+                span.end = now
+        self.root.set(**attributes)
+        return self
+
+    def to_event(self):
+        origin = self.root.start
+        return {
+            "type": "timing",
+            "trace_id": self.trace_id,
+            "total_ms": _ms(self.root.end - origin) if self.root.end else None,
+            "ttft_ms": _ms(self.ttft) if self.ttft is not None else None,
+            "spans": [
+                {
+                    "id": span.span_id,
+                    "parent": span.parent_id,
+                    "name": span.name,
+                    "start_ms": _ms(span.start - origin),
+                    "duration_ms": _ms((span.end or span.start) - span.start),
+                    "attributes": span.attributes,
+                }
+                for span in self.spans
+            ],
+        }
+
+    def to_otlp(self, service_name="my_strands_agent"):
+        spans = []
+        for span in self.spans:
+            item = {
+                "traceId": self.trace_id,
+                "spanId": span.span_id,
+                "name": span.name,
+                "kind": 1,
+                "startTimeUnixNano": str(self._wall(span.start)),
+                "endTimeUnixNano": str(self._wall(span.end or span.start)),
+                "attributes": [
+                    {"key": key, "value": _otlp_value(value)}
+                    for key, value in span.attributes.items()
+                    if value is not None
+                ],
+            }
+            if span.parent_id:
+                item["parentSpanId"] = span.parent_id
+            spans.append(item)
+        return {
+            "resourceSpans": [{
+                "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": service_name}}]},
+                "scopeSpans": [{"scope": {"name": __name__}, "spans": spans}],
+            }]
+        }
+
+    def export_otel(self):
+        """Replay the spans into the current OpenTelemetry tracer, nested under the active span."""
+        if otel_trace is None:
+            return False
+        tracer = otel_trace.get_tracer(__name__)
+        exported = {}
+        try:
+            for span in self.spans:
+                parent = exported.get(span.parent_id)
+                context = otel_trace.set_span_in_context(parent) if parent is not None else None
+                exported[span.span_id] = tracer.start_span(
+                    span.name,
+                    context=context,
+                    start_time=self._wall(span.start),
+                    attributes={key: _otel_value(value) for key, value in span.attributes.items() if value is not None},
+                )
+            for span in reversed(self.spans):
+                exported[span.span_id].end(end_time=self._wall(span.end or span.start))
+        except Exception as e:
+            # トレースの送信失敗で応答を失敗させない
+            logger.warning("OpenTelemetry export failed: %s", e)
+            return False
+        return True
+
+    def _wall(self, instant):
+        return self._wall_start + int((instant - self.root.start) * 1e9)
+
+
+class StreamTimer:
+    """Derive model-turn and tool-call spans from classified stream events.
+
+    A ``model`` span runs from the start of each event-loop cycle to its
+    ``messageStop``; when the model stops for tool use, one ``tool`` span per
+    requested tool runs until its ``toolResult`` arrives, and the next model
+    turn starts once every tool of the cycle has finished.
+    """
+
+    def __init__(self, trace, parent=None, **attributes):
+        self.trace = trace
+        self.parent = parent
+        self.attributes = attributes
+        self.cycle = 0
+        self._model = None
+        self._turn_started = False
+        self._seen = set()
+        self._requested = {}
+        self._tools = {}
+        self._next_model()
+
+    def observe(self, kind, info):
+        if kind == "text" or kind == "stream_text":
+            if not self._turn_started and self._model is not None:
+                self._turn_started = True
+                self._model.set(ttft_ms=_ms(time.monotonic() - self._model.start))
+            self.trace.first_token()
+        elif kind == "tool_start":
+            for tool in info:
+                # 同じツール呼び出しは開始時と完成したメッセージの2回届く
+                if tool["id"] not in self._seen:
+                    self._seen.add(tool["id"])
+                    self._requested[tool["id"]] = tool["name"]
+        elif kind == "message_stop" and self._model is not None:
+            stop_reason = info.get("stopReason")
+            self._model.finish(stop_reason=stop_reason)
+            self._model = None
+            if stop_reason == "tool_use":
+                for tool_id, name in self._requested.items():
+                    self._tools[tool_id] = self.trace.start(
+                        "tool", self.parent, tool=name, tool_use_id=tool_id, **self.attributes
+                    )
+                self._requested = {}
+        elif kind == "metadata":
+            span = self._model or self._last_model
+            if span is not None:
+                span.set(
+                    latency_ms=info.get("metrics", {}).get("latencyMs"),
+                    input_tokens=info.get("usage", {}).get("inputTokens"),
+                    output_tokens=info.get("usage", {}).get("outputTokens"),
+                )
+        elif kind == "tool_result":
+            for result in info:
+                span = self._tools.pop(result["id"], None)
+                if span is not None:
+                    span.finish(status=result["status"])
+            if not self._tools and self._model is None:
+                self._next_model()
+
+    def _next_model(self):
+        self.cycle += 1
+        self._model = self._last_model = self.trace.start("model", self.parent, cycle=self.cycle, **self.attributes)
+        self._turn_started = False
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 1)
+
+
+def _otel_value(value):
+    if isinstance(value, (str, bool, int, float)):
+        return value
+    return str(value)
+
+
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
@@ -0,0 +1,66 @@
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class Warmup:
+    """One-shot background startup phase.
+
+    ``steps`` is an ordered list of ``(name, callable)`` pairs run once on a
+    daemon thread by ``start()``; further calls are no-ops, so it can be
+    triggered both at ``app.run()`` and from the ping handler. A failing step
+    is logged and skipped: warmup only moves first-request costs off the
+    request path, and everything it prepares is also created lazily on demand.
+    """
+
+    def __init__(self, steps):
+        self.steps = list(steps)
+        self.state = "pending"
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        self._thread = None
+        self._started_at = None
+        self._durations = {}
+        self._errors = {}
+
+    @property
+    def ready(self):
+        return self._done.is_set()
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return self
+            self.state = "running"
+            self._started_at = time.monotonic()
+            self._thread = threading.Thread(target=self._run, name="warmup", daemon=True)
+            self._thread.start()
+        return self
+
+    def wait(self, timeout=None):
+        """Block until warmup has finished; returns False on timeout."""
+        return self._done.wait(timeout)
+
+    def stats(self):
+        return {
+            "state": self.state,
+            "steps_ms": {name: duration * 1000 for name, duration in self._durations.items()},
+            "errors": dict(self._errors),
+            "total_ms": sum(self._durations.values()) * 1000,
+        }
+
+    def _run(self):
+        for name, step in self.steps:
+            started = time.monotonic()
+            try:
+                step()
+            except Exception as e:
+                self._errors[name] = str(e)
+                logger.warning("Warmup step %s failed: %s", name, e)
+            finally:
+                self._durations[name] = time.monotonic() - started
+        self.state = "failed" if self._errors else "ready"
+        logger.info("Warmup %s in %.0fms: %s", self.state, (time.monotonic() - self._started_at) * 1000, self._durations)
+        self._done.set()